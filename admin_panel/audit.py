@@ -0,0 +1,252 @@
+"""Buffered AdminLog writer.
+
+Admin views record audit entries here instead of inserting an AdminLog row
+inside the request, which on SQLite would wait for the same write lock as
+the change being logged. Entries are queued in memory and written with one
+``bulk_create`` once ``FLUSH_SIZE`` entries are waiting or the oldest has
+waited ``FLUSH_INTERVAL`` seconds, and at interpreter exit.
+
+Every entry is also appended to this process's journal file in
+``settings.AUDIT_LOG_DIR`` before it is queued. A journal is deleted once its
+entries are committed. A journal whose flush failed is kept as a pending
+file and retried, and the journals of workers that died are claimed and
+replayed by the next process to start (even one that reused the dead
+worker's pid), so entries survive a crash at the cost of, rarely, being
+written twice. The journal reaches the disk with one fsync per flush rather
+than one per entry, so a power cut, unlike a crash, can lose the entries of
+the last ``FLUSH_INTERVAL``.
+
+An entry the database rejects (as opposed to a database that cannot be
+reached) is moved to ``DEAD_LETTER_NAME`` in the same directory and logged,
+so it does not hold up the entries behind it.
+"""
+import atexit
+import json
+import logging
+import os
+import threading
+import time
+from pathlib import Path
+
+from django.conf import settings
+from django.db import DatabaseError, InterfaceError, OperationalError, connection, transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from laundry_pal.processes import is_running
+from .models import AdminLog
+
+logger = logging.getLogger(__name__)
+
+FLUSH_SIZE = 50
+
+# Seconds an entry may wait in memory before it is written
+FLUSH_INTERVAL = 2.0
+
+DEAD_LETTER_NAME = 'dead-letter.jsonl'
+
+# Errors that mean the database is unavailable, so the entries are retried later
+UNAVAILABLE = (OperationalError, InterfaceError)
+
+
+class AuditLogBuffer:
+    """The per-process queue, journal and flusher thread"""
+
+    def __init__(self, directory):
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.pid = os.getpid()
+        self.journal_path = self.directory / f'audit-{self.pid}.jsonl'
+        self.dead_letter_path = self.directory / DEAD_LETTER_NAME
+        self.journal = None
+        self.entries = []
+        # Guards entries and the journal; flush_lock keeps flushes in order
+        self.lock = threading.Lock()
+        self.flush_lock = threading.Lock()
+        self.wakeup = threading.Event()
+        self.thread = None
+        self.claim_orphans()
+
+    def add(self, entry):
+        with self.lock:
+            if self.journal is None:
+                self.journal = open(self.journal_path, 'a', encoding='utf-8')
+            self.journal.write(json.dumps(entry) + '\n')
+            # Handed to the OS so a crash keeps it; the flush syncs it to disk
+            self.journal.flush()
+            self.entries.append(entry)
+            full = len(self.entries) >= FLUSH_SIZE
+            if self.thread is None:
+                self.thread = threading.Thread(target=self.run, name='audit-log-flusher', daemon=True)
+                self.thread.start()
+        if full:
+            self.wakeup.set()
+
+    def run(self):
+        while True:
+            self.wakeup.wait(FLUSH_INTERVAL)
+            self.wakeup.clear()
+            try:
+                self.flush()
+            finally:
+                # This thread's connection would otherwise stay open between flushes
+                connection.close()
+
+    def flush(self):
+        """Write every queued entry, then retry any pending journals; returns the number written"""
+        with self.flush_lock:
+            with self.lock:
+                entries, self.entries = self.entries, []
+                pending = self.rotate_journal()
+            written = 0
+            if entries:
+                inserted, remaining = self.write(entries)
+                written += inserted
+                if remaining:
+                    self.keep(pending, entries, remaining)
+                    return written
+                pending.unlink()
+            for path in sorted(self.directory.glob(f'audit-{self.pid}-*.pending')):
+                entries = self.read(path)
+                inserted, remaining = self.write(entries)
+                written += inserted
+                if remaining:
+                    self.keep(path, entries, remaining)
+                    break
+                path.unlink()
+            return written
+
+    def rotate_journal(self):
+        """Close the journal and set it aside as pending; the next entry starts a new one"""
+        if self.journal is None:
+            return None
+        self.journal.flush()
+        os.fsync(self.journal.fileno())
+        self.journal.close()
+        self.journal = None
+        pending = self.directory / f'audit-{self.pid}-{time.time_ns()}.pending'
+        os.replace(self.journal_path, pending)
+        return pending
+
+    def claim_orphans(self):
+        """Take over the journals of processes that are no longer running.
+
+        A journal already at this process's path was left by a process that
+        died before its pid was reused; it is set aside with the others, as
+        the first flush would otherwise delete it with this process's entries.
+        """
+        for path in self.directory.glob('audit-*'):
+            try:
+                owner = int(path.stem.split('-')[1])
+            except (IndexError, ValueError):
+                continue
+            if owner == self.pid:
+                if path != self.journal_path:
+                    continue
+            elif is_running(owner):
+                continue
+            try:
+                os.replace(path, self.directory / f'audit-{self.pid}-{time.time_ns()}.pending')
+            except FileNotFoundError:
+                # Another process claimed it first
+                continue
+
+    def read(self, path):
+        entries = []
+        with open(path, encoding='utf-8') as journal:
+            for line in journal:
+                try:
+                    entries.append(json.loads(line))
+                except ValueError:
+                    # A line cut short when the worker died
+                    continue
+        return entries
+
+    def write(self, entries):
+        """Insert ``entries``; returns how many were written and the ones to retry.
+
+        Entries are retried when the database is unavailable. A batch the
+        database rejects is written again one entry at a time, and the
+        entries that still fail go to the dead-letter file.
+        """
+        try:
+            self.insert(entries)
+            return len(entries), []
+        except UNAVAILABLE:
+            logger.exception('Could not write %d audit log entries; kept in %s', len(entries), self.directory)
+            return 0, entries
+        except (DatabaseError, KeyError, TypeError, ValueError):
+            pass
+        inserted = 0
+        for index, entry in enumerate(entries):
+            try:
+                self.insert([entry])
+                inserted += 1
+            except UNAVAILABLE:
+                logger.exception('Could not write %d audit log entries; kept in %s', len(entries) - index, self.directory)
+                return inserted, entries[index:]
+            except (DatabaseError, KeyError, TypeError, ValueError):
+                logger.exception('Moved an audit log entry that cannot be written to %s: %r', self.dead_letter_path, entry)
+                self.dead_letter(entry)
+        return inserted, []
+
+    def insert(self, entries):
+        # The savepoint lets a rejected batch be retried inside a caller's transaction
+        with transaction.atomic():
+            AdminLog.objects.bulk_create([
+                AdminLog(**dict(entry, timestamp=parse_datetime(entry['timestamp'])))
+                for entry in entries
+            ])
+
+    def keep(self, path, entries, remaining):
+        """Leave only ``remaining`` in the journal at ``path`` for the next flush"""
+        if len(remaining) == len(entries):
+            return
+        partial = path.with_suffix('.partial')
+        with open(partial, 'w', encoding='utf-8') as journal:
+            journal.writelines(json.dumps(entry) + '\n' for entry in remaining)
+            journal.flush()
+            os.fsync(journal.fileno())
+        os.replace(partial, path)
+
+    def dead_letter(self, entry):
+        with open(self.dead_letter_path, 'a', encoding='utf-8') as dead_letters:
+            dead_letters.write(json.dumps(entry) + '\n')
+            dead_letters.flush()
+            os.fsync(dead_letters.fileno())
+
+
+_buffer = None
+_buffer_lock = threading.Lock()
+
+
+def get_buffer():
+    """This process's buffer, created on first use and again after a fork"""
+    global _buffer
+    with _buffer_lock:
+        if _buffer is None or _buffer.pid != os.getpid():
+            _buffer = AuditLogBuffer(settings.AUDIT_LOG_DIR)
+        return _buffer
+
+
+def record(user, action_type, description, target_model='', target_id=None, ip_address=None):
+    """Queue one AdminLog entry, stamped with the time of the action"""
+    get_buffer().add({
+        'admin_user_id': user.pk,
+        'action_type': action_type,
+        'description': description,
+        'target_model': target_model or '',
+        'target_id': target_id,
+        'ip_address': ip_address,
+        'timestamp': timezone.now().isoformat(),
+    })
+
+
+def flush():
+    """Write everything this process has queued; returns the number of entries written"""
+    if _buffer is None or _buffer.pid != os.getpid():
+        return 0
+    return _buffer.flush()
+
+
+atexit.register(flush)
@@ -0,0 +1,108 @@
+"""Lifetime order stats per user, behind the users page.
+
+Every user has a CustomerStats row, created with the account, holding
+their order count, spend, orders not yet delivered and the time of their
+latest order. The order signals move these by deltas, the way
+admin_panel.stats keeps the dashboard totals, so listing, sorting and
+filtering customers reads one indexed table instead of grouping all
+orders.
+"""
+from decimal import Decimal
+
+from django.contrib.auth.models import User
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Max, Q, Sum, Value
+from django.db.models.functions import Coalesce, Greatest
+
+from orders.models import Order
+from .models import CustomerStats
+
+
+def is_active(status):
+    return status != Order.Status.DELIVERED
+
+
+def apply_delta(user_id, orders=0, spend=Decimal('0.00'), active=0, ordered_at=None):
+    """Add to one user's totals; ``ordered_at`` moves their last order time forward"""
+    changes = {}
+    if orders:
+        changes['lifetime_orders'] = F('lifetime_orders') + orders
+    if spend:
+        changes['lifetime_spend'] = F('lifetime_spend') + spend
+    if active:
+        changes['active_orders'] = F('active_orders') + active
+    if ordered_at is not None:
+        changes['last_order_at'] = Greatest(Coalesce(F('last_order_at'), Value(ordered_at)), Value(ordered_at))
+    if not changes:
+        return
+    rows = CustomerStats.objects.filter(user_id=user_id)
+    # Without a row to take them, removals belong to a user being deleted
+    if rows.update(**changes) or orders <= 0:
+        return
+    try:
+        with transaction.atomic():
+            CustomerStats.objects.create(
+                user_id=user_id, lifetime_orders=max(orders, 0), lifetime_spend=spend,
+                active_orders=max(active, 0), last_order_at=ordered_at,
+            )
+    except IntegrityError:
+        # Another process created the row first
+        rows.update(**changes)
+
+
+def record_order_change(old=None, new=None, ordered_at=None):
+    """Move one order's contribution between users' totals.
+
+    ``old`` and ``new`` are ``(user id, status, total cost)``, None for a
+    created or a deleted order; ``ordered_at`` is the order's creation time.
+    """
+    if old == new:
+        return
+    if old is not None and new is not None and old[0] == new[0]:
+        apply_delta(
+            new[0],
+            spend=Decimal(new[2]) - Decimal(old[2]),
+            active=int(is_active(new[1])) - int(is_active(old[1])),
+        )
+        return
+    if old is not None:
+        apply_delta(old[0], orders=-1, spend=-Decimal(old[2]), active=-int(is_active(old[1])))
+        refresh_last_order(old[0])
+    if new is not None:
+        apply_delta(new[0], orders=1, spend=Decimal(new[2]), active=int(is_active(new[1])), ordered_at=ordered_at)
+
+
+def refresh_last_order(user_id):
+    """Recompute ``last_order_at`` after an order left the user"""
+    latest = Order.objects.filter(user_id=user_id).aggregate(latest=Max('created_at'))['latest']
+    CustomerStats.objects.filter(user_id=user_id).update(last_order_at=latest)
+
+
+def rebuild_customer_stats():
+    """Recompute every user's totals from the orders table; returns the number of users"""
+    totals = {
+        user_id: (orders, spend or Decimal('0.00'), active, latest)
+        for user_id, orders, spend, active, latest in Order.objects.order_by().values_list('user_id').annotate(
+            orders=Count('id'),
+            spend=Sum('total_cost'),
+            active=Count('id', filter=~Q(status=Order.Status.DELIVERED)),
+            latest=Max('created_at'),
+        )
+    }
+    with transaction.atomic():
+        CustomerStats.objects.all().delete()
+        CustomerStats.objects.bulk_create(
+            [
+                CustomerStats(
+                    user_id=user_id,
+                    lifetime_orders=orders,
+                    lifetime_spend=spend,
+                    active_orders=active,
+                    last_order_at=latest,
+                )
+                for user_id in User.objects.values_list('id', flat=True).iterator(chunk_size=2000)
+                for orders, spend, active, latest in [totals.get(user_id, (0, Decimal('0.00'), 0, None))]
+            ],
+            batch_size=1000,
+        )
+    return CustomerStats.objects.count()
@@ -0,0 +1,221 @@
+import multiprocessing
+import random
+import shutil
+import sqlite3
+import statistics
+import tempfile
+import time
+from contextlib import closing
+from decimal import Decimal
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import OperationalError, close_old_connections, connection, transaction
+from django.test.utils import override_settings
+
+from orders.models import Order, OrderItem
+from orders.progression import PROGRESSIONS, apply_transition
+
+CUSTOMERS = 200
+
+# Connection settings compared; OPTIONS and CONN_MAX_AGE replace the configured ones
+PROFILES = {
+    # What Django does with no configuration: rollback journal, deferred
+    # transactions and a connection per request
+    'stock': {'CONN_MAX_AGE': 0, 'OPTIONS': {}},
+    'configured': {
+        'CONN_MAX_AGE': settings.DATABASES['default'].get('CONN_MAX_AGE', 0),
+        'OPTIONS': settings.DATABASES['default'].get('OPTIONS', {}),
+    },
+}
+# Journal mode each profile's copy is put in, as it is kept in the file
+JOURNAL_MODES = {'stock': 'DELETE', 'configured': settings.SQLITE_JOURNAL_MODE}
+
+
+class Command(BaseCommand):
+    help = 'Measure SQLite throughput and lock errors with concurrent writer and reader processes, per connection profile'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--writers',
+            type=int,
+            default=4,
+            help='Processes updating order statuses, besides the progression process',
+        )
+        parser.add_argument(
+            '--readers',
+            type=int,
+            default=8,
+            help='Processes loading order list pages',
+        )
+        parser.add_argument(
+            '--duration',
+            type=float,
+            default=10.0,
+            help='Seconds each profile runs',
+        )
+        parser.add_argument(
+            '--orders',
+            type=int,
+            default=5000,
+            help='Orders in the database',
+        )
+        parser.add_argument(
+            '--profiles',
+            nargs='+',
+            choices=list(PROFILES),
+            default=list(PROFILES),
+            help='Connection profiles to run',
+        )
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'sqlite':
+            raise CommandError('This benchmark measures SQLite locking; the configured database is not SQLite')
+        scratch = tempfile.mkdtemp(prefix='benchmark-contention-')
+        seed_file = f'{scratch}/seed.sqlite3'
+        connection.settings_dict['TEST']['NAME'] = seed_file
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+        isolated = override_settings(
+            CACHES={'default': {'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache', 'LOCATION': f'{scratch}/cache'}},
+        )
+        isolated.enable()
+        saved = {key: connection.settings_dict[key] for key in ('NAME', 'CONN_MAX_AGE', 'OPTIONS')}
+        try:
+            self.seed(options['orders'])
+            connection.close()
+            self.stdout.write(
+                f"{'profile':<11} {'writes/s':>9} {'reads/s':>9} {'write p95 ms':>13} {'read p95 ms':>12} "
+                f"{'locked':>7} {'errors':>7}"
+            )
+            for name in options['profiles']:
+                database = f'{scratch}/{name}.sqlite3'
+                copy_database(seed_file, database, JOURNAL_MODES[name])
+                connection.settings_dict.update(PROFILES[name], NAME=database)
+                self.report(name, self.run(options))
+                connection.close()
+        finally:
+            connection.close()
+            connection.settings_dict.update(saved)
+            isolated.disable()
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            shutil.rmtree(scratch, ignore_errors=True)
+
+    def seed(self, size):
+        rng = random.Random(1)
+        customers = User.objects.bulk_create([
+            User(username=f'contention-customer-{number}') for number in range(CUSTOMERS)
+        ])
+        statuses = Order.Status.values
+        orders = Order.objects.bulk_create([
+            Order(
+                user=customers[number % CUSTOMERS],
+                status=rng.choice(statuses),
+                total_items=3,
+                total_cost=Decimal('90.00'),
+            )
+            for number in range(size)
+        ], batch_size=1000)
+        OrderItem.objects.bulk_create([
+            OrderItem(order=order, item_type=OrderItem.ItemType.SHIRT, quantity=3, unit_price=Decimal('30.00'), total_price=Decimal('90.00'))
+            for order in orders
+        ], batch_size=1000)
+
+    def run(self, options):
+        """Fork the workers against the profile's database and gather what they did"""
+        context = multiprocessing.get_context('fork')
+        results = context.Queue()
+        start_at = time.time() + 1
+        stop_at = start_at + options['duration']
+        workers = [('write', number) for number in range(options['writers'])]
+        workers += [('progress', 0)]
+        workers += [('read', number) for number in range(options['readers'])]
+        processes = [
+            context.Process(target=work, args=(kind, number, options['orders'], start_at, stop_at, results))
+            for kind, number in workers
+        ]
+        for process in processes:
+            process.start()
+        gathered = [results.get() for _ in processes]
+        for process in processes:
+            process.join()
+        return gathered, options['duration']
+
+    def report(self, name, run):
+        gathered, duration = run
+        latencies = {'write': [], 'read': []}
+        locked = errors = 0
+        for kind, timings, worker_locked, worker_errors in gathered:
+            latencies['read' if kind == 'read' else 'write'].extend(timings)
+            locked += worker_locked
+            errors += worker_errors
+        self.stdout.write(
+            f"{name:<11} {len(latencies['write']) / duration:>9.1f} {len(latencies['read']) / duration:>9.1f} "
+            f"{p95(latencies['write']):>13.1f} {p95(latencies['read']):>12.1f} {locked:>7} {errors:>7}"
+        )
+
+
+def work(kind, number, orders, start_at, stop_at, results):
+    """One worker process: repeat its operation until stop_at, as if each were a request"""
+    rng = random.Random(f'{kind}:{number}')
+    operation = {'write': update_status, 'progress': advance_orders, 'read': load_order_page}[kind]
+    timings = []
+    locked = errors = 0
+    time.sleep(max(0, start_at - time.time()))
+    while time.time() < stop_at:
+        started = time.perf_counter()
+        try:
+            operation(rng, number, orders)
+        except OperationalError as e:
+            if 'locked' in str(e):
+                locked += 1
+            else:
+                errors += 1
+        else:
+            timings.append(time.perf_counter() - started)
+        # What request_finished does: close the connection unless it is kept
+        close_old_connections()
+    connection.close()
+    results.put((kind, timings, locked, errors))
+
+
+def update_status(rng, number, orders):
+    """The admin status update; odd writers do it as a read-then-write transaction"""
+    order_id = rng.randint(1, orders)
+    if number % 2:
+        with transaction.atomic():
+            order = Order.objects.get(pk=order_id)
+            order.status = rng.choice(Order.Status.values)
+            order.save()
+    else:
+        order = Order.objects.get(pk=order_id)
+        order.status = rng.choice(Order.Status.values)
+        order.save()
+
+
+def advance_orders(rng, number, orders):
+    """A progress_orders tick over a random slice of one status"""
+    current, following, minutes = rng.choice(PROGRESSIONS)
+    order_ids = list(Order.objects.filter(status=current).values_list('id', flat=True)[:50])
+    apply_transition(current, following, order_ids=order_ids)
+    time.sleep(0.05)
+
+
+def load_order_page(rng, number, orders):
+    """The queries of a customer's order list page"""
+    user_id = User.objects.filter(username=f'contention-customer-{rng.randrange(CUSTOMERS)}').values_list('id', flat=True).get()
+    orders = Order.objects.filter(user_id=user_id).select_related('reservation').prefetch_related('items').order_by('-created_at')
+    list(orders[:6])
+    orders.count()
+
+
+def copy_database(source, target, journal_mode):
+    with closing(sqlite3.connect(source)) as src, closing(sqlite3.connect(target)) as dst:
+        src.backup(dst)
+        dst.execute(f'PRAGMA journal_mode={journal_mode}')
+
+
+def p95(timings):
+    if len(timings) < 2:
+        return 0.0
+    return statistics.quantiles(timings, n=100, method='inclusive')[94] * 1000
@@ -0,0 +1,324 @@
+import json
+import platform
+import random
+import shutil
+import statistics
+import tempfile
+import time
+from contextlib import ExitStack
+from datetime import timedelta
+from decimal import Decimal
+
+import django
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.handlers.wsgi import WSGIHandler
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, connection, connections
+from django.test import Client, RequestFactory
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from django.utils.crypto import get_random_string
+
+from admin_panel import audit
+from admin_panel.stats import rebuild_stats
+from laundry_pal import metrics
+from notifications.models import Notification
+from orders.models import Order, OrderItem
+from reservations.models import Reservation, ServiceType
+
+CUSTOMERS = 1000
+
+# Orders are spread over this many days before now
+HISTORY_DAYS = 365
+
+SEED_BATCH_SIZE = 5000
+
+SURNAMES = ['Santos', 'Reyes', 'Cruz', 'Bautista', 'Ocampo', 'Garcia', 'Mendoza', 'Torres', 'Flores', 'Villanueva']
+
+# (case, url name, query string, who, method)
+CASES = [
+    ('order_list', 'orders:list', '', 'customer', 'GET'),
+    ('orders_management', 'admin_panel:orders', '', 'staff', 'GET'),
+    ('orders_management_search', 'admin_panel:orders', 'search=Villanueva', 'staff', 'GET'),
+    ('dashboard', 'admin_panel:dashboard', '', 'staff', 'GET'),
+    ('history', 'history', '', 'customer', 'GET'),
+    ('notification_list', 'notification_list', '', 'customer', 'GET'),
+    ('update_order_status', 'admin_panel:update_order_status', '', 'staff', 'POST'),
+]
+
+
+class Command(BaseCommand):
+    help = 'Measure p50/p95 latency of the hot views through the WSGI handler at several data sizes'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--sizes',
+            type=int,
+            nargs='+',
+            default=[1_000, 100_000, 1_000_000],
+            help='Orders in the database for each round; each round tops up the previous one',
+        )
+        parser.add_argument(
+            '--requests',
+            type=int,
+            default=50,
+            help='Timed requests per view and size',
+        )
+        parser.add_argument(
+            '--warmup',
+            type=int,
+            default=5,
+            help='Untimed requests per view and size, made first',
+        )
+        parser.add_argument(
+            '--cases',
+            nargs='+',
+            choices=[case[0] for case in CASES],
+            help='Only run these views',
+        )
+        parser.add_argument(
+            '--output',
+            default='benchmark_views.json',
+            help='Write the results to this JSON file',
+        )
+        parser.add_argument(
+            '--baseline',
+            help='Compare with the results in this JSON file',
+        )
+        parser.add_argument(
+            '--tolerance',
+            type=float,
+            default=0.25,
+            help='Relative p95 increase over the baseline reported as a regression',
+        )
+        parser.add_argument(
+            '--fail-on-regression',
+            action='store_true',
+            help='Exit with an error when any view regressed',
+        )
+        parser.add_argument(
+            '--db-file',
+            help='Run against this SQLite file instead of an in-memory test database',
+        )
+        parser.add_argument(
+            '--seed',
+            type=int,
+            default=1,
+            help='Random seed for the generated data',
+        )
+
+    def handle(self, *args, **options):
+        baseline = None
+        if options['baseline']:
+            with open(options['baseline'], encoding='utf-8') as f:
+                baseline = {(row['size'], row['case']): row for row in json.load(f)['results']}
+        cases = [case for case in CASES if not options['cases'] or case[0] in options['cases']]
+        self.random = random.Random(options['seed'])
+
+        if options['db_file']:
+            connection.settings_dict['TEST']['NAME'] = options['db_file']
+        scratch = tempfile.mkdtemp(prefix='benchmark-views-')
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+        for alias in connections:
+            # A configured read replica reads the test database too
+            if connections[alias].settings_dict['TEST'].get('MIRROR') == DEFAULT_DB_ALIAS:
+                connections[alias].creation.set_as_test_mirror(connection.settings_dict)
+        # Audit entries, request metrics and cached fragments of the run stay
+        # out of the real ones
+        isolated = override_settings(
+            DEBUG=False,
+            AUDIT_LOG_DIR=f'{scratch}/audit',
+            METRICS_DIR=f'{scratch}/metrics',
+            CACHES={
+                alias: {'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache', 'LOCATION': f'{scratch}/cache/{alias}'}
+                for alias in ('default', 'order_cards')
+            },
+        )
+        isolated.enable()
+        try:
+            self.set_up()
+            results = []
+            self.stdout.write(f"{'orders':>9}  {'view':<26} {'p50 ms':>8} {'p95 ms':>8} {'req/s':>7} {'queries':>7}  vs baseline")
+            for size in sorted(options['sizes']):
+                self.seed(size)
+                for case in cases:
+                    row = self.measure(size, case, options['requests'], options['warmup'])
+                    results.append(row)
+                    self.report(row, baseline, options['tolerance'])
+        finally:
+            audit.flush()
+            isolated.disable()
+            metrics.registry.reset()
+            shutil.rmtree(scratch, ignore_errors=True)
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+
+        with open(options['output'], 'w', encoding='utf-8') as f:
+            json.dump({
+                'created_at': timezone.now().isoformat(),
+                'django': django.get_version(),
+                'python': platform.python_version(),
+                'database': connection.vendor,
+                'requests': options['requests'],
+                'results': results,
+            }, f, indent=2)
+        self.stdout.write(f"Results written to {options['output']}")
+
+        regressions = [row for row in results if row.get('regressed')]
+        if regressions and options['fail_on_regression']:
+            raise CommandError(f'{len(regressions)} view(s) regressed by more than {options["tolerance"]:.0%} at p95')
+
+    def set_up(self):
+        self.handler = WSGIHandler()
+        self.factory = RequestFactory()
+        self.service_types = ServiceType.objects.bulk_create([
+            ServiceType(name=name, description=name, base_price=price)
+            for name, price in (('Wash & Fold', 150), ('Dry Cleaning', 300), ('Ironing', 100))
+        ])
+        customers = User.objects.bulk_create([
+            User(
+                username=f'benchmark-customer-{number}',
+                first_name=f'Customer {number}',
+                last_name=SURNAMES[number % len(SURNAMES)],
+                email=f'customer{number}@example.com',
+            )
+            for number in range(CUSTOMERS)
+        ])
+        self.customer_ids = [customer.pk for customer in customers]
+        staff = User.objects.create_superuser('benchmark-staff', 'staff@example.com', None)
+        # The busiest kind of customer: one of the pool, with its share of everything
+        self.cookies = {'customer': self.login(customers[0]), 'staff': self.login(staff)}
+        self.csrf_token = get_random_string(32)
+        self.orders = 0
+
+    def login(self, user):
+        client = Client()
+        client.force_login(user)
+        return f'{settings.SESSION_COOKIE_NAME}={client.cookies[settings.SESSION_COOKIE_NAME].value}'
+
+    def seed(self, size):
+        """Top the database up to ``size`` orders, a quarter as many reservations, and notifications"""
+        started = time.perf_counter()
+        now = timezone.now()
+        statuses = Order.Status.values
+        while self.orders < size:
+            count = min(SEED_BATCH_SIZE, size - self.orders)
+            customer_ids = [self.customer_ids[(self.orders + offset) % CUSTOMERS] for offset in range(count)]
+            orders = Order.objects.bulk_create([
+                Order(
+                    user_id=user_id,
+                    status=self.random.choice(statuses),
+                    total_items=3,
+                    total_cost=Decimal('180.00'),
+                    special_instructions=self.random.choice(['', '', 'Separate whites', 'Hang dry the shirts']),
+                )
+                for user_id in customer_ids
+            ])
+            OrderItem.objects.bulk_create([
+                OrderItem(order=order, item_type=item_type, quantity=quantity, unit_price=Decimal('30.00'), total_price=Decimal(30 * quantity))
+                for order in orders
+                for item_type, quantity in ((OrderItem.ItemType.SHIRT, 2), (OrderItem.ItemType.PANTS, 1))
+            ])
+            self.backdate(Order, orders, now)
+
+            reservations = Reservation.objects.bulk_create([
+                Reservation(
+                    user_id=user_id,
+                    service_type=self.random.choice(self.service_types),
+                    pickup_datetime=now,
+                    delivery_datetime=now + timedelta(days=2),
+                    address='Naval, Biliran',
+                    status=self.random.choice(Reservation.Status.values),
+                )
+                for user_id in customer_ids[::4]
+            ])
+            self.backdate(Reservation, reservations, now)
+            Notification.objects.bulk_create([
+                Notification(user_id=user_id, message='Your order is ready for pickup', is_read=self.random.random() < 0.7)
+                for user_id in customer_ids[::10]
+            ])
+            self.orders += count
+        # bulk_create skips the reservation signals that keep these counters
+        rebuild_stats()
+        self.status_targets = list(
+            Order.objects.order_by('-id').values_list('id', flat=True)[:200]
+        )
+        self.stdout.write(self.style.NOTICE(f'Seeded {size} orders in {time.perf_counter() - started:.1f}s'))
+
+    def backdate(self, model, objs, now):
+        """Spread ``created_at`` over the last HISTORY_DAYS days, as a live table would be"""
+        for obj in objs:
+            obj.created_at = obj.updated_at = now - timedelta(seconds=self.random.randrange(HISTORY_DAYS * 86400))
+        model.objects.bulk_update(objs, ['created_at', 'updated_at'], batch_size=1000)
+
+    def measure(self, size, case, requests, warmup):
+        name, url_name, query, who, method = case
+        for _ in range(warmup):
+            self.request(case)
+        timings = []
+        started = time.perf_counter()
+        for _ in range(requests):
+            request_started = time.perf_counter()
+            status = self.request(case)
+            timings.append(time.perf_counter() - request_started)
+            if status >= 400:
+                raise CommandError(f'{name} answered {status}')
+        elapsed = time.perf_counter() - started
+        with ExitStack() as stack:
+            # Reads may have gone to the replica
+            captured = [stack.enter_context(CaptureQueriesContext(connections[alias])) for alias in connections]
+            self.request(case)
+        # Write the queued audit entries here rather than from the flusher
+        # thread, which would contend with the seeding transactions
+        audit.flush()
+        percentiles = statistics.quantiles(timings, n=100, method='inclusive')
+        return {
+            'size': size,
+            'case': name,
+            'url': url_name,
+            'p50_ms': round(percentiles[49] * 1000, 3),
+            'p95_ms': round(percentiles[94] * 1000, 3),
+            'mean_ms': round(statistics.fmean(timings) * 1000, 3),
+            'throughput_rps': round(requests / elapsed, 1),
+            'queries': sum(len(queries) for queries in captured),
+        }
+
+    def request(self, case):
+        """Send one request through the WSGI handler and return its status code"""
+        name, url_name, query, who, method = case
+        cookie = self.cookies[who]
+        if method == 'POST':
+            order_id = self.random.choice(self.status_targets)
+            request = self.factory.post(
+                reverse(url_name, args=[order_id]),
+                {'status': self.random.choice(Order.Status.values)},
+                HTTP_COOKIE=f'{cookie}; {settings.CSRF_COOKIE_NAME}={self.csrf_token}',
+                HTTP_X_CSRFTOKEN=self.csrf_token,
+            )
+        else:
+            path = reverse(url_name)
+            request = self.factory.get(f'{path}?{query}' if query else path, HTTP_COOKIE=cookie)
+        statuses = []
+        response = self.handler(request.environ, lambda status, headers, exc_info=None: statuses.append(status))
+        try:
+            b''.join(response)
+        finally:
+            response.close()
+        return int(statuses[0].split()[0])
+
+    def report(self, row, baseline, tolerance):
+        comparison = ''
+        previous = baseline and baseline.get((row['size'], row['case']))
+        if previous:
+            change = row['p95_ms'] / previous['p95_ms'] - 1 if previous['p95_ms'] else 0
+            row['baseline_p95_ms'] = previous['p95_ms']
+            row['regressed'] = change > tolerance
+            comparison = f'{change:+.0%} p95'
+            if previous.get('queries') is not None and previous['queries'] != row['queries']:
+                comparison += f", queries {previous['queries']} → {row['queries']}"
+        line = (
+            f"{row['size']:>9}  {row['case']:<26} {row['p50_ms']:>8.1f} {row['p95_ms']:>8.1f} "
+            f"{row['throughput_rps']:>7.1f} {row['queries']:>7}  {comparison}"
+        )
+        self.stdout.write(self.style.ERROR(line) if row.get('regressed') else line)
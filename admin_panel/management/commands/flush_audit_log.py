@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand
+
+from admin_panel import audit
+
+
+class Command(BaseCommand):
+    help = 'Write audit log journals left behind by stopped workers to the database'
+
+    def handle(self, *args, **options):
+        # Creating the buffer claims the journals of processes no longer running
+        buffer = audit.get_buffer()
+        written = buffer.flush()
+        pending = sorted(buffer.directory.glob('*.pending'))
+        if pending:
+            self.stdout.write(self.style.WARNING(
+                f'Wrote {written} audit log entries; {len(pending)} journal(s) could not be written yet'
+            ))
+        else:
+            self.stdout.write(self.style.SUCCESS(f'Wrote {written} audit log entries'))
+        if buffer.dead_letter_path.exists():
+            with open(buffer.dead_letter_path, encoding='utf-8') as dead_letters:
+                rejected = sum(1 for line in dead_letters if line.strip())
+            self.stdout.write(self.style.WARNING(
+                f'{rejected} rejected entries are set aside in {buffer.dead_letter_path}'
+            ))
@@ -0,0 +1,405 @@
+import multiprocessing
+import random
+import time
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from decimal import ROUND_HALF_UP, Decimal
+from itertools import accumulate
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, connections, transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+
+from admin_panel.customers import rebuild_customer_stats
+from admin_panel.models import AdminLog
+from admin_panel.pricing import current_matrix
+from admin_panel.stats import rebuild_stats
+from notifications.models import Notification
+from orders import mapindex
+from orders.models import Order, OrderItem
+from orders.numbering import format_order_number, reserve_numbers
+from reservations.models import Reservation, ServiceType
+from reservations.slots import rebuild_slots
+
+FIRST_NAMES = [
+    'Maria', 'Jose', 'Juan', 'Ana', 'Mark', 'Angel', 'John', 'Kristine', 'Michael', 'Jasmine',
+    'Paolo', 'Grace', 'Carlo', 'Joy', 'Ramon', 'Liza', 'Noel', 'Rowena', 'Arnel', 'Divina',
+]
+LAST_NAMES = [
+    'Santos', 'Reyes', 'Cruz', 'Bautista', 'Ocampo', 'Garcia', 'Mendoza', 'Torres', 'Flores', 'Villanueva',
+    'Dela Cruz', 'Ramos', 'Aquino', 'Castillo', 'Rivera', 'Gonzales', 'Lim', 'Tan', 'Navarro', 'Salazar',
+]
+BARANGAYS = [
+    'Atipolo', 'Caraycaray', 'Larrazabal', 'P.I. Garcia', 'Santissimo Rosario', 'Sabang', 'Calumpang',
+    'Catmon', 'Capiñahan', 'Agpangi', 'Lucsoon', 'Talustusan', 'Villa Caneja', 'Haguikhikan',
+]
+INSTRUCTIONS = ['', '', '', '', 'Separate whites', 'Hang dry the shirts', 'No fabric softener', 'Fold, do not roll']
+STAIN_NOTES = ['Coffee on the collar', 'Grease on the sleeve', 'Ink on the pocket', 'Red wine']
+
+# Weights of the generated mix
+PRIORITY_WEIGHTS = {'standard': 75, 'express': 20, 'rush': 5}
+ITEMS_PER_ORDER_WEIGHTS = {1: 20, 2: 30, 3: 25, 4: 13, 5: 8, 6: 4}
+ITEM_TYPE_WEIGHTS = {'shirt': 30, 'pants': 20, 'dress': 8, 'jacket': 5, 'bedding': 10, 'towel': 15, 'delicate': 4, 'other': 8}
+SERVICE_LEVEL_WEIGHTS = {'wash_fold': 70, 'dry_clean': 15, 'press_only': 10, 'stain_treatment': 5}
+QUANTITY_WEIGHTS = {1: 30, 2: 25, 3: 18, 4: 12, 5: 8, 6: 4, 7: 2, 8: 1}
+# Drop-offs by hour of day
+HOUR_WEIGHTS = dict(enumerate([0, 0, 0, 0, 0, 0, 1, 4, 8, 9, 8, 7, 6, 6, 7, 8, 9, 10, 9, 6, 4, 2, 1, 0]))
+# Orders booked through a reservation rather than dropped off
+RESERVED_SHARE = 0.6
+UNFULFILLED_RESERVATIONS = 0.15
+
+# Hours from drop-off to delivery
+TURNAROUND_HOURS = {'standard': 72, 'express': 24, 'rush': 8}
+PRIORITY_MULTIPLIERS = {'standard': Decimal('1'), 'express': Decimal('1.5'), 'rush': Decimal('2')}
+# Used for services without an active pricing rule
+FALLBACK_UNIT_PRICES = {
+    'shirt': Decimal('35'), 'pants': Decimal('45'), 'dress': Decimal('80'), 'jacket': Decimal('120'),
+    'bedding': Decimal('150'), 'towel': Decimal('25'), 'delicate': Decimal('90'), 'other': Decimal('50'),
+}
+
+# Order statuses in the order they are reached, each at this fraction of the turnaround
+STATUS_PROGRESS = [
+    ('pending', 0.0), ('confirmed', 0.05), ('picked_up', 0.15), ('washing', 0.3), ('drying', 0.45),
+    ('folding', 0.6), ('ready', 0.75), ('out_for_delivery', 0.9), ('delivered', 1.0),
+]
+# Finished orders still waiting to be collected
+UNCLAIMED_SHARE = 0.03
+# The scheduler notifies the customer of every step. Older orders keep only
+# their last notification, which is all the notification views look at.
+NOTIFY_EVERY_STEP_DAYS = 30
+# Status changes made by staff, and so logged; the scheduler makes the rest
+MANUAL_UPDATE_SHARE = 0.1
+
+# Settings of the run, set before the workers are forked
+_job = {}
+
+
+def _cumulative(weights):
+    """``(values, cumulative weights)`` of a weights mapping, for random.choices"""
+    return list(weights), list(accumulate(weights.values()))
+
+
+PRIORITIES = _cumulative(PRIORITY_WEIGHTS)
+ITEMS_PER_ORDER = _cumulative(ITEMS_PER_ORDER_WEIGHTS)
+ITEM_TYPES = _cumulative(ITEM_TYPE_WEIGHTS)
+SERVICE_LEVELS = _cumulative(SERVICE_LEVEL_WEIGHTS)
+QUANTITIES = _cumulative(QUANTITY_WEIGHTS)
+HOURS = _cumulative(HOUR_WEIGHTS)
+
+
+class Command(BaseCommand):
+    help = (
+        'Generate customers, reservations, orders, items, notifications and admin logs at load-test scale. '
+        'The same --seed gives the same data, whatever the number of workers; only ids and order numbers '
+        'depend on the order in which chunks are written.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1_000, help='Customers to create')
+        parser.add_argument('--staff', type=int, default=5, help='Staff accounts that appear in the admin logs')
+        parser.add_argument('--orders', type=int, default=10_000, help='Orders to create')
+        parser.add_argument('--months', type=int, default=12, help='Spread the orders over this many months before now')
+        parser.add_argument('--seed', type=int, default=42, help='Random seed')
+        parser.add_argument('--batch-size', type=int, default=5_000, help='Orders written per transaction')
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=1,
+            help=(
+                'Generate and write chunks in this many processes (needs the fork start method). '
+                'SQLite takes one writer at a time, so this mostly pays off on PostgreSQL.'
+            ),
+        )
+        parser.add_argument(
+            '--until',
+            help='Generate history up to this date or datetime instead of now, for data identical between runs',
+        )
+        parser.add_argument(
+            '--prefix',
+            default='load',
+            help='Prefix of the generated usernames; must not be in use yet',
+        )
+        parser.add_argument(
+            '--password',
+            default='loadtest123',
+            help='Password of every generated account, so load tests can log in',
+        )
+
+    def handle(self, *args, **options):
+        prefix = options['prefix']
+        if User.objects.filter(username__startswith=f'{prefix}-').exists():
+            raise CommandError(f'Users named {prefix}-* already exist; pick another --prefix')
+        workers = options['workers']
+        if workers > 1 and 'fork' not in multiprocessing.get_all_start_methods():
+            self.stdout.write(self.style.WARNING('This platform cannot fork; generating in one process'))
+            workers = 1
+
+        started = time.perf_counter()
+        now = timezone.now()
+        if options['until']:
+            until = parse_datetime(options['until']) or (
+                parse_date(options['until']) and datetime.combine(parse_date(options['until']), datetime.min.time())
+            )
+            if not until:
+                raise CommandError(f"--until: not a date or datetime: {options['until']}")
+            now = until if timezone.is_aware(until) else timezone.make_aware(until)
+        with explicit_timestamps(Order, Reservation, Notification):
+            customer_ids, staff_ids = self.create_users(options, now)
+            total = options['orders']
+            size = options['batch_size']
+            _job.update(
+                seed=options['seed'],
+                now=now,
+                start=now - timedelta(days=30 * options['months']),
+                # Heavier customers first: a few regulars place most of the orders
+                customers=(customer_ids, list(accumulate(1 / (rank + 1) ** 0.7 for rank in range(len(customer_ids))))),
+                staff_ids=staff_ids,
+                service_type_ids=list(ServiceType.objects.filter(is_active=True).values_list('id', flat=True)),
+            )
+            chunks = [(index, min(size, total - index * size)) for index in range(-(-total // size))]
+            done = 0
+            if workers > 1:
+                # Children open their own connections
+                connections.close_all()
+                with multiprocessing.get_context('fork').Pool(workers) as pool:
+                    for count in pool.imap_unordered(_generate_chunk, chunks):
+                        done += count
+                        self.progress(done, total, started)
+            else:
+                for chunk in chunks:
+                    done += _generate_chunk(chunk)
+                    self.progress(done, total, started)
+
+        # Users and reservations are bulk created without the signals that
+        # count them or the saves that book their pickup slots
+        rebuild_stats()
+        rebuild_customer_stats()
+        rebuild_slots()
+        self.stdout.write(self.style.SUCCESS(
+            f'Generated {len(customer_ids)} customers, {len(staff_ids)} staff and {total} orders '
+            f'in {time.perf_counter() - started:.1f}s'
+        ))
+
+    def create_users(self, options, now):
+        rng = random.Random(f"{options['seed']}:users")
+        password = make_password(options['password'])
+        prefix = options['prefix']
+        start = now - timedelta(days=30 * options['months'])
+        customers = []
+        for number in range(options['users']):
+            first_name = rng.choice(FIRST_NAMES)
+            last_name = rng.choice(LAST_NAMES)
+            customers.append(User(
+                username=f'{prefix}-{number:07d}',
+                first_name=first_name,
+                last_name=last_name,
+                email=f"{first_name}.{last_name}.{number}@example.com".lower().replace(' ', ''),
+                password=password,
+                date_joined=start - timedelta(days=rng.randrange(365)),
+            ))
+        User.objects.bulk_create(customers, batch_size=options['batch_size'])
+        User.objects.bulk_create([
+            User(
+                username=f'{prefix}-staff-{number}',
+                first_name='Staff',
+                last_name=str(number),
+                password=password,
+                is_staff=True,
+                date_joined=start,
+            )
+            for number in range(options['staff'])
+        ])
+        generated = User.objects.filter(username__startswith=f'{prefix}-').order_by('username')
+        return (
+            list(generated.filter(is_staff=False).values_list('id', flat=True)),
+            list(generated.filter(is_staff=True).values_list('id', flat=True)),
+        )
+
+    def progress(self, done, total, started):
+        elapsed = time.perf_counter() - started
+        self.stdout.write(f'{done}/{total} orders ({done / elapsed:.0f}/s)')
+
+
+@contextmanager
+def explicit_timestamps(*models):
+    """Let bulk_create keep the generated created_at/updated_at values"""
+    fields = [
+        field for model in models for field in model._meta.concrete_fields
+        if getattr(field, 'auto_now', False) or getattr(field, 'auto_now_add', False)
+    ]
+    saved = [(field, field.auto_now, field.auto_now_add) for field in fields]
+    for field in fields:
+        field.auto_now = field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field, auto_now, auto_now_add in saved:
+            field.auto_now, field.auto_now_add = auto_now, auto_now_add
+
+
+def _generate_chunk(chunk):
+    """Generate and write one chunk of orders with everything that hangs off them"""
+    index, count = chunk
+    if connection.vendor == 'sqlite':
+        # Other workers hold the write lock for a whole chunk
+        with connection.cursor() as cursor:
+            cursor.execute('PRAGMA busy_timeout = 120000')
+    rng = random.Random(f"{_job['seed']}:{index}")
+    now = _job['now']
+    prices = current_matrix().prices
+
+    reservations, orders, items, notifications, logs = [], [], [], [], []
+    for _ in range(count):
+        user_id = _pick(rng, _job['customers'])
+        priority = _pick(rng, PRIORITIES)
+        created_at = _drop_off_time(rng)
+        turnaround = timedelta(hours=TURNAROUND_HOURS[priority])
+        progress = (now - created_at) / turnaround
+        reached = [(status, at) for status, at in STATUS_PROGRESS if at <= progress]
+        if reached[-1][0] == 'delivered' and rng.random() < UNCLAIMED_SHARE:
+            reached = reached[:-2]
+        status = reached[-1][0]
+
+        order = Order(
+            user_id=user_id,
+            status=status,
+            special_instructions=rng.choice(INSTRUCTIONS),
+            estimated_completion=created_at + turnaround,
+            total_items=0,
+            total_cost=Decimal('0.00'),
+            created_at=created_at,
+            updated_at=created_at + turnaround * reached[-1][1],
+        )
+        for _ in range(_pick(rng, ITEMS_PER_ORDER)):
+            item = _item(rng, prices, priority)
+            item.order = order
+            order.total_items += item.quantity
+            order.total_cost += item.total_price
+            items.append(item)
+
+        if rng.random() < RESERVED_SHARE:
+            order.reservation = _reservation(rng, user_id, priority, created_at, status, order.total_cost)
+            reservations.append(order.reservation)
+        orders.append(order)
+
+        recent = now - created_at < timedelta(days=NOTIFY_EVERY_STEP_DAYS)
+        for previous, (step, at) in zip([status for status, at in reached], reached[1:]):
+            moment = created_at + turnaround * at
+            if recent or step == status:
+                read = now - moment > timedelta(days=2) and rng.random() < 0.9
+                notifications.append((order, step, read, moment))
+            if _job['staff_ids'] and rng.random() < MANUAL_UPDATE_SHARE:
+                logs.append((order, previous, step, rng.choice(_job['staff_ids']), moment))
+    # Bookings that never became an order: cancelled, or still to be picked up
+    for _ in range(int(count * UNFULFILLED_RESERVATIONS)):
+        user_id = _pick(rng, _job['customers'])
+        priority = _pick(rng, PRIORITIES)
+        pickup_at = _drop_off_time(rng)
+        reservation = _reservation(rng, user_id, priority, pickup_at, None, None)
+        if pickup_at < now - timedelta(days=1):
+            reservation.status = Reservation.Status.CANCELLED
+        else:
+            reservation.status = rng.choice([Reservation.Status.PENDING, Reservation.Status.CONFIRMED])
+        reservations.append(reservation)
+
+    with transaction.atomic():
+        # A write first, so a SQLite transaction takes the write lock before it reads
+        number = reserve_numbers(len(orders))
+        for offset, order in enumerate(orders):
+            order.order_number = format_order_number(number + offset, order.created_at)
+        # Each bulk_create picks up the ids the previous one assigned
+        Reservation.objects.bulk_create(reservations)
+        # bulk_create sends no post_save to place them on the map; orders
+        # are placed by the orders_created signal
+        mapindex.index_reservations([reservation.pk for reservation in reservations])
+        Order.objects.bulk_create(orders)
+        OrderItem.objects.bulk_create(items)
+        Notification.objects.bulk_create([
+            Notification(
+                user_id=order.user_id,
+                message=f'Your order #{order.order_number} is now {Order.Status(step).label}.',
+                is_read=read,
+                created_at=moment,
+            )
+            for order, step, read, moment in notifications
+        ])
+        AdminLog.objects.bulk_create([
+            AdminLog(
+                admin_user_id=staff_id,
+                action_type=AdminLog.ActionType.ORDER_UPDATE,
+                description=f'Updated order #{order.order_number} status from {previous} to {step}',
+                target_model='Order',
+                target_id=order.pk,
+                timestamp=moment,
+            )
+            for order, previous, step, staff_id, moment in logs
+        ])
+    return count
+
+
+def _pick(rng, table):
+    values, cum_weights = table
+    return rng.choices(values, cum_weights=cum_weights)[0]
+
+
+def _drop_off_time(rng):
+    """A drop-off time within the generated period, busier towards now and during the day"""
+    start, now = _job['start'], _job['now']
+    # Volume grows over the period, so later days are more likely
+    day = start + (now - start) * rng.random() ** 0.6
+    moment = day.replace(
+        hour=_pick(rng, HOURS),
+        minute=rng.randrange(60),
+        second=rng.randrange(60),
+        microsecond=0,
+    )
+    return moment if moment <= now else moment - timedelta(days=1)
+
+
+def _item(rng, prices, priority):
+    item_type = _pick(rng, ITEM_TYPES)
+    service_level = _pick(rng, SERVICE_LEVELS)
+    quantity = _pick(rng, QUANTITIES)
+    unit_price = prices.get(priority, {}).get((service_level, item_type))
+    if unit_price is None:
+        unit_price = (FALLBACK_UNIT_PRICES[item_type] * PRIORITY_MULTIPLIERS[priority]).quantize(
+            Decimal('0.01'), rounding=ROUND_HALF_UP,
+        )
+    return OrderItem(
+        item_type=item_type,
+        service_level=service_level,
+        quantity=quantity,
+        unit_price=unit_price,
+        total_price=unit_price * quantity,
+        stain_notes=rng.choice(STAIN_NOTES) if service_level == 'stain_treatment' else '',
+    )
+
+
+def _reservation(rng, user_id, priority, dropped_off_at, order_status, cost):
+    """The booking behind an order picked up at ``dropped_off_at``"""
+    created_at = dropped_off_at - timedelta(hours=rng.randrange(1, 72))
+    if order_status is None:
+        status = Reservation.Status.PENDING
+    elif order_status == Order.Status.DELIVERED:
+        status = Reservation.Status.COMPLETED
+    elif order_status == Order.Status.PENDING:
+        status = Reservation.Status.CONFIRMED
+    else:
+        status = Reservation.Status.IN_PROGRESS
+    return Reservation(
+        user_id=user_id,
+        service_type_id=rng.choice(_job['service_type_ids']) if _job['service_type_ids'] else None,
+        pickup_datetime=dropped_off_at,
+        delivery_datetime=dropped_off_at + timedelta(hours=TURNAROUND_HOURS[priority]),
+        address=f'{rng.randrange(1, 300)} {rng.choice(BARANGAYS)}, Naval, Biliran',
+        phone_number=f'09{rng.randrange(10**9):09d}',
+        priority=priority,
+        status=status,
+        estimated_cost=cost,
+        final_cost=cost if status == 'completed' else None,
+        created_at=created_at,
+        updated_at=dropped_off_at if order_status else created_at,
+    )
@@ -0,0 +1,164 @@
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from admin_panel.models import AdminLog
+from notifications.models import Notification
+from orders.models import Order, OrderItem
+from orders.progression import DeadlineScheduler, advance_due_orders
+from reservations.models import Reservation
+
+# (label, URL name, query string, who requests it)
+HOT_VIEWS = [
+    ('order list', 'orders:list', '', 'customer'),
+    ('order list (staff)', 'orders:list', '', 'staff'),
+    ('reservation list', 'reservations:reservation_list', '', 'customer'),
+    ('history', 'history', '', 'customer'),
+    ('notification poll', 'notification_list', '', 'customer'),
+    ('dashboard', 'admin_panel:dashboard', '', 'staff'),
+    ('orders management', 'admin_panel:orders', '', 'staff'),
+    ('orders management by status', 'admin_panel:orders', '?status=pending', 'staff'),
+    ('orders management search', 'admin_panel:orders', '?search=advisor', 'staff'),
+    ('pending orders', 'admin_panel:pending_orders', '', 'staff'),
+    ('users management', 'admin_panel:users', '', 'staff'),
+    ('admin logs', 'admin_panel:logs', '', 'staff'),
+    ('admin logs by action', 'admin_panel:logs', '?action=login', 'staff'),
+]
+
+# Plan fragments that mean the table is read in full or sorted on the fly. A
+# scan along an index is read in order and stops at the page's LIMIT.
+SQLITE_WARNINGS = ('SCAN ', 'USE TEMP B-TREE')
+SQLITE_HARMLESS = ('VIRTUAL TABLE', 'CONSTANT ROW', 'USING INDEX', 'USING COVERING INDEX', 'USING INTEGER PRIMARY KEY')
+POSTGRES_WARNINGS = ('Seq Scan', 'Sort ')
+
+# Tables that stay small whatever the traffic, or that belong to Django and
+# cannot take our indexes
+SKIPPED_TABLES = ('django_session', 'admin_panel_dashboardstat', 'orders_ordernumbersequence', 'auth_user')
+
+# Reviewed findings, by (label, plan line), that no index removes
+ACCEPTED = {
+    ('order list', 'USE TEMP B-TREE FOR GROUP BY'): "one customer's orders, and the histogram is cached",
+    ('reservation list', 'USE TEMP B-TREE FOR GROUP BY'): "one customer's reservations, and the histogram is cached",
+    ('orders management search', 'USE TEMP B-TREE FOR ORDER BY'): 'results are sorted by their bm25 rank',
+    ('users management', 'SCAN admin_panel_customerstats'): 'newest first walks the user id primary key and stops at the LIMIT',
+}
+
+EXPLAINED_STATEMENTS = ('SELECT', 'UPDATE', 'DELETE')
+
+
+class Command(BaseCommand):
+    help = 'EXPLAIN the queries behind the hot views and commands and flag full scans and temporary sorts'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--show-plans',
+            action='store_true',
+            help='Print the full plan of every query, not only flagged ones',
+        )
+        parser.add_argument(
+            '--fail-on-findings',
+            action='store_true',
+            help='Exit with an error when any query is flagged (for CI)',
+        )
+
+    def handle(self, *args, **options):
+        if connection.vendor not in ('sqlite', 'postgresql'):
+            raise CommandError(f'No plan parser for the {connection.vendor} backend')
+        self.show_plans = options['show_plans']
+        self.verbosity = options['verbosity']
+
+        findings = 0
+        # Sample rows and sessions exist only for the run
+        with transaction.atomic():
+            clients = self.seed()
+            for label, url_name, query_string, who in HOT_VIEWS:
+                with CaptureQueriesContext(connection) as captured:
+                    response = clients[who].get(reverse(url_name) + query_string)
+                if response.status_code >= 400:
+                    self.stdout.write(self.style.ERROR(f'{label}: HTTP {response.status_code}'))
+                findings += self.review(label, captured)
+
+            with CaptureQueriesContext(connection) as captured:
+                advance_due_orders(notify=False)
+            findings += self.review('progress_orders tick', captured)
+
+            scheduler = DeadlineScheduler()
+            scheduler.load()
+            with CaptureQueriesContext(connection) as captured:
+                scheduler.poll()
+            findings += self.review('progress_orders --daemon poll', captured)
+
+            transaction.set_rollback(True)
+
+        if findings:
+            message = f'{findings} queries need an index or a different access path'
+            if options['fail_on_findings']:
+                raise CommandError(message)
+            self.stdout.write(self.style.WARNING(message))
+        else:
+            self.stdout.write(self.style.SUCCESS('No full scans or temporary sorts found'))
+
+    def seed(self):
+        staff = User.objects.create(username='index-advisor-staff', is_staff=True)
+        customer = User.objects.create(username='index-advisor-customer')
+        reservation = Reservation.objects.create(
+            user=customer,
+            pickup_datetime=timezone.now(),
+            delivery_datetime=timezone.now(),
+            address='Index advisor',
+        )
+        order = Order.objects.create(user=customer, reservation=reservation, special_instructions='advisor')
+        OrderItem.objects.create(order=order, item_type=OrderItem.ItemType.SHIRT)
+        Notification.objects.create(user=customer, message='Index advisor')
+        AdminLog.objects.create(admin_user=staff, action_type=AdminLog.ActionType.LOGIN, description='Index advisor')
+
+        # A broken view is reported by status code instead of ending the run
+        clients = {'staff': Client(raise_request_exception=False), 'customer': Client(raise_request_exception=False)}
+        clients['staff'].force_login(staff)
+        clients['customer'].force_login(customer)
+        return clients
+
+    def review(self, label, captured):
+        """Explain every read and write in ``captured`` and return how many were flagged"""
+        flagged = 0
+        for query in captured.captured_queries:
+            sql = query['sql']
+            if not sql.lstrip().upper().startswith(EXPLAINED_STATEMENTS):
+                continue
+            plan = self.explain(sql)
+            problems = [line for line in plan if self.is_problem(line)]
+            for line in problems:
+                if (label, line) in ACCEPTED and self.verbosity > 1:
+                    self.stdout.write(f'{label}: accepted {line} ({ACCEPTED[label, line]})')
+            problems = [line for line in problems if (label, line) not in ACCEPTED]
+            if problems:
+                flagged += 1
+                self.stdout.write(self.style.WARNING(f'{label}: {sql[:160]}'))
+                for line in problems:
+                    self.stdout.write(f'    {line}')
+            elif self.show_plans:
+                self.stdout.write(f'{label}: {sql[:160]}')
+                for line in plan:
+                    self.stdout.write(f'    {line}')
+        return flagged
+
+    def explain(self, sql):
+        with connection.cursor() as cursor:
+            if connection.vendor == 'sqlite':
+                cursor.execute(f'EXPLAIN QUERY PLAN {sql}')
+                return [row[-1] for row in cursor.fetchall()]
+            cursor.execute(f'EXPLAIN {sql}')
+            return [row[0] for row in cursor.fetchall()]
+
+    def is_problem(self, line):
+        if any(table in line for table in SKIPPED_TABLES):
+            return False
+        if connection.vendor == 'sqlite':
+            return any(warning in line for warning in SQLITE_WARNINGS) and not any(
+                harmless in line for harmless in SQLITE_HARMLESS
+            )
+        return any(warning in line for warning in POSTGRES_WARNINGS)
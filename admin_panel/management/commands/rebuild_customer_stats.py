@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand
+
+from admin_panel.customers import rebuild_customer_stats
+from admin_panel.models import CustomerStats
+
+FIELDS = ('lifetime_orders', 'lifetime_spend', 'active_orders', 'last_order_at')
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the per-customer lifetime statistics from the orders table and report any drift'
+
+    def handle(self, *args, **options):
+        before = {row[0]: row[1:] for row in CustomerStats.objects.values_list('user_id', *FIELDS).iterator()}
+
+        users = rebuild_customer_stats()
+
+        drifted = 0
+        for row in CustomerStats.objects.values_list('user_id', *FIELDS).iterator():
+            previous = before.get(row[0])
+            if previous != row[1:]:
+                drifted += 1
+                if options['verbosity'] > 1:
+                    self.stdout.write(self.style.WARNING(f'user {row[0]}: {previous} → {row[1:]}'))
+
+        if drifted:
+            self.stdout.write(self.style.SUCCESS(f'Rebuilt statistics for {users} users, {drifted} had drifted'))
+        else:
+            self.stdout.write(self.style.SUCCESS(f'Rebuilt statistics for {users} users, no drift found'))
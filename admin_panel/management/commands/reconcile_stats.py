@@ -0,0 +1,39 @@
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+
+from admin_panel.models import DashboardStat
+from admin_panel.stats import rebuild_stats
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the dashboard statistics table from scratch and report any drift'
+
+    def handle(self, *args, **options):
+        before = {
+            (stat.metric, stat.bucket): (stat.count, stat.amount)
+            for stat in DashboardStat.objects.all()
+        }
+
+        rows = rebuild_stats()
+
+        # A bucket emptied by deltas keeps a zero row that the rebuild omits
+        empty = (0, Decimal('0.00'))
+        drifted = 0
+        for stat in rows:
+            previous = before.pop((stat.metric, stat.bucket), empty)
+            if previous != (stat.count, stat.amount):
+                drifted += 1
+                self.stdout.write(
+                    self.style.WARNING(f'{stat.metric}/{stat.bucket or "-"}: {previous} → {(stat.count, stat.amount)}')
+                )
+        for (metric, bucket), previous in before.items():
+            if previous == empty:
+                continue
+            drifted += 1
+            self.stdout.write(self.style.WARNING(f'{metric}/{bucket or "-"}: {previous} → removed'))
+
+        if drifted:
+            self.stdout.write(self.style.SUCCESS(f'Rebuilt {len(rows)} statistics, {drifted} had drifted'))
+        else:
+            self.stdout.write(self.style.SUCCESS(f'Rebuilt {len(rows)} statistics, no drift found'))
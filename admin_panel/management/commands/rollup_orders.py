@@ -0,0 +1,32 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from admin_panel import rollups
+
+
+class Command(BaseCommand):
+    help = 'Bring the hourly and daily order rollups up to date with orders changed since the last run'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--full',
+            action='store_true',
+            help='Recount every hour from scratch instead of only the changed ones',
+        )
+        parser.add_argument(
+            '--interval',
+            type=float,
+            help='Keep running, rolling up again every this many seconds',
+        )
+
+    def handle(self, *args, **options):
+        full = options['full']
+        while True:
+            started = time.perf_counter()
+            hours = rollups.roll_up(full=full)
+            full = False
+            self.stdout.write(f'Recounted {hours} hours in {time.perf_counter() - started:.2f}s')
+            if not options['interval']:
+                break
+            time.sleep(options['interval'])
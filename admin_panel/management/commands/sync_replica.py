@@ -0,0 +1,63 @@
+import os
+import sqlite3
+import time
+from contextlib import closing
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, connections
+
+
+class Command(BaseCommand):
+    help = 'Copy the SQLite primary database over the SQLite read replica with the backup API'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--replica',
+            default=getattr(settings, 'REPLICA_DATABASE', None),
+            help='Database alias of the replica',
+        )
+        parser.add_argument(
+            '--interval',
+            type=float,
+            help='Keep running, copying again every this many seconds',
+        )
+
+    def handle(self, *args, **options):
+        alias = options['replica']
+        if alias not in settings.DATABASES:
+            raise CommandError(f'No database "{alias}" is configured; set REPLICA_DB to the replica file')
+        primary, replica = connections[DEFAULT_DB_ALIAS], connections[alias]
+        if primary.vendor != 'sqlite' or replica.vendor != 'sqlite':
+            raise CommandError("Only SQLite replicas are copied here; use the database's own replication")
+        source, target = str(primary.settings_dict['NAME']), str(replica.settings_dict['NAME'])
+        if os.path.abspath(source) == os.path.abspath(target):
+            raise CommandError('The replica is the primary database file')
+
+        while True:
+            started = time.perf_counter()
+            self.copy(source, target)
+            self.stdout.write(f'Replica {alias} synced in {time.perf_counter() - started:.2f}s')
+            if not options['interval']:
+                break
+            time.sleep(options['interval'])
+
+    def copy(self, source, target):
+        """Back up into a scratch file and swap it in, so readers are never blocked"""
+        temporary = f'{target}.sync'
+        for leftover in (temporary, f'{temporary}-journal'):
+            if os.path.exists(leftover):
+                os.remove(leftover)
+        with closing(sqlite3.connect(source)) as src, closing(sqlite3.connect(temporary)) as dst:
+            src.backup(dst)
+            # A WAL primary gives a WAL copy, which must not pick up the
+            # -wal file the previous replica left behind
+            dst.execute('PRAGMA journal_mode=DELETE')
+        try:
+            os.replace(temporary, target)
+        except PermissionError:
+            # Windows will not replace a file that is open; copy in place,
+            # holding readers off for the length of the copy
+            with closing(sqlite3.connect(source)) as src, closing(sqlite3.connect(target)) as dst:
+                src.backup(dst)
+            os.remove(temporary)
@@ -0,0 +1,52 @@
+# Generated by Django 5.2.8 on 2026-10-18 06:50
+
+from decimal import Decimal
+from django.db import migrations, models
+from django.db.models import Count, Sum
+
+
+def seed_dashboard_stats(apps, schema_editor):
+    DashboardStat = apps.get_model('admin_panel', 'DashboardStat')
+    Order = apps.get_model('orders', 'Order')
+    Reservation = apps.get_model('reservations', 'Reservation')
+    User = apps.get_model('auth', 'User')
+
+    rows = [
+        DashboardStat(metric='orders', bucket=status, count=count, amount=amount or Decimal('0.00'))
+        for status, count, amount in Order.objects.order_by().values_list('status').annotate(Count('id'), Sum('total_cost'))
+    ]
+    rows += [
+        DashboardStat(metric='reservations', bucket=status, count=count)
+        for status, count in Reservation.objects.order_by().values_list('status').annotate(Count('id'))
+    ]
+    rows.append(DashboardStat(metric='customers', count=User.objects.filter(is_staff=False, is_superuser=False).count()))
+    DashboardStat.objects.bulk_create(rows)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('admin_panel', '0001_initial'),
+        ('auth', '0012_alter_user_first_name_max_length'),
+        ('orders', '0002_alter_order_options_order_estimated_completion_and_more'),
+        ('reservations', '0002_servicetype_alter_reservation_options_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DashboardStat',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('metric', models.CharField(choices=[('orders', 'Orders'), ('reservations', 'Reservations'), ('customers', 'Customers')], max_length=20)),
+                ('bucket', models.CharField(blank=True, max_length=20)),
+                ('count', models.BigIntegerField(default=0)),
+                ('amount', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=14)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'ordering': ['metric', 'bucket'],
+                'unique_together': {('metric', 'bucket')},
+            },
+        ),
+        migrations.RunPython(seed_dashboard_stats, migrations.RunPython.noop),
+    ]
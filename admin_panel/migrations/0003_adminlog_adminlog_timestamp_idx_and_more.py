@@ -0,0 +1,23 @@
+# Generated by Django 5.2.8 on 2026-10-18 06:56
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('admin_panel', '0002_dashboardstat'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='adminlog',
+            index=models.Index(fields=['timestamp', 'id'], name='adminlog_timestamp_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='adminlog',
+            index=models.Index(fields=['action_type', 'timestamp'], name='adminlog_action_timestamp_idx'),
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.2.8 on 2026-10-18 07:08
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('admin_panel', '0003_adminlog_adminlog_timestamp_idx_and_more'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='adminlog',
+            name='timestamp',
+            field=models.DateTimeField(default=django.utils.timezone.now, editable=False),
+        ),
+    ]
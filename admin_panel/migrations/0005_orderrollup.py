@@ -0,0 +1,33 @@
+# Generated by Django 5.2.8 on 2026-10-18 07:47
+
+from decimal import Decimal
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('admin_panel', '0004_adminlog_timestamp_default'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OrderRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('period', models.CharField(choices=[('hour', 'Hour'), ('day', 'Day')], max_length=4)),
+                ('start', models.DateTimeField()),
+                ('status', models.CharField(max_length=20)),
+                ('priority', models.CharField(blank=True, max_length=20)),
+                ('item_type', models.CharField(blank=True, max_length=20)),
+                ('service_level', models.CharField(blank=True, max_length=20)),
+                ('orders', models.PositiveIntegerField(default=0)),
+                ('items', models.PositiveIntegerField(default=0)),
+                ('revenue', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=14)),
+            ],
+            options={
+                'ordering': ['period', 'start'],
+                'unique_together': {('period', 'start', 'status', 'priority', 'item_type', 'service_level')},
+            },
+        ),
+    ]
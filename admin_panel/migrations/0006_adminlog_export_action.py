@@ -0,0 +1,18 @@
+# Generated by Django 5.2.8 on 2026-10-18 07:50
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('admin_panel', '0005_orderrollup'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='adminlog',
+            name='action_type',
+            field=models.CharField(choices=[('order_update', 'Order Status Update'), ('price_change', 'Price Change'), ('user_action', 'User Management'), ('settings_change', 'Settings Change'), ('login', 'Admin Login'), ('logout', 'Admin Logout'), ('export', 'Data Export')], max_length=20),
+        ),
+    ]
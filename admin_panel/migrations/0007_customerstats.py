@@ -0,0 +1,59 @@
+# Generated by Django 5.2.8 on 2026-10-18 07:52
+
+import django.db.models.deletion
+from decimal import Decimal
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, Max, Q, Sum
+
+
+def seed_customer_stats(apps, schema_editor):
+    CustomerStats = apps.get_model('admin_panel', 'CustomerStats')
+    Order = apps.get_model('orders', 'Order')
+    User = apps.get_model('auth', 'User')
+
+    totals = {
+        user_id: (orders, spend or Decimal('0.00'), active, latest)
+        for user_id, orders, spend, active, latest in Order.objects.order_by().values_list('user_id').annotate(
+            orders=Count('id'), spend=Sum('total_cost'),
+            active=Count('id', filter=~Q(status='delivered')), latest=Max('created_at'),
+        )
+    }
+    CustomerStats.objects.bulk_create(
+        [
+            CustomerStats(
+                user_id=user_id, lifetime_orders=orders, lifetime_spend=spend,
+                active_orders=active, last_order_at=latest,
+            )
+            for user_id in User.objects.values_list('id', flat=True)
+            for orders, spend, active, latest in [totals.get(user_id, (0, Decimal('0.00'), 0, None))]
+        ],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('admin_panel', '0006_adminlog_export_action'),
+        ('auth', '0012_alter_user_first_name_max_length'),
+        ('orders', '0007_map_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CustomerStats',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='customer_stats', serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('lifetime_orders', models.PositiveIntegerField(default=0)),
+                ('lifetime_spend', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=14)),
+                ('active_orders', models.PositiveIntegerField(default=0)),
+                ('last_order_at', models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                'verbose_name_plural': 'customer stats',
+                'indexes': [models.Index(fields=['lifetime_orders', 'user'], name='customer_stats_orders_idx'), models.Index(fields=['lifetime_spend', 'user'], name='customer_stats_spend_idx'), models.Index(fields=['active_orders', 'user'], name='customer_stats_active_idx'), models.Index(fields=['last_order_at', 'user'], name='customer_stats_last_order_idx')],
+            },
+        ),
+        migrations.RunPython(seed_customer_stats, migrations.RunPython.noop),
+    ]
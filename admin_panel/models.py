@@ -1,5 +1,6 @@
 from django.db import models
 from django.contrib.auth.models import User
+from django.utils import timezone
 from decimal import Decimal
 
 
@@ -63,6 +64,7 @@ class AdminLog(models.Model):
         SETTINGS_CHANGE = 'settings_change', 'Settings Change'
         LOGIN = 'login', 'Admin Login'
         LOGOUT = 'logout', 'Admin Logout'
+        EXPORT = 'export', 'Data Export'
     
     admin_user = models.ForeignKey(User, on_delete=models.CASCADE)
     action_type = models.CharField(max_length=20, choices=ActionType.choices)
@@ -70,10 +72,89 @@ class AdminLog(models.Model):
     target_model = models.CharField(max_length=100, blank=True)  # Model name that was affected
     target_id = models.PositiveIntegerField(null=True, blank=True)  # ID of affected object
     ip_address = models.GenericIPAddressField(null=True, blank=True)
-    timestamp = models.DateTimeField(auto_now_add=True)
+    timestamp = models.DateTimeField(default=timezone.now, editable=False)  # Time of the action, not of the buffered write
     
     class Meta:
         ordering = ['-timestamp']
+        indexes = [
+            models.Index(fields=['timestamp', 'id'], name='adminlog_timestamp_idx'),
+            models.Index(fields=['action_type', 'timestamp'], name='adminlog_action_timestamp_idx'),
+        ]
     
     def __str__(self):
         return f"{self.admin_user.username} - {self.get_action_type_display()} at {self.timestamp}"
+
+
+class DashboardStat(models.Model):
+    """Running totals behind the admin dashboard, maintained by deltas"""
+    
+    class Metric(models.TextChoices):
+        ORDERS = 'orders', 'Orders'
+        RESERVATIONS = 'reservations', 'Reservations'
+        CUSTOMERS = 'customers', 'Customers'
+    
+    metric = models.CharField(max_length=20, choices=Metric.choices)
+    bucket = models.CharField(max_length=20, blank=True)  # Status for orders and reservations
+    count = models.BigIntegerField(default=0)
+    amount = models.DecimalField(max_digits=14, decimal_places=2, default=Decimal('0.00'))  # Sum of order total_cost
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        unique_together = ['metric', 'bucket']
+        ordering = ['metric', 'bucket']
+    
+    def __str__(self):
+        return f"{self.metric}/{self.bucket or '-'}: {self.count}"
+
+
+class CustomerStats(models.Model):
+    """Lifetime order totals of one user, maintained by deltas (see admin_panel.customers)"""
+    
+    user = models.OneToOneField(User, on_delete=models.CASCADE, primary_key=True, related_name='customer_stats')
+    lifetime_orders = models.PositiveIntegerField(default=0)
+    lifetime_spend = models.DecimalField(max_digits=14, decimal_places=2, default=Decimal('0.00'))  # Sum of order total_cost
+    active_orders = models.PositiveIntegerField(default=0)  # Not delivered yet
+    last_order_at = models.DateTimeField(null=True, blank=True)
+    
+    class Meta:
+        verbose_name_plural = 'customer stats'
+        # One per sort of the users page, ending in the unique column it seeks on
+        indexes = [
+            models.Index(fields=['lifetime_orders', 'user'], name='customer_stats_orders_idx'),
+            models.Index(fields=['lifetime_spend', 'user'], name='customer_stats_spend_idx'),
+            models.Index(fields=['active_orders', 'user'], name='customer_stats_active_idx'),
+            models.Index(fields=['last_order_at', 'user'], name='customer_stats_last_order_idx'),
+        ]
+    
+    def __str__(self):
+        return f"{self.user}: {self.lifetime_orders} orders"
+    
+    def average_order(self):
+        if not self.lifetime_orders:
+            return Decimal('0.00')
+        return self.lifetime_spend / self.lifetime_orders
+
+
+class OrderRollup(models.Model):
+    """Orders, items and revenue per hour or day of order creation, refreshed by rollup_orders"""
+    
+    class Period(models.TextChoices):
+        HOUR = 'hour', 'Hour'
+        DAY = 'day', 'Day'
+    
+    period = models.CharField(max_length=4, choices=Period.choices)
+    start = models.DateTimeField()
+    status = models.CharField(max_length=20)
+    priority = models.CharField(max_length=20, blank=True)  # Blank for orders without a reservation
+    item_type = models.CharField(max_length=20, blank=True)  # Blank on the order total rows
+    service_level = models.CharField(max_length=20, blank=True)
+    orders = models.PositiveIntegerField(default=0)
+    items = models.PositiveIntegerField(default=0)
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=Decimal('0.00'))
+    
+    class Meta:
+        unique_together = ['period', 'start', 'status', 'priority', 'item_type', 'service_level']
+        ordering = ['period', 'start']
+    
+    def __str__(self):
+        return f"{self.period} {self.start:%Y-%m-%d %H:%M} {self.status}: {self.orders}"
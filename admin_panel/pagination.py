@@ -0,0 +1,146 @@
+import base64
+import binascii
+import json
+from collections.abc import Sequence
+
+from django.core.exceptions import FieldDoesNotExist, ValidationError
+from django.db.models import Q
+
+# Cursor that opens the final page, reached by reading the ordering backwards
+LAST_PAGE = 'last'
+
+
+def encode_cursor(direction, values):
+    """Pack a direction ('n' or 'p') and the edge row's ordering values into a URL-safe cursor"""
+    # Full-precision isoformat: the seek compares timestamps for equality
+    payload = json.dumps(
+        {'d': direction, 'v': list(values)},
+        default=lambda value: value.isoformat() if hasattr(value, 'isoformat') else str(value),
+    )
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor, size):
+    """Return ``(direction, raw_values)``; a missing or malformed cursor opens the first page"""
+    if not cursor:
+        return 'n', None
+    try:
+        payload = json.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+        direction, values = payload['d'], payload['v']
+    except (binascii.Error, ValueError, TypeError, KeyError):
+        return 'n', None
+    if direction not in ('n', 'p') or not isinstance(values, list) or len(values) != size:
+        return 'n', None
+    return direction, values
+
+
+class KeysetPage(Sequence):
+    """One page of a KeysetPaginator, iterable like a Paginator page"""
+
+    def __init__(self, object_list, next_cursor, previous_cursor, count=None):
+        self.object_list = object_list
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+        self.count = count
+
+    def __getitem__(self, index):
+        return self.object_list[index]
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+    def has_other_pages(self):
+        return self.has_next() or self.has_previous()
+
+
+class KeysetPaginator:
+    """Seek pagination over ``queryset`` in ``ordering``.
+
+    Each page is fetched with a WHERE on the ordering columns of the row at
+    its edge instead of an OFFSET, so a deep page costs the same as the first
+    one, and no COUNT(*) is needed. The last ordering field must be unique
+    (normally ``-id``). Pass ``count`` when the total is already known
+    cheaply; it is only displayed.
+    """
+
+    def __init__(self, queryset, per_page, ordering=('-created_at', '-id'), count=None):
+        self.queryset = queryset
+        self.per_page = per_page
+        self.fields = [name.lstrip('-') for name in ordering]
+        self.descending = [name.startswith('-') for name in ordering]
+        self.count = count
+
+    def get_page(self, cursor=None):
+        if cursor == LAST_PAGE:
+            direction, values = 'p', None
+        else:
+            direction, values = self._decode(cursor)
+        forward = direction == 'n'
+
+        queryset = self.queryset.order_by(*self._ordering(forward))
+        if values is not None:
+            queryset = queryset.filter(self._seek(values, forward))
+        rows = list(queryset[:self.per_page + 1])
+        has_more = len(rows) > self.per_page
+        rows = rows[:self.per_page]
+        if not forward:
+            rows.reverse()
+
+        if not rows:
+            return KeysetPage(rows, None, None, self.count)
+
+        # Coming back from a later page there is always a next one, and
+        # coming forward from an earlier page there is always a previous one
+        if forward:
+            has_next, has_previous = has_more, values is not None
+        else:
+            has_next, has_previous = values is not None, has_more
+        return KeysetPage(
+            rows,
+            self._encode('n', rows[-1]) if has_next else None,
+            self._encode('p', rows[0]) if has_previous else None,
+            self.count,
+        )
+
+    def _ordering(self, forward):
+        return [
+            f"{'-' if descending == forward else ''}{name}"
+            for name, descending in zip(self.fields, self.descending)
+        ]
+
+    def _seek(self, values, forward):
+        # (a, b) after (x, y) is: a after x, or a = x and b after y
+        condition = Q()
+        for index, name in enumerate(self.fields):
+            lookup = 'lt' if self.descending[index] == forward else 'gt'
+            step = Q(**{f'{name}__{lookup}': values[index]})
+            for earlier in range(index):
+                step &= Q(**{self.fields[earlier]: values[earlier]})
+            condition |= step
+        return condition
+
+    def _encode(self, direction, row):
+        return encode_cursor(direction, [getattr(row, name) for name in self.fields])
+
+    def _decode(self, cursor):
+        direction, raw_values = decode_cursor(cursor, len(self.fields))
+        if raw_values is None:
+            return direction, None
+        try:
+            return direction, [self._to_python(name, value) for name, value in zip(self.fields, raw_values)]
+        except ValidationError:
+            return 'n', None
+
+    def _to_python(self, name, value):
+        try:
+            field = self.queryset.model._meta.get_field(name)
+        except FieldDoesNotExist:
+            # An annotation such as search_rank; JSON already restored it
+            return value
+        return field.to_python(value)
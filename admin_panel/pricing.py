@@ -0,0 +1,173 @@
+"""Pricing engine: active pricing rules compiled into an in-memory price table.
+
+Every process keeps one compiled table tagged with the pricing version stored
+in AdminSettings under ``pricing_version``. Saving or deleting a PricingRule
+bumps the version (see signals), and each quote compares its table's version
+with the stored one, one indexed single-row read, so all workers pick up a
+change on their next quote. Lines are then priced with dictionary lookups,
+never a query per line.
+"""
+import threading
+from decimal import ROUND_HALF_UP, Decimal
+
+from django.db import IntegrityError, transaction
+from django.db.models import BigIntegerField, F, TextField
+from django.db.models.functions import Cast
+
+from orders.models import OrderItem
+from reservations.models import Reservation
+from .models import AdminSettings, PricingRule
+
+PRICING_VERSION_KEY = 'pricing_version'
+
+CENT = Decimal('0.01')
+
+
+class PriceNotFound(LookupError):
+    """Raised for lines whose service and item have no active pricing rule"""
+
+    def __init__(self, missing):
+        self.missing = sorted(missing)
+        super().__init__(', '.join(f'{service}/{item}' for service, item in self.missing))
+
+
+class PriceMatrix:
+    """Unit prices by priority, then by ``(service_level, item_type)``"""
+
+    def __init__(self, version, prices):
+        self.version = version
+        self.prices = prices
+
+    @classmethod
+    def compile(cls, version):
+        multipliers = {
+            Reservation.Priority.STANDARD.value: lambda rule: Decimal('1'),
+            Reservation.Priority.EXPRESS.value: lambda rule: rule.express_multiplier,
+            Reservation.Priority.RUSH.value: lambda rule: rule.rush_multiplier,
+        }
+        prices = {priority: {} for priority in multipliers}
+        for rule in PricingRule.objects.filter(is_active=True).order_by():
+            for priority, multiplier in multipliers.items():
+                prices[priority][rule.service_category, rule.item_category] = (
+                    (rule.base_price * multiplier(rule)).quantize(CENT, rounding=ROUND_HALF_UP)
+                )
+        return cls(version, prices)
+
+    def unit_price(self, service_level, item_type, priority=Reservation.Priority.STANDARD):
+        try:
+            return self.prices[str(priority)][service_level, item_type]
+        except KeyError:
+            raise PriceNotFound([(service_level, item_type)]) from None
+
+
+class Quote:
+    """Prices of a batch of lines, in the order they were given"""
+
+    def __init__(self, version, priority, lines, total_items, total_cost):
+        self.version = version
+        self.priority = priority
+        # (unit_price, total_price) per line
+        self.lines = lines
+        self.total_items = total_items
+        self.total_cost = total_cost
+
+    def as_dict(self):
+        return {
+            'version': self.version,
+            'priority': self.priority,
+            'lines': [
+                {'unit_price': str(unit_price), 'total_price': str(total_price)}
+                for unit_price, total_price in self.lines
+            ],
+            'total_items': self.total_items,
+            'total_cost': str(self.total_cost),
+        }
+
+
+_matrix_lock = threading.Lock()
+_matrix = None
+
+
+def pricing_version():
+    value = AdminSettings.objects.filter(key=PRICING_VERSION_KEY).values_list('value', flat=True).first()
+    return int(value) if value else 0
+
+
+def bump_pricing_version():
+    """Mark every compiled table stale; called whenever a pricing rule changes"""
+    settings = AdminSettings.objects.filter(key=PRICING_VERSION_KEY)
+    increment = Cast(Cast(F('value'), BigIntegerField()) + 1, TextField())
+    if settings.update(value=increment):
+        return
+    try:
+        with transaction.atomic():
+            AdminSettings.objects.create(
+                key=PRICING_VERSION_KEY,
+                value='1',
+                description='Bumped on every pricing rule change so workers recompile their price tables',
+            )
+    except IntegrityError:
+        # Another process created the row first
+        settings.update(value=increment)
+
+
+def current_matrix():
+    """Return this process's price table, recompiled if the pricing version moved"""
+    global _matrix
+    version = pricing_version()
+    matrix = _matrix
+    if matrix is not None and matrix.version == version:
+        return matrix
+    with _matrix_lock:
+        if _matrix is None or _matrix.version != version:
+            _matrix = PriceMatrix.compile(version)
+        return _matrix
+
+
+def quote(lines, priority=Reservation.Priority.STANDARD, matrix=None):
+    """Price ``lines`` for ``priority`` and return a Quote.
+
+    Each line is an OrderItem or a mapping with ``item_type``, ``service_level``
+    (default wash & fold) and ``quantity`` (default 1). Raises PriceNotFound
+    naming every line without an active rule, and ValueError for an unknown
+    priority or a quantity below 1.
+    """
+    matrix = matrix or current_matrix()
+    prices = matrix.prices.get(str(priority))
+    if prices is None:
+        raise ValueError(f'Unknown priority: {priority}')
+
+    priced = []
+    missing = set()
+    total_items = 0
+    total_cost = Decimal('0.00')
+    for line in lines:
+        if isinstance(line, dict):
+            key = (line.get('service_level', OrderItem.ServiceLevel.WASH_FOLD.value), line.get('item_type'))
+            quantity = int(line.get('quantity', 1))
+        else:
+            key = (line.service_level, line.item_type)
+            quantity = line.quantity
+        if quantity < 1:
+            raise ValueError(f'Quantity must be at least 1, got {quantity}')
+        unit_price = prices.get(key)
+        if unit_price is None:
+            missing.add(key)
+            continue
+        total_price = unit_price * quantity
+        priced.append((unit_price, total_price))
+        total_items += quantity
+        total_cost += total_price
+    if missing:
+        raise PriceNotFound(missing)
+
+    return Quote(matrix.version, str(priority), priced, total_items, total_cost)
+
+
+def price_items(items, priority=Reservation.Priority.STANDARD, matrix=None):
+    """Set ``unit_price`` and ``total_price`` on unsaved OrderItems and return the Quote"""
+    result = quote(items, priority, matrix)
+    for item, (unit_price, total_price) in zip(items, result.lines):
+        item.unit_price = unit_price
+        item.total_price = total_price
+    return result
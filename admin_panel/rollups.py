@@ -0,0 +1,223 @@
+"""Hourly and daily rollups of orders and revenue, behind the dashboard charts.
+
+OrderRollup holds, for each hour and each day of order creation, how many
+orders, items and how much revenue there are by current status and
+reservation priority. Rows with a blank item type and service level are
+order totals (``total_items`` and ``total_cost``); the others break the
+order items down by item type and service level.
+
+rollup_orders keeps them current from a watermark: every hour holding an
+order or reservation changed since the last run is recounted from the
+orders table, then the days those hours fall in are summed from the hourly
+rows. Recounting is idempotent, so runs overlap a little to catch
+transactions that committed late. Deleted orders recount their hour
+straight away. Item edits that leave the order row alone wait for a full
+rebuild.
+"""
+from datetime import datetime, time, timedelta, timezone as dt_timezone
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Count, Max, Min, Sum
+from django.db.models.functions import TruncHour
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from orders.models import Order, OrderItem
+from .models import AdminSettings, OrderRollup
+
+WATERMARK_KEY = 'order_rollup_watermark'
+
+# Rescan this far behind the watermark
+WATERMARK_OVERLAP = timedelta(minutes=5)
+
+HOUR = timedelta(hours=1)
+
+DIMENSIONS = ('status', 'priority', 'item_type', 'service_level')
+
+# Range the time-series endpoint shows by default, and the most periods it returns
+DEFAULT_SPAN = {OrderRollup.Period.HOUR: timedelta(hours=48), OrderRollup.Period.DAY: timedelta(days=30)}
+MAX_PERIODS = {OrderRollup.Period.HOUR: 24 * 31, OrderRollup.Period.DAY: 366}
+
+
+def hour_start(moment):
+    return moment.astimezone(dt_timezone.utc).replace(minute=0, second=0, microsecond=0)
+
+
+def day_start(moment):
+    """Local midnight starting the day ``moment`` falls in"""
+    local = timezone.localtime(moment)
+    return timezone.make_aware(datetime.combine(local.date(), time()))
+
+
+def next_hour(moment):
+    return moment + HOUR
+
+
+def next_day(moment):
+    """Local midnight after ``moment``; days are not all 24 hours long where clocks change"""
+    return timezone.make_aware(datetime.combine(timezone.localtime(moment).date() + timedelta(days=1), time()))
+
+
+def roll_up(now=None, full=False):
+    """Refresh the rollups for orders changed since the watermark; returns the hours recounted.
+
+    The first run, and any run with ``full``, recounts everything.
+    """
+    now = now or timezone.now()
+    watermark = get_watermark()
+    if watermark is None or full:
+        hours = rebuild()
+    else:
+        since = watermark - WATERMARK_OVERLAP
+        hours = _changed_hours(Order.objects.filter(updated_at__gt=since))
+        hours |= _changed_hours(Order.objects.filter(reservation__updated_at__gt=since))
+        refresh_hours(hours)
+        hours = len(hours)
+    set_watermark(now)
+    return hours
+
+
+def rebuild():
+    """Recount every hour and day from the orders table; returns the hours with orders"""
+    bounds = Order.objects.aggregate(first=Min('created_at'), last=Max('created_at'))
+    with transaction.atomic():
+        OrderRollup.objects.all().delete()
+        if bounds['first'] is None:
+            return 0
+        start, end = hour_start(bounds['first']), hour_start(bounds['last']) + HOUR
+        _recount(start, end)
+        _sum_days(day_start(start), next_day(end - HOUR))
+    return OrderRollup.objects.filter(period=OrderRollup.Period.HOUR).values('start').distinct().count()
+
+
+def refresh_hours(hours):
+    """Recount ``hours`` (hour starts) and the days they fall in"""
+    hours = sorted({hour_start(hour) for hour in hours})
+    with transaction.atomic():
+        for start, end in _runs(hours, next_hour):
+            _recount(start, end)
+        days = sorted({day_start(hour) for hour in hours})
+        for start, end in _runs(days, next_day):
+            _sum_days(start, end)
+
+
+def get_watermark():
+    value = AdminSettings.objects.filter(key=WATERMARK_KEY).values_list('value', flat=True).first()
+    return parse_datetime(value) if value else None
+
+
+def set_watermark(moment):
+    AdminSettings.objects.update_or_create(
+        key=WATERMARK_KEY,
+        defaults={
+            'value': moment.isoformat(),
+            'description': 'Orders changed after this time are not in the rollups yet; rollup_orders moves it',
+        },
+    )
+
+
+def _changed_hours(orders):
+    hours = orders.order_by().annotate(hour=TruncHour('created_at', tzinfo=dt_timezone.utc))
+    return set(hours.values_list('hour', flat=True).distinct())
+
+
+def _runs(starts, following):
+    """Merge sorted period starts into ``(start, end)`` runs of consecutive periods"""
+    runs = []
+    for start in starts:
+        if runs and runs[-1][1] == start:
+            runs[-1][1] = following(start)
+        else:
+            runs.append([start, following(start)])
+    return runs
+
+
+def _recount(start, end):
+    """Replace the hourly rows from ``start`` to ``end`` with counts from the orders table"""
+    rows = []
+    orders = (
+        Order.objects.filter(created_at__gte=start, created_at__lt=end).order_by()
+        .annotate(hour=TruncHour('created_at', tzinfo=dt_timezone.utc))
+        .values_list('hour', 'status', 'reservation__priority')
+        .annotate(Count('id'), Sum('total_items'), Sum('total_cost'))
+    )
+    for hour, status, priority, orders_count, items, revenue in orders:
+        rows.append(OrderRollup(
+            period=OrderRollup.Period.HOUR, start=hour, status=status, priority=priority or '',
+            orders=orders_count, items=items or 0, revenue=revenue or Decimal('0.00'),
+        ))
+    items = (
+        OrderItem.objects.filter(order__created_at__gte=start, order__created_at__lt=end).order_by()
+        .annotate(hour=TruncHour('order__created_at', tzinfo=dt_timezone.utc))
+        .values_list('hour', 'order__status', 'order__reservation__priority', 'item_type', 'service_level')
+        .annotate(Count('order_id', distinct=True), Sum('quantity'), Sum('total_price'))
+    )
+    for hour, status, priority, item_type, service_level, orders_count, quantity, revenue in items:
+        rows.append(OrderRollup(
+            period=OrderRollup.Period.HOUR, start=hour, status=status, priority=priority or '',
+            item_type=item_type, service_level=service_level,
+            orders=orders_count, items=quantity or 0, revenue=revenue or Decimal('0.00'),
+        ))
+    OrderRollup.objects.filter(period=OrderRollup.Period.HOUR, start__gte=start, start__lt=end).delete()
+    OrderRollup.objects.bulk_create(rows, batch_size=1000)
+
+
+def _sum_days(start, end):
+    """Replace the daily rows from ``start`` to ``end`` with sums of the hourly rows"""
+    totals = {}
+    hourly = OrderRollup.objects.filter(period=OrderRollup.Period.HOUR, start__gte=start, start__lt=end).values_list(
+        'start', *DIMENSIONS, 'orders', 'items', 'revenue',
+    )
+    for hour, *key, orders_count, items, revenue in hourly.iterator(chunk_size=2000):
+        key = (day_start(hour), *key)
+        total = totals.setdefault(key, [0, 0, Decimal('0.00')])
+        total[0] += orders_count
+        total[1] += items
+        total[2] += revenue
+    OrderRollup.objects.filter(period=OrderRollup.Period.DAY, start__gte=start, start__lt=end).delete()
+    OrderRollup.objects.bulk_create(
+        [
+            OrderRollup(period=OrderRollup.Period.DAY, start=day, **dict(zip(DIMENSIONS, key)),
+                        orders=orders_count, items=items, revenue=revenue)
+            for (day, *key), (orders_count, items, revenue) in totals.items()
+        ],
+        batch_size=1000,
+    )
+
+
+def series(period, start, end, group_by=None, filters=None):
+    """Per-period ``orders``, ``items`` and ``revenue`` from ``start`` to ``end``, read from the rollups.
+
+    Returns ``(period starts, {group: {measure: [values]}})``, zero-filled. Grouping
+    or filtering by item type or service level reads the item rows; anything
+    else reads the order totals.
+    """
+    filters = filters or {}
+    by_item = group_by in ('item_type', 'service_level') or bool({'item_type', 'service_level'} & filters.keys())
+    rows = OrderRollup.objects.filter(period=period, start__gte=start, start__lt=end, **filters)
+    rows = rows.exclude(item_type='') if by_item else rows.filter(item_type='')
+    fields = ['start'] + ([group_by] if group_by else [])
+    aggregated = rows.order_by().values_list(*fields).annotate(Sum('orders'), Sum('items'), Sum('revenue'))
+
+    following = next_hour if period == OrderRollup.Period.HOUR else next_day
+    starts = []
+    moment = start
+    while moment < end:
+        starts.append(moment)
+        moment = following(moment)
+    positions = {moment: position for position, moment in enumerate(starts)}
+    groups = {}
+    for row in aggregated:
+        moment, group = row[0], (row[1] if group_by else 'all')
+        values = groups.setdefault(group or 'none', {
+            'orders': [0] * len(starts), 'items': [0] * len(starts), 'revenue': [0.0] * len(starts),
+        })
+        position = positions.get(moment)
+        if position is None:
+            continue
+        orders_count, items, revenue = row[-3:]
+        values['orders'][position] += orders_count
+        values['items'][position] += items
+        values['revenue'][position] += float(revenue)
+    return starts, groups
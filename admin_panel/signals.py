@@ -0,0 +1,174 @@
+from decimal import Decimal
+
+from django.contrib.auth.models import User
+from django.db.models.signals import post_delete, post_save, pre_delete, pre_save
+from django.dispatch import receiver
+
+from orders.models import Order
+from orders.signals import orders_advanced, orders_created
+from reservations.models import Reservation
+from . import customers
+from .models import CustomerStats, DashboardStat, PricingRule
+from .pricing import bump_pricing_version
+from .rollups import refresh_hours
+from .stats import apply_delta, record_order_change, record_reservation_change
+
+
+@receiver(post_save, sender=Order)
+def order_saved(sender, instance, created, **kwargs):
+    if created:
+        record_order_change(new_status=instance.status, new_cost=Decimal(instance.total_cost))
+        return
+    stored = getattr(instance, '_stored_values', {})
+    record_order_change(
+        old_status=stored.get('status', instance.status),
+        old_cost=Decimal(stored.get('total_cost', instance.total_cost)),
+        new_status=instance.status,
+        new_cost=Decimal(instance.total_cost),
+    )
+
+
+@receiver(pre_delete, sender=Order)
+@receiver(pre_delete, sender=Reservation)
+def remember_stored_row(sender, instance, **kwargs):
+    # The instance may be stale (e.g. advanced in bulk since it was loaded); the
+    # deletion runs in a transaction, which keeps the row locked until it commits
+    instance._stored_values = sender.objects.select_for_update().filter(pk=instance.pk).values().first() or {}
+
+
+@receiver(post_delete, sender=Order)
+def order_deleted(sender, instance, **kwargs):
+    stored = getattr(instance, '_stored_values', {})
+    if stored:
+        record_order_change(old_status=stored['status'], old_cost=stored['total_cost'])
+
+
+
+@receiver(post_delete, sender=Order)
+def recount_rollup_hour(sender, instance, **kwargs):
+    # Deleted rows never show up in the rollups' change scan
+    refresh_hours([instance.created_at])
+
+
+@receiver(orders_advanced)
+def orders_advanced_in_bulk(sender, current_status, next_status, rows, **kwargs):
+    moved_cost = sum((row[3] for row in rows), Decimal('0.00'))
+    record_order_change(current_status, moved_cost, next_status, moved_cost, count=len(rows))
+
+
+@receiver(orders_created)
+def orders_created_in_bulk(sender, orders, **kwargs):
+    by_status = {}
+    for order in orders:
+        count, cost = by_status.get(order.status, (0, Decimal('0.00')))
+        by_status[order.status] = (count + 1, cost + Decimal(order.total_cost))
+    for status, (count, cost) in by_status.items():
+        record_order_change(new_status=status, new_cost=cost, count=count)
+
+
+@receiver(post_save, sender=Order)
+def order_saved_for_customer(sender, instance, created, **kwargs):
+    new = (instance.user_id, instance.status, Decimal(instance.total_cost))
+    if created:
+        customers.record_order_change(new=new, ordered_at=instance.created_at)
+        return
+    stored = getattr(instance, '_stored_values', {})
+    old = (
+        stored.get('user_id', instance.user_id),
+        stored.get('status', instance.status),
+        Decimal(stored.get('total_cost', instance.total_cost)),
+    )
+    customers.record_order_change(old, new, ordered_at=instance.created_at)
+
+
+@receiver(post_delete, sender=Order)
+def order_deleted_for_customer(sender, instance, **kwargs):
+    stored = getattr(instance, '_stored_values', {})
+    if stored:
+        customers.record_order_change(old=(stored['user_id'], stored['status'], stored['total_cost']))
+
+
+@receiver(orders_advanced)
+def orders_advanced_for_customers(sender, current_status, next_status, rows, **kwargs):
+    change = int(customers.is_active(next_status)) - int(customers.is_active(current_status))
+    if not change:
+        return
+    moved = {}
+    for order_id, user_id, order_number, total_cost in rows:
+        moved[user_id] = moved.get(user_id, 0) + 1
+    for user_id, count in moved.items():
+        customers.apply_delta(user_id, active=change * count)
+
+
+@receiver(orders_created)
+def orders_created_for_customers(sender, orders, **kwargs):
+    by_user = {}
+    for order in orders:
+        count, spend, active, latest = by_user.get(order.user_id, (0, Decimal('0.00'), 0, order.created_at))
+        by_user[order.user_id] = (
+            count + 1,
+            spend + Decimal(order.total_cost),
+            active + customers.is_active(order.status),
+            max(latest, order.created_at),
+        )
+    for user_id, (count, spend, active, latest) in by_user.items():
+        customers.apply_delta(user_id, orders=count, spend=spend, active=active, ordered_at=latest)
+
+
+@receiver(post_save, sender=Reservation)
+def reservation_saved(sender, instance, created, **kwargs):
+    if created:
+        record_reservation_change(new_status=instance.status)
+    else:
+        stored = getattr(instance, '_stored_values', {})
+        record_reservation_change(stored.get('status', instance.status), instance.status)
+
+
+@receiver(post_delete, sender=Reservation)
+def reservation_deleted(sender, instance, **kwargs):
+    stored = getattr(instance, '_stored_values', {})
+    if stored:
+        record_reservation_change(old_status=stored['status'])
+
+
+def is_customer(user):
+    return not (user.is_staff or user.is_superuser)
+
+
+@receiver(pre_save, sender=User)
+def remember_customer_flag(sender, instance, update_fields=None, **kwargs):
+    # Logins save last_login only; skip the lookup unless the role can change
+    if instance._state.adding or (update_fields and not {'is_staff', 'is_superuser'} & set(update_fields)):
+        return
+    stored = User.objects.filter(pk=instance.pk).values('is_staff', 'is_superuser').first()
+    if stored is not None:
+        instance._was_customer = not (stored['is_staff'] or stored['is_superuser'])
+
+
+@receiver(post_save, sender=User)
+def create_customer_stats(sender, instance, created, **kwargs):
+    if created:
+        CustomerStats.objects.get_or_create(user=instance)
+
+
+@receiver(post_save, sender=User)
+def user_saved(sender, instance, created, **kwargs):
+    if created:
+        was_customer = False
+    else:
+        was_customer = getattr(instance, '_was_customer', is_customer(instance))
+    if was_customer != is_customer(instance):
+        apply_delta(DashboardStat.Metric.CUSTOMERS, count=1 if is_customer(instance) else -1)
+    instance._was_customer = is_customer(instance)
+
+
+@receiver(post_delete, sender=User)
+def user_deleted(sender, instance, **kwargs):
+    if is_customer(instance):
+        apply_delta(DashboardStat.Metric.CUSTOMERS, count=-1)
+
+
+@receiver(post_save, sender=PricingRule)
+@receiver(post_delete, sender=PricingRule)
+def pricing_rule_changed(sender, **kwargs):
+    bump_pricing_version()
@@ -0,0 +1,105 @@
+from decimal import Decimal
+
+from django.contrib.auth.models import User
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Sum
+
+from orders.models import Order
+from reservations.models import Reservation
+from .models import DashboardStat
+
+
+def apply_delta(metric, bucket='', count=0, amount=Decimal('0.00')):
+    """Add ``count`` and ``amount`` to one running total"""
+    if not count and not amount:
+        return
+    counters = DashboardStat.objects.filter(metric=metric, bucket=bucket)
+    if counters.update(count=F('count') + count, amount=F('amount') + amount):
+        return
+    try:
+        with transaction.atomic():
+            DashboardStat.objects.create(metric=metric, bucket=bucket, count=count, amount=amount)
+    except IntegrityError:
+        # Another process created the row first
+        counters.update(count=F('count') + count, amount=F('amount') + amount)
+
+
+def record_order_change(old_status=None, old_cost=Decimal('0.00'), new_status=None, new_cost=Decimal('0.00'), count=1):
+    """Move ``count`` orders worth ``old_cost``/``new_cost`` between status buckets.
+
+    Pass ``old_status=None`` for created orders and ``new_status=None`` for deleted ones.
+    """
+    if old_status == new_status:
+        apply_delta(DashboardStat.Metric.ORDERS, new_status, amount=new_cost - old_cost)
+        return
+    if old_status is not None:
+        apply_delta(DashboardStat.Metric.ORDERS, old_status, -count, -old_cost)
+    if new_status is not None:
+        apply_delta(DashboardStat.Metric.ORDERS, new_status, count, new_cost)
+
+
+def record_reservation_change(old_status=None, new_status=None):
+    """Move one reservation between status buckets (``None`` for create/delete)"""
+    if old_status == new_status:
+        return
+    if old_status is not None:
+        apply_delta(DashboardStat.Metric.RESERVATIONS, old_status, -1)
+    if new_status is not None:
+        apply_delta(DashboardStat.Metric.RESERVATIONS, new_status, 1)
+
+
+def dashboard_stats():
+    """Read every running total with one query and shape it for the dashboard"""
+    order_counts = dict.fromkeys(Order.Status.values, 0)
+    order_amounts = dict.fromkeys(Order.Status.values, Decimal('0.00'))
+    total_reservations = 0
+    total_users = 0
+
+    for metric, bucket, count, amount in DashboardStat.objects.values_list('metric', 'bucket', 'count', 'amount'):
+        if metric == DashboardStat.Metric.ORDERS:
+            order_counts[bucket] = count
+            order_amounts[bucket] = amount
+        elif metric == DashboardStat.Metric.RESERVATIONS:
+            total_reservations += count
+        elif metric == DashboardStat.Metric.CUSTOMERS:
+            total_users = count
+
+    total_orders = sum(order_counts.values())
+    pending_orders = order_counts[Order.Status.PENDING]
+    completed_orders = order_counts[Order.Status.DELIVERED]
+
+    return {
+        'total_orders': total_orders,
+        'pending_orders': pending_orders,
+        'active_orders': total_orders - pending_orders - completed_orders,
+        'completed_orders': completed_orders,
+        'total_users': total_users,
+        'total_reservations': total_reservations,
+        'total_revenue': order_amounts[Order.Status.DELIVERED],
+        'status_distribution': [
+            {'status': status, 'count': count}
+            for status, count in sorted(order_counts.items())
+            if count
+        ],
+    }
+
+
+def rebuild_stats():
+    """Recompute every running total from the source tables"""
+    rows = [
+        DashboardStat(metric=DashboardStat.Metric.ORDERS, bucket=status, count=count, amount=amount or Decimal('0.00'))
+        for status, count, amount in Order.objects.order_by().values_list('status').annotate(Count('id'), Sum('total_cost'))
+    ]
+    rows += [
+        DashboardStat(metric=DashboardStat.Metric.RESERVATIONS, bucket=status, count=count)
+        for status, count in Reservation.objects.order_by().values_list('status').annotate(Count('id'))
+    ]
+    rows.append(DashboardStat(
+        metric=DashboardStat.Metric.CUSTOMERS,
+        count=User.objects.filter(is_staff=False, is_superuser=False).count(),
+    ))
+
+    with transaction.atomic():
+        DashboardStat.objects.all().delete()
+        DashboardStat.objects.bulk_create(rows)
+    return rows
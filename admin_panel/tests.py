@@ -1,3 +1,304 @@
+import json
+import os
+import tempfile
+from datetime import timedelta
+from decimal import Decimal
+from pathlib import Path
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.db import OperationalError
 from django.test import TestCase
+from django.utils import timezone
+
+from orders.models import Order
+from orders.progression import apply_transition
+from reservations.models import Reservation
+from . import audit
+from .customers import rebuild_customer_stats
+from .models import AdminLog, CustomerStats, DashboardStat
+from .stats import dashboard_stats, rebuild_stats
+
+
+class DeltaTestCase(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.customer = User.objects.create_user('delta-customer', password='password')
+        now = timezone.now()
+        cls.reservation = Reservation.objects.create(
+            user=cls.customer,
+            pickup_datetime=now + timedelta(days=1),
+            delivery_datetime=now + timedelta(days=2),
+            address='Naval, Biliran',
+        )
+
+    def order(self, total_cost='10.00', status=Order.Status.PENDING, user=None):
+        return Order.objects.create(
+            user=user or self.customer,
+            reservation=self.reservation,
+            total_cost=Decimal(total_cost),
+            status=status,
+        )
+
+
+class DashboardStatTests(DeltaTestCase):
+    def totals(self):
+        return {
+            (metric, bucket): (count, amount)
+            for metric, bucket, count, amount in DashboardStat.objects.values_list('metric', 'bucket', 'count', 'amount')
+            if count or amount
+        }
+
+    def assertMatchesRebuild(self):
+        maintained = self.totals()
+        rebuild_stats()
+        self.assertEqual(maintained, self.totals())
+
+    def test_saves_move_orders_between_buckets(self):
+        order = self.order('10.00')
+        order.status = Order.Status.CONFIRMED
+        order.total_cost = Decimal('12.50')
+        order.save()
+
+        stats = dashboard_stats()
+        self.assertEqual(stats['total_orders'], 1)
+        self.assertEqual(stats['pending_orders'], 0)
+        self.assertEqual(stats['active_orders'], 1)
+        self.assertMatchesRebuild()
+
+    def test_delete_removes_the_order(self):
+        self.order('10.00')
+        self.order('5.00').delete()
+
+        self.assertEqual(dashboard_stats()['total_orders'], 1)
+        self.assertMatchesRebuild()
+
+    def test_apply_transition_moves_the_bucket(self):
+        orders = [self.order('10.00', Order.Status.OUT_FOR_DELIVERY) for _ in range(3)]
+
+        apply_transition(Order.Status.OUT_FOR_DELIVERY, Order.Status.DELIVERED, order_ids=[order.pk for order in orders[:2]], notify=False)
+
+        stats = dashboard_stats()
+        self.assertEqual(stats['completed_orders'], 2)
+        self.assertEqual(stats['total_revenue'], Decimal('20.00'))
+        self.assertMatchesRebuild()
+
+    def test_stale_instance_counts_a_change_once(self):
+        order = self.order('10.00', Order.Status.OUT_FOR_DELIVERY)
+        apply_transition(Order.Status.OUT_FOR_DELIVERY, Order.Status.DELIVERED, order_ids=[order.pk], notify=False)
+
+        # Loaded before the transition, as update_order_status would have it
+        order.status = Order.Status.DELIVERED
+        order.save()
+
+        self.assertEqual(dashboard_stats()['completed_orders'], 1)
+        self.assertMatchesRebuild()
+
+    def test_stale_instance_deletes_the_stored_order(self):
+        order = self.order('10.00')
+        apply_transition(Order.Status.PENDING, Order.Status.CONFIRMED, order_ids=[order.pk], notify=False)
+
+        order.delete()
+
+        self.assertEqual(dashboard_stats()['total_orders'], 0)
+        self.assertMatchesRebuild()
+
+    def test_reservation_changes(self):
+        reservation = Reservation.objects.get(pk=self.reservation.pk)
+        reservation.status = Reservation.Status.CONFIRMED
+        reservation.save()
+        stale = Reservation.objects.get(pk=self.reservation.pk)
+        reservation.status = Reservation.Status.COMPLETED
+        reservation.save()
+        stale.status = Reservation.Status.COMPLETED
+        stale.save()
+
+        self.assertEqual(dashboard_stats()['total_reservations'], 1)
+        self.assertMatchesRebuild()
+
+        reservation.delete()
+        self.assertEqual(dashboard_stats()['total_reservations'], 0)
+        self.assertMatchesRebuild()
+
+
+class CustomerStatsTests(DeltaTestCase):
+    def stats(self, user=None):
+        return CustomerStats.objects.get(user=user or self.customer)
+
+    def assertMatchesRebuild(self):
+        fields = ('user_id', 'lifetime_orders', 'lifetime_spend', 'active_orders', 'last_order_at')
+        maintained = set(CustomerStats.objects.values_list(*fields))
+        rebuild_customer_stats()
+        self.assertEqual(maintained, set(CustomerStats.objects.values_list(*fields)))
+
+    def test_new_user_gets_an_empty_row(self):
+        stats = self.stats()
+        self.assertEqual((stats.lifetime_orders, stats.lifetime_spend, stats.active_orders), (0, Decimal('0.00'), 0))
+        self.assertIsNone(stats.last_order_at)
+
+    def test_saves_update_the_totals(self):
+        first = self.order('10.00')
+        second = self.order('15.00')
+        first.total_cost = Decimal('12.00')
+        first.status = Order.Status.DELIVERED
+        first.save()
+
+        stats = self.stats()
+        self.assertEqual(stats.lifetime_orders, 2)
+        self.assertEqual(stats.lifetime_spend, Decimal('27.00'))
+        self.assertEqual(stats.active_orders, 1)
+        self.assertEqual(stats.last_order_at, second.created_at)
+        self.assertMatchesRebuild()
+
+    def test_moving_an_order_to_another_user(self):
+        other = User.objects.create_user('delta-other', password='password')
+        order = self.order('10.00')
+        order.user = other
+        order.save()
+
+        self.assertEqual(self.stats().lifetime_orders, 0)
+        self.assertIsNone(self.stats().last_order_at)
+        self.assertEqual(self.stats(other).lifetime_orders, 1)
+        self.assertMatchesRebuild()
+
+    def test_delete_removes_the_order(self):
+        first = self.order('10.00')
+        self.order('5.00').delete()
+
+        stats = self.stats()
+        self.assertEqual((stats.lifetime_orders, stats.lifetime_spend, stats.active_orders), (1, Decimal('10.00'), 1))
+        self.assertEqual(stats.last_order_at, first.created_at)
+        self.assertMatchesRebuild()
+
+    def test_apply_transition_updates_active_orders(self):
+        orders = [self.order('10.00', Order.Status.OUT_FOR_DELIVERY) for _ in range(3)]
+
+        apply_transition(Order.Status.OUT_FOR_DELIVERY, Order.Status.DELIVERED, order_ids=[order.pk for order in orders[:2]], notify=False)
+
+        self.assertEqual(self.stats().active_orders, 1)
+        self.assertMatchesRebuild()
+
+    def test_bulk_create_adds_the_batch(self):
+        Order.objects.bulk_create([
+            Order(user=self.customer, reservation=self.reservation, total_cost=Decimal('4.00')) for _ in range(3)
+        ])
+
+        stats = self.stats()
+        self.assertEqual((stats.lifetime_orders, stats.lifetime_spend, stats.active_orders), (3, Decimal('12.00'), 3))
+        self.assertMatchesRebuild()
+
+    def test_stale_instance_counts_a_change_once(self):
+        order = self.order('10.00', Order.Status.OUT_FOR_DELIVERY)
+        apply_transition(Order.Status.OUT_FOR_DELIVERY, Order.Status.DELIVERED, order_ids=[order.pk], notify=False)
+
+        # Loaded before the transition, as update_order_status would have it
+        order.status = Order.Status.DELIVERED
+        order.save()
+
+        self.assertEqual(self.stats().active_orders, 0)
+        self.assertMatchesRebuild()
+
+
+class AuditLogBufferTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_user('audit-admin', password='password', is_staff=True)
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = Path(directory.name)
+
+    def entry(self, description):
+        return {
+            'admin_user_id': self.admin.pk,
+            'action_type': AdminLog.ActionType.ORDER_UPDATE,
+            'description': description,
+            'target_model': 'Order',
+            'target_id': None,
+            'ip_address': None,
+            'timestamp': timezone.now().isoformat(),
+        }
+
+    def write_journal(self, name, entries, tail=''):
+        with open(self.directory / name, 'w', encoding='utf-8') as journal:
+            journal.writelines(json.dumps(entry) + '\n' for entry in entries)
+            journal.write(tail)
+
+    def buffer(self):
+        return audit.AuditLogBuffer(self.directory)
+
+    def add(self, buffer, entry):
+        # Flushed by the test rather than the flusher thread
+        with mock.patch.object(audit.threading, 'Thread'):
+            buffer.add(entry)
+
+    def logged(self):
+        return sorted(AdminLog.objects.values_list('description', flat=True))
+
+    def test_flush_writes_the_queue_and_deletes_the_journal(self):
+        buffer = self.buffer()
+        self.add(buffer, self.entry('first'))
+        self.add(buffer, self.entry('second'))
+
+        self.assertEqual(buffer.flush(), 2)
+
+        self.assertEqual(self.logged(), ['first', 'second'])
+        self.assertEqual(list(self.directory.iterdir()), [])
+
+    def test_journal_of_a_dead_worker_is_replayed(self):
+        self.write_journal('audit-999999.jsonl', [self.entry('before the crash')], tail='{"admin_user_id": ')
+
+        with mock.patch.object(audit, 'is_running', return_value=False):
+            buffer = self.buffer()
+
+        self.assertEqual(buffer.flush(), 1)
+        self.assertEqual(self.logged(), ['before the crash'])
+        self.assertEqual(list(self.directory.iterdir()), [])
+
+    def test_journal_of_a_running_worker_is_left_alone(self):
+        self.write_journal('audit-999999.jsonl', [self.entry('still queued')])
+
+        with mock.patch.object(audit, 'is_running', return_value=True):
+            buffer = self.buffer()
+
+        self.assertEqual(buffer.flush(), 0)
+        self.assertEqual(self.logged(), [])
+        self.assertTrue((self.directory / 'audit-999999.jsonl').exists())
+
+    def test_journal_left_under_a_reused_pid_is_replayed(self):
+        self.write_journal(f'audit-{os.getpid()}.jsonl', [self.entry('from the dead process')])
+
+        buffer = self.buffer()
+        self.add(buffer, self.entry('from this process'))
+
+        self.assertEqual(buffer.flush(), 2)
+        self.assertEqual(self.logged(), ['from the dead process', 'from this process'])
+        self.assertEqual(list(self.directory.iterdir()), [])
+
+    def test_unavailable_database_keeps_the_entries(self):
+        buffer = self.buffer()
+        self.add(buffer, self.entry('kept'))
+
+        with mock.patch.object(buffer, 'insert', side_effect=OperationalError('database is locked')):
+            with self.assertLogs(audit.logger, 'ERROR'):
+                self.assertEqual(buffer.flush(), 0)
+        self.assertEqual(len(list(self.directory.glob('*.pending'))), 1)
+
+        self.assertEqual(buffer.flush(), 1)
+        self.assertEqual(self.logged(), ['kept'])
+        self.assertEqual(list(self.directory.iterdir()), [])
+
+    def test_rejected_entry_goes_to_the_dead_letter_file(self):
+        buffer = self.buffer()
+        self.add(buffer, self.entry('before'))
+        self.add(buffer, dict(self.entry('rejected'), description=None))
+        self.add(buffer, self.entry('after'))
+
+        with self.assertLogs(audit.logger, 'ERROR'):
+            self.assertEqual(buffer.flush(), 2)
 
-# Create your tests here.
+        self.assertEqual(self.logged(), ['after', 'before'])
+        self.assertEqual(list(self.directory.iterdir()), [buffer.dead_letter_path])
+        dead_letters = buffer.dead_letter_path.read_text(encoding='utf-8').splitlines()
+        self.assertEqual([json.loads(line)['description'] for line in dead_letters], [None])
@@ -10,14 +10,17 @@ urlpatterns = [
     
     # Dashboard
     path('', views.dashboard_view, name='dashboard'),
+    path('dashboard/series/', views.dashboard_series, name='dashboard_series'),
     
     # Order Management
     path('orders/', views.orders_management_view, name='orders'),
     path('orders/update-status/<int:order_id>/', views.update_order_status, name='update_order_status'),
+    path('orders/export/', views.export_orders, name='export_orders'),
     
     # Pricing Management
     path('pricing/', views.pricing_management_view, name='pricing'),
     path('pricing/update/', views.update_pricing, name='update_pricing'),
+    path('pricing/quote/', views.quote_view, name='pricing_quote'),
     
     # User Management
     path('users/', views.users_management_view, name='users'),
@@ -26,6 +29,14 @@ urlpatterns = [
     # Pending Orders
     path('orders/pending/', views.pending_orders_view, name='pending_orders'),
     
+    # Delivery Routes
+    path('orders/routes/', views.delivery_routes_view, name='delivery_routes'),
+    path('orders/routes/data/', views.delivery_routes_data, name='delivery_routes_data'),
+    
+    # Order Map
+    path('orders/map/', views.order_map_view, name='order_map'),
+    path('orders/map/data/', views.map_data, name='map_data'),
+    
     # Admin Logs
     path('logs/', views.admin_logs_view, name='logs'),
 ]
@@ -2,18 +2,31 @@ from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required, user_passes_test
 from django.contrib.auth import authenticate, login, logout
 from django.contrib import messages
-from django.http import JsonResponse
+from django.http import JsonResponse, StreamingHttpResponse
 from django.views.decorators.http import require_http_methods
 from django.views.decorators.csrf import csrf_exempt
-from django.core.paginator import Paginator
-from django.db.models import Q, Count, Sum
+from django.db.models import Q
 from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
 from django.contrib.auth.models import User
 import json
+import logging
+import time
+from datetime import datetime
 
-from orders.models import Order, OrderItem
+from orders import mapindex
+from orders.geocoding import locate
+from orders.models import MapPoint, Order, OrderItem
+from orders.routing import DEPOT, MAX_STOPS, MAX_STOPS_LIMIT, plan_routes
+from orders.search import search_orders
 from reservations.models import Reservation, ServiceType
-from .models import PricingRule, AdminSettings, AdminLog
+from .models import PricingRule, AdminSettings, AdminLog, OrderRollup, CustomerStats
+from . import audit, exports, rollups
+from .pagination import KeysetPaginator
+from .pricing import PriceNotFound, quote
+from .stats import dashboard_stats
+
+logger = logging.getLogger(__name__)
 
 
 def is_admin_user(user):
@@ -31,10 +44,11 @@ def log_admin_action(user, action_type, description, target_model=None, target_i
         else:
             ip_address = request.META.get('REMOTE_ADDR')
     
-    AdminLog.objects.create(
-        admin_user=user,
-        action_type=action_type,
-        description=description,
+    # Buffered and written in batches, off the request's write path
+    audit.record(
+        user,
+        action_type,
+        description,
         target_model=target_model,
         target_id=target_id,
         ip_address=ip_address
@@ -73,76 +87,61 @@ def admin_logout_view(request):
 @user_passes_test(is_admin_user)
 def dashboard_view(request):
     """Admin dashboard with overview statistics"""
-    # Get statistics
-    total_orders = Order.objects.count()
-    pending_orders = Order.objects.filter(status='pending').count()
-    active_orders = Order.objects.filter(status__in=['confirmed', 'picked_up', 'washing', 'drying', 'folding', 'ready', 'out_for_delivery']).count()
-    completed_orders = Order.objects.filter(status='delivered').count()
+    # Running totals are maintained by deltas (see admin_panel.stats)
+    context = dashboard_stats()
     
-    total_users = User.objects.filter(is_staff=False, is_superuser=False).count()
-    total_reservations = Reservation.objects.count()
+    # Recent orders
+    context['recent_orders'] = Order.objects.select_related('user', 'reservation').order_by('-created_at')[:10]
     
-    # Revenue statistics
-    from django.db.models import Sum
-    total_revenue = Order.objects.filter(status='delivered').aggregate(Sum('total_cost'))['total_cost__sum'] or 0
+    return render(request, 'admin_panel/dashboard.html', context)
+
+
+def order_filters(request):
+    """The status, search and date filters of the orders page, from the query string"""
+    return {
+        'status': request.GET.get('status', ''),
+        'search': request.GET.get('search', ''),
+        'date_from': request.GET.get('date_from', ''),
+        'date_to': request.GET.get('date_to', ''),
+    }
+
+
+def filter_orders(orders, filters):
+    """Apply ``order_filters`` to ``orders``; returns the queryset and its ordering"""
+    if filters['status']:
+        orders = orders.filter(status=filters['status'])
     
-    # Recent orders
-    recent_orders = Order.objects.select_related('user', 'reservation').order_by('-created_at')[:10]
+    if filters['search']:
+        # Full-text index lookup, best matches first
+        orders = search_orders(orders, filters['search'])
     
-    # Order status distribution
-    status_distribution = Order.objects.values('status').annotate(count=Count('id')).order_by('status')
+    if filters['date_from']:
+        orders = orders.filter(created_at__date__gte=filters['date_from'])
     
-    context = {
-        'total_orders': total_orders,
-        'pending_orders': pending_orders,
-        'active_orders': active_orders,
-        'completed_orders': completed_orders,
-        'total_users': total_users,
-        'total_reservations': total_reservations,
-        'total_revenue': total_revenue,
-        'recent_orders': recent_orders,
-        'status_distribution': status_distribution,
-    }
+    if filters['date_to']:
+        orders = orders.filter(created_at__date__lte=filters['date_to'])
     
-    return render(request, 'admin_panel/dashboard.html', context)
+    if filters['search']:
+        return orders, ('search_rank', '-created_at', '-id')
+    return orders, ('-created_at', '-id')
 
 
 @login_required
 @user_passes_test(is_admin_user)
 def orders_management_view(request):
     """Orders management page"""
-    # Get filter parameters
-    status_filter = request.GET.get('status', '')
-    search_query = request.GET.get('search', '')
-    date_from = request.GET.get('date_from', '')
-    date_to = request.GET.get('date_to', '')
-    
-    # Base queryset
-    orders = Order.objects.select_related('user', 'reservation').prefetch_related('items')
-    
-    # Apply filters
-    if status_filter:
-        orders = orders.filter(status=status_filter)
-    
-    if search_query:
-        orders = orders.filter(
-            Q(order_number__icontains=search_query) |
-            Q(user__username__icontains=search_query) |
-            Q(user__email__icontains=search_query) |
-            Q(user__first_name__icontains=search_query) |
-            Q(user__last_name__icontains=search_query)
-        )
-    
-    if date_from:
-        orders = orders.filter(created_at__date__gte=date_from)
-    
-    if date_to:
-        orders = orders.filter(created_at__date__lte=date_to)
+    filters = order_filters(request)
+    orders, ordering = filter_orders(
+        Order.objects.select_related('user', 'reservation').prefetch_related('items'),
+        filters,
+    )
     
-    # Pagination
-    paginator = Paginator(orders.order_by('-created_at'), 20)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    # Seek pagination; the total is only shown when the stats table already has it
+    total = None
+    if not any(filters.values()):
+        total = dashboard_stats()['total_orders']
+    paginator = KeysetPaginator(orders, 20, ordering=ordering, count=total)
+    page_obj = paginator.get_page(request.GET.get('cursor'))
     
     # Get all status choices for filter dropdown
     status_choices = Order.Status.choices
@@ -150,40 +149,82 @@ def orders_management_view(request):
     context = {
         'page_obj': page_obj,
         'status_choices': status_choices,
-        'current_filters': {
-            'status': status_filter,
-            'search': search_query,
-            'date_from': date_from,
-            'date_to': date_to,
-        }
+        'current_filters': filters,
     }
     
     return render(request, 'admin_panel/orders_management.html', context)
 
 
+# Columns of the orders export, as (header, values_list field)
+EXPORT_COLUMNS = [
+    ('Order #', 'order_number'),
+    ('Created', 'created_at'),
+    ('Status', 'status'),
+    ('Customer', 'user__username'),
+    ('First Name', 'user__first_name'),
+    ('Last Name', 'user__last_name'),
+    ('Email', 'user__email'),
+    ('Items', 'total_items'),
+    ('Total Cost', 'total_cost'),
+    ('Estimated Completion', 'estimated_completion'),
+    ('Priority', 'reservation__priority'),
+    ('Pickup', 'reservation__pickup_datetime'),
+    ('Address', 'reservation__address'),
+    ('Phone', 'reservation__phone_number'),
+    ('Special Instructions', 'special_instructions'),
+]
+
+
+@login_required
+@user_passes_test(is_admin_user)
+@require_http_methods(["GET"])
+def export_orders(request):
+    """Stream the orders matching the orders page filters as CSV or XLSX"""
+    file_format = request.GET.get('format', 'csv')
+    if file_format not in exports.FORMATS:
+        return JsonResponse({'error': f"format must be one of {', '.join(exports.FORMATS)}"}, status=400)
+    filters = order_filters(request)
+    orders, ordering = filter_orders(Order.objects.all(), filters)
+    # The rows are read while the response streams, after ReplicaMiddleware
+    # has finished with the request, so bind them to the database the router
+    # picks for it now: the replica, unless this admin is pinned to the primary
+    orders = orders.using(orders.db)
+    # Tuples straight from the cursor, a chunk at a time
+    rows = orders.order_by(*ordering).values_list(*[field for _, field in EXPORT_COLUMNS]).iterator(chunk_size=exports.CHUNK_SIZE)
+    writer, content_type = exports.FORMATS[file_format]
+    response = StreamingHttpResponse(
+        exports.streaming_content(writer([header for header, _ in EXPORT_COLUMNS], rows), request),
+        content_type=content_type,
+    )
+    response['Content-Disposition'] = f'attachment; filename="orders-{timezone.localtime():%Y%m%d-%H%M}.{file_format}"'
+    
+    applied = ', '.join(f'{name}={value}' for name, value in filters.items() if value) or 'none'
+    log_admin_action(
+        request.user,
+        AdminLog.ActionType.EXPORT,
+        f'Exported orders as {file_format.upper()} (filters: {applied})',
+        request=request,
+    )
+    return response
+
+
 @login_required
 @user_passes_test(is_admin_user)
 @require_http_methods(["POST"])
 def update_order_status(request, order_id):
     """AJAX endpoint to update order status"""
     try:
-        print(f"Updating order {order_id} with data: {request.POST}")
-        
         order = get_object_or_404(Order, id=order_id)
         new_status = request.POST.get('status')
         
-        print(f"Order found: {order.order_number}, current status: {order.status}, new status: {new_status}")
-        
         if new_status not in dict(Order.Status.choices):
-            print(f"Invalid status: {new_status}")
+            logger.info('Rejected status %r for order %s', new_status, order.order_number)
             return JsonResponse({'success': False, 'error': 'Invalid status'})
         
         old_status = order.status
         order.status = new_status
         order.save()
         
-        print(f"Order status updated successfully")
-        
         # Log the action
         log_admin_action(
             request.user,
@@ -201,13 +242,10 @@ def update_order_status(request, order_id):
             'progress_percentage': order.get_progress_percentage()
         }
         
-        print(f"Returning response: {response_data}")
         return JsonResponse(response_data)
         
     except Exception as e:
-        print(f"Error updating order status: {str(e)}")
-        import traceback
-        traceback.print_exc()
+        logger.exception('Error updating the status of order %s', order_id)
         return JsonResponse({'success': False, 'error': str(e)})
 
 
@@ -270,36 +308,90 @@ def update_pricing(request):
         return JsonResponse({'success': False, 'error': str(e)})
 
 
+@login_required
+@require_http_methods(["POST"])
+def quote_view(request):
+    """Price a cart of order lines for a reservation priority in one call"""
+    try:
+        payload = json.loads(request.body)
+        items = payload.get('items', [])
+        if not isinstance(items, list) or not all(isinstance(item, dict) for item in items):
+            raise ValueError('items must be a list of objects')
+        result = quote(items, payload.get('priority', Reservation.Priority.STANDARD))
+    except PriceNotFound as e:
+        return JsonResponse({
+            'success': False,
+            'error': f'No active price for {e}',
+            'missing': [{'service_level': service, 'item_type': item} for service, item in e.missing],
+        }, status=400)
+    except (ValueError, TypeError, AttributeError) as e:
+        return JsonResponse({'success': False, 'error': str(e)}, status=400)
+    
+    return JsonResponse({'success': True, **result.as_dict()})
+
+
+# Sort options of the users page, as (label, keyset ordering); each is backed
+# by an index on CustomerStats ending in the user id
+USER_SORTS = {
+    'newest': ('Newest', ('-user_id',)),
+    'orders': ('Most Orders', ('-lifetime_orders', '-user_id')),
+    'spend': ('Highest Spend', ('-lifetime_spend', '-user_id')),
+    'active': ('Most Active Orders', ('-active_orders', '-user_id')),
+    'last_order': ('Latest Order', ('-last_order_at', '-user_id')),
+}
+
+USER_ACTIVITY_FILTERS = {
+    'active': ('With Active Orders', Q(active_orders__gt=0)),
+    'repeat': ('Repeat Customers', Q(lifetime_orders__gte=2)),
+    'none': ('No Orders Yet', Q(lifetime_orders=0)),
+}
+
+
 @login_required
 @user_passes_test(is_admin_user)
 def users_management_view(request):
     """Users management page"""
     search_query = request.GET.get('search', '')
+    sort = request.GET.get('sort', '')
+    activity = request.GET.get('activity', '')
+    if sort not in USER_SORTS:
+        sort = 'newest'
     
-    users = User.objects.filter(is_staff=False, is_superuser=False)
+    # Lifetime totals are read from CustomerStats, kept current by the order signals
+    customers = CustomerStats.objects.filter(
+        user__is_staff=False, user__is_superuser=False,
+    ).select_related('user')
     
     if search_query:
-        users = users.filter(
-            Q(username__icontains=search_query) |
-            Q(email__icontains=search_query) |
-            Q(first_name__icontains=search_query) |
-            Q(last_name__icontains=search_query)
+        customers = customers.filter(
+            Q(user__username__icontains=search_query) |
+            Q(user__email__icontains=search_query) |
+            Q(user__first_name__icontains=search_query) |
+            Q(user__last_name__icontains=search_query)
         )
     
-    # Add order statistics for each user
-    users = users.annotate(
-        total_orders=Count('orders'),
-        total_spent=Sum('orders__total_cost')
-    ).order_by('-date_joined')
+    if activity in USER_ACTIVITY_FILTERS:
+        customers = customers.filter(USER_ACTIVITY_FILTERS[activity][1])
+    
+    label, ordering = USER_SORTS[sort]
+    if sort == 'last_order':
+        # Seeking past NULLs is not possible, so this lists only customers who have ordered
+        customers = customers.filter(last_order_at__isnull=False)
     
-    # Pagination
-    paginator = Paginator(users, 20)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    # Seek pagination; the total is only shown when the stats table already has it
+    total = None
+    if not search_query and not activity and sort != 'last_order':
+        total = dashboard_stats()['total_users']
+    paginator = KeysetPaginator(customers, 20, ordering=ordering, count=total)
+    page_obj = paginator.get_page(request.GET.get('cursor'))
     
     context = {
         'page_obj': page_obj,
         'search_query': search_query,
+        'sort': sort,
+        'activity': activity,
+        'sort_choices': [(value, label) for value, (label, _) in USER_SORTS.items()],
+        'activity_choices': [(value, label) for value, (label, _) in USER_ACTIVITY_FILTERS.items()],
     }
     
     return render(request, 'admin_panel/users_management.html', context)
@@ -320,10 +412,9 @@ def admin_logs_view(request):
     if admin_filter:
         logs = logs.filter(admin_user__username__icontains=admin_filter)
     
-    # Pagination
-    paginator = Paginator(logs.order_by('-timestamp'), 50)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    # Seek pagination; the log grows without bound, so it is never counted
+    paginator = KeysetPaginator(logs, 50, ordering=('-timestamp', '-id'))
+    page_obj = paginator.get_page(request.GET.get('cursor'))
     
     # Get unique action types and admin users for filters
     action_choices = AdminLog.ActionType.choices
@@ -387,17 +478,174 @@ def user_action(request):
 @user_passes_test(is_admin_user)
 def pending_orders_view(request):
     """View for pending orders specifically"""
-    pending_orders = Order.objects.filter(status='pending').select_related('user', 'reservation').prefetch_related('items').order_by('-created_at')
+    pending_orders = Order.objects.filter(status='pending').select_related('user', 'reservation').prefetch_related('items')
+    pending_count = dashboard_stats()['pending_orders']
     
-    # Pagination
-    paginator = Paginator(pending_orders, 20)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    # Seek pagination
+    paginator = KeysetPaginator(pending_orders, 20, count=pending_count)
+    page_obj = paginator.get_page(request.GET.get('cursor'))
     
     context = {
         'page_obj': page_obj,
-        'pending_count': pending_orders.count(),
+        'pending_count': pending_count,
         'page_title': 'Pending Orders',
     }
     
     return render(request, 'admin_panel/pending_orders.html', context)
+
+
+@login_required
+@user_passes_test(is_admin_user)
+def delivery_routes_view(request):
+    """Map of the delivery batches, drawn from delivery_routes_data"""
+    context = {
+        'max_stops': MAX_STOPS,
+        'max_stops_limit': MAX_STOPS_LIMIT,
+        'page_title': 'Delivery Routes',
+    }
+    return render(request, 'admin_panel/delivery_routes.html', context)
+
+
+@login_required
+@user_passes_test(is_admin_user)
+@require_http_methods(["GET"])
+def delivery_routes_data(request):
+    """Ready and out-for-delivery orders batched into driver routes, as JSON"""
+    try:
+        max_stops = int(request.GET.get('max_stops') or MAX_STOPS)
+        drivers = int(request.GET['drivers']) if request.GET.get('drivers') else None
+    except ValueError:
+        return JsonResponse({'error': 'max_stops and drivers must be whole numbers'}, status=400)
+    if not 1 <= max_stops <= MAX_STOPS_LIMIT or (drivers is not None and drivers < 1):
+        return JsonResponse({'error': f'max_stops must be 1 to {MAX_STOPS_LIMIT} and drivers at least 1'}, status=400)
+    statuses = [Order.Status.READY, Order.Status.OUT_FOR_DELIVERY]
+    if request.GET.get('status') in statuses:
+        statuses = [request.GET['status']]
+
+    started = time.perf_counter()
+    orders = {
+        order['id']: order
+        for order in Order.objects.filter(status__in=statuses).order_by('id').values(
+            'id', 'order_number', 'status', 'user__username', 'reservation__address',
+        )
+    }
+    located = locate({order['reservation__address'] for order in orders.values() if order['reservation__address']})
+    stops, unlocated = [], []
+    for order in orders.values():
+        point = located.get(order['reservation__address'])
+        if point is None:
+            unlocated.append({'id': order['id'], 'order_number': order['order_number'], 'address': order['reservation__address'] or ''})
+        else:
+            stops.append((order['id'], *point))
+    routes = plan_routes(stops, max_stops=max_stops, drivers=drivers)
+
+    def stop(order_id):
+        order = orders[order_id]
+        latitude, longitude = located[order['reservation__address']]
+        return {
+            'id': order_id,
+            'order_number': order['order_number'],
+            'status': order['status'],
+            'customer': order['user__username'],
+            'address': order['reservation__address'],
+            'lat': latitude,
+            'lng': longitude,
+        }
+
+    return JsonResponse({
+        'depot': list(DEPOT),
+        'batches': [
+            {'driver': number, 'distance_km': route['distance_km'], 'stops': [stop(order_id) for order_id in route['stops']]}
+            for number, route in enumerate(routes, 1)
+        ],
+        'unlocated': unlocated,
+        'planned_ms': round((time.perf_counter() - started) * 1000, 1),
+    })
+
+
+@login_required
+@user_passes_test(is_admin_user)
+def order_map_view(request):
+    """Map of orders and reservations, loaded per viewport from map_data"""
+    context = {
+        'order_statuses': Order.Status.choices,
+        'reservation_statuses': Reservation.Status.choices,
+        'page_title': 'Order Map',
+    }
+    return render(request, 'admin_panel/order_map.html', context)
+
+
+@login_required
+@user_passes_test(is_admin_user)
+@require_http_methods(["GET"])
+def map_data(request):
+    """GeoJSON of the orders and reservations inside ``bbox``, clustered below the point zoom.
+
+    ``bbox`` is west,south,east,north as Leaflet's toBBoxString() gives it.
+    """
+    try:
+        west, south, east, north = (float(value) for value in request.GET['bbox'].split(','))
+        zoom = int(request.GET['zoom'])
+    except (KeyError, ValueError):
+        return JsonResponse({'error': 'bbox (west,south,east,north) and zoom are required'}, status=400)
+    if not (south <= north and west <= east and 0 <= zoom <= 22):
+        return JsonResponse({'error': 'bbox must run south to north and west to east, and zoom from 0 to 22'}, status=400)
+    kinds = [kind for kind in request.GET.getlist('kind') if kind in MapPoint.Kind.values]
+    statuses = [status for status in request.GET.getlist('status') if status]
+    return JsonResponse({
+        'type': 'FeatureCollection',
+        'features': mapindex.features(south, west, north, east, zoom, kinds=kinds, statuses=statuses),
+    })
+
+
+def _parse_moment(value):
+    """A datetime, or the start of a date, from a query parameter; None when absent"""
+    if not value:
+        return None
+    moment = parse_datetime(value)
+    if moment is None:
+        day = parse_date(value)
+        if day is None:
+            raise ValueError(value)
+        moment = datetime.combine(day, datetime.min.time())
+    return moment if timezone.is_aware(moment) else timezone.make_aware(moment)
+
+
+@login_required
+@user_passes_test(is_admin_user)
+@require_http_methods(["GET"])
+def dashboard_series(request):
+    """Orders, items and revenue per hour or day for the dashboard charts, read from the rollups only.
+
+    ``start`` and ``end`` are dates or datetimes, both periods included. Filter with
+    ``status``, ``priority`` (``none`` for walk-ins), ``item_type`` and ``service_level``,
+    and split the series with ``group_by``, one of those four.
+    """
+    period = request.GET.get('period', OrderRollup.Period.DAY)
+    group_by = request.GET.get('group_by') or None
+    if period not in OrderRollup.Period.values or (group_by is not None and group_by not in rollups.DIMENSIONS):
+        return JsonResponse({'error': f"period must be hour or day, and group_by one of {', '.join(rollups.DIMENSIONS)}"}, status=400)
+    try:
+        end = _parse_moment(request.GET.get('end')) or timezone.now()
+        start = _parse_moment(request.GET.get('start')) or end - rollups.DEFAULT_SPAN[period]
+    except ValueError:
+        return JsonResponse({'error': 'start and end must be dates or datetimes'}, status=400)
+    if period == OrderRollup.Period.HOUR:
+        start, end = rollups.hour_start(start), rollups.next_hour(rollups.hour_start(end))
+        periods = (end - start) / rollups.HOUR
+    else:
+        start, end = rollups.day_start(start), rollups.next_day(end)
+        periods = (end - start).days
+    if not 0 < periods <= rollups.MAX_PERIODS[period]:
+        return JsonResponse({'error': f'start must come before end, at most {rollups.MAX_PERIODS[period]} {period}s apart'}, status=400)
+    filters = {field: request.GET[field] for field in rollups.DIMENSIONS if field in request.GET}
+    if filters.get('priority') == 'none':
+        filters['priority'] = ''
+
+    starts, groups = rollups.series(period, start, end, group_by=group_by, filters=filters)
+    return JsonResponse({
+        'period': period,
+        'group_by': group_by,
+        'starts': [moment.isoformat() for moment in starts],
+        'series': [{'group': group, **values} for group, values in sorted(groups.items())],
+    })
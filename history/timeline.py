@@ -0,0 +1,91 @@
+"""Newest-first timeline merged from several date-ordered querysets.
+
+Each source is read through its own keyset-limited queryset, at most one
+page plus one row, and the streams are combined with a lazy k-way merge.
+Rows are ordered by ``(created_at, kind, id)`` so that a cursor names one
+exact position in the merged timeline, even when two rows of different
+kinds share a timestamp.
+"""
+import heapq
+from itertools import islice
+
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+
+from admin_panel.pagination import LAST_PAGE, KeysetPage, decode_cursor, encode_cursor
+
+
+def merge_page(sources, per_page, cursor=None):
+    """Return one ``KeysetPage`` of ``(kind, instance)`` pairs.
+
+    ``sources`` maps a kind name to a queryset with a ``created_at`` field.
+    Kinds break ties between equal timestamps, so their names must not change
+    while cursors built on them are in use.
+    """
+    if cursor == LAST_PAGE:
+        direction, position = 'p', None
+    else:
+        direction, position = _decode(cursor, sources)
+    forward = direction == 'n'
+
+    streams = [
+        _stream(kind, queryset, position, forward, per_page + 1)
+        for kind, queryset in sources.items()
+    ]
+    merged = heapq.merge(*streams, reverse=forward)
+    rows = list(islice(merged, per_page + 1))
+    has_more = len(rows) > per_page
+    rows = rows[:per_page]
+    if not forward:
+        rows.reverse()
+
+    entries = [(kind, instance) for (_created_at, kind, _id), instance in rows]
+    if not rows:
+        return KeysetPage(entries, None, None)
+
+    if forward:
+        has_next, has_previous = has_more, position is not None
+    else:
+        has_next, has_previous = position is not None, has_more
+    return KeysetPage(
+        entries,
+        encode_cursor('n', rows[-1][0]) if has_next else None,
+        encode_cursor('p', rows[0][0]) if has_previous else None,
+    )
+
+
+def _stream(kind, queryset, position, forward, limit):
+    """Yield ``(key, instance)`` from one source in merge order, reading at most ``limit`` rows"""
+    ordering = ('-created_at', '-id') if forward else ('created_at', 'id')
+    queryset = queryset.order_by(*ordering)
+    if position is not None:
+        queryset = queryset.filter(_seek(kind, position, forward))
+    for instance in queryset[:limit].iterator(chunk_size=limit):
+        yield (instance.created_at, kind, instance.pk), instance
+
+
+def _seek(kind, position, forward):
+    """Rows of ``kind`` strictly after ``position`` in the direction of travel"""
+    created_at, position_kind, position_id = position
+    before, after = ('lt', 'gt') if forward else ('gt', 'lt')
+    strictly = Q(**{f'created_at__{before}': created_at})
+    if kind == position_kind:
+        return strictly | Q(created_at=created_at, **{f'id__{before}': position_id})
+    # Same timestamp: this kind sorts before or after the position's kind
+    if (kind < position_kind) == forward:
+        return strictly | Q(created_at=created_at)
+    return strictly
+
+
+def _decode(cursor, sources):
+    direction, values = decode_cursor(cursor, 3)
+    if values is None:
+        return direction, None
+    created_at, kind, pk = values
+    try:
+        created_at = parse_datetime(created_at)
+    except (TypeError, ValueError):
+        created_at = None
+    if created_at is None or kind not in sources or not isinstance(pk, int):
+        return 'n', None
+    return direction, (created_at, kind, pk)
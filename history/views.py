@@ -1,10 +1,16 @@
 from django.shortcuts import render
 from django.contrib.auth.decorators import login_required
-from django.db.models import Q
+from django.contrib.auth.models import User
+from django.db.models import Count, OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce
 from django.utils import timezone
-from datetime import datetime, timedelta
+from datetime import timedelta
+from decimal import Decimal
 from orders.models import Order
 from reservations.models import Reservation
+from .timeline import merge_page
+
+HISTORY_PAGE_SIZE = 20
 
 
 @login_required
@@ -16,11 +22,12 @@ def history_view(request):
     status_filter = request.GET.get('status', 'all')
     
     # Calculate date range
-    if date_range != 'all':
-        days = int(date_range)
-        start_date = timezone.now() - timedelta(days=days)
-    else:
+    if date_range == 'all':
         start_date = None
+    else:
+        if not date_range.isdigit():
+            date_range = '30'
+        start_date = timezone.now() - timedelta(days=int(date_range))
     
     # Get orders
     orders = Order.objects.filter(user=request.user)
@@ -36,53 +43,33 @@ def history_view(request):
     if status_filter != 'all':
         reservations = reservations.filter(status=status_filter)
     
-    # Combine and sort by date
-    history_items = []
-    
+    sources = {}
     if filter_type in ['all', 'orders']:
-        for order in orders:
-            history_items.append({
-                'type': 'order',
-                'id': order.id,
-                'title': f'Order #{order.id}',
-                'status': order.status,
-                'date': order.created_at,
-                'cost': order.total_cost,
-                'items_count': order.total_items,
-                'reservation': order.reservation,
-                'completion_date': order.estimated_completion,
-                'object': order
-            })
-    
+        sources['order'] = orders
     if filter_type in ['all', 'reservations']:
-        for reservation in reservations:
-            history_items.append({
-                'type': 'reservation',
-                'id': reservation.id,
-                'title': f'Reservation #{reservation.id}',
-                'status': reservation.status,
-                'date': reservation.created_at,
-                'pickup_time': reservation.pickup_time,
-                'delivery_time': reservation.delivery_time,
-                'service_type': reservation.get_service_type_display(),
-                'priority': reservation.priority,
-                'object': reservation
-            })
-    
-    # Sort by date (newest first)
-    history_items.sort(key=lambda x: x['date'], reverse=True)
-    
-    # Get statistics
-    stats = {
-        'total_orders': Order.objects.filter(user=request.user).count(),
-        'completed_orders': Order.objects.filter(user=request.user, status='delivered').count(),
-        'total_reservations': Reservation.objects.filter(user=request.user).count(),
-        'completed_reservations': Reservation.objects.filter(user=request.user, status='completed').count(),
-        'total_spent': sum(order.total_cost or 0 for order in Order.objects.filter(user=request.user)),
-    }
+        sources['reservation'] = reservations.select_related('service_type')
+
+    page_obj = merge_page(sources, HISTORY_PAGE_SIZE, request.GET.get('cursor'))
+    history_items = [
+        _order_item(instance) if kind == 'order' else _reservation_item(instance)
+        for kind, instance in page_obj
+    ]
+
+    # Get statistics in one query: an aggregate subquery per figure, as joining
+    # both tables to the user would multiply the rows being summed
+    orders = Order.objects.filter(user=OuterRef('pk'))
+    reservations = Reservation.objects.filter(user=OuterRef('pk'))
+    stats = User.objects.filter(pk=request.user.pk).values(
+        total_orders=_aggregate(orders, Count('id'), 0),
+        completed_orders=_aggregate(orders.filter(status=Order.Status.DELIVERED), Count('id'), 0),
+        total_spent=_aggregate(orders, Sum('total_cost'), Decimal('0.00')),
+        total_reservations=_aggregate(reservations, Count('id'), 0),
+        completed_reservations=_aggregate(reservations.filter(status=Reservation.Status.COMPLETED), Count('id'), 0),
+    ).get()
     
     context = {
         'history_items': history_items,
+        'page_obj': page_obj,
         'stats': stats,
         'filter_type': filter_type,
         'date_range': date_range,
@@ -90,3 +77,38 @@ def history_view(request):
     }
     
     return render(request, 'history/history.html', context)
+
+
+def _aggregate(queryset, aggregate, default):
+    """``aggregate`` over ``queryset`` as a scalar subquery, ``default`` when it matches nothing"""
+    value = queryset.order_by().values('user').annotate(value=aggregate).values('value')
+    return Coalesce(Subquery(value), default)
+
+
+def _order_item(order):
+    return {
+        'type': 'order',
+        'id': order.id,
+        'title': f'Order #{order.id}',
+        'status': order.status,
+        'date': order.created_at,
+        'cost': order.total_cost,
+        'items_count': order.total_items,
+        'completion_date': order.estimated_completion,
+        'object': order
+    }
+
+
+def _reservation_item(reservation):
+    return {
+        'type': 'reservation',
+        'id': reservation.id,
+        'title': f'Reservation #{reservation.id}',
+        'status': reservation.status,
+        'date': reservation.created_at,
+        'pickup_time': reservation.pickup_datetime,
+        'delivery_time': reservation.delivery_datetime,
+        'service_type': reservation.service_type.name if reservation.service_type else 'Standard service',
+        'priority': reservation.priority,
+        'object': reservation
+    }
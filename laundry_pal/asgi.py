@@ -3,6 +3,14 @@ ASGI config for laundry_pal project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
 
+The web process is served through this module (see procfile) so that the
+notification stream, /notifications/api/notifications/stream/, can hold its
+connections open without tying up a worker each. Under WSGI the stream
+answers 204 and the browser falls back to polling the JSON endpoint, which
+replies 304 while nothing has changed.
+
+Run it locally with ``uvicorn laundry_pal.asgi:application --reload``.
+
 For more information on this file, see
 https://docs.djangoproject.com/en/5.0/howto/deployment/asgi/
 """
@@ -12,5 +20,9 @@ import os
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'laundry_pal.settings')
+# Sync views run in a new thread per request under ASGI, so a kept database
+# connection is never reused and they pile up; Django's deployment docs say
+# to disable persistent connections here. Set DB_CONN_MAX_AGE to override.
+os.environ.setdefault('DB_CONN_MAX_AGE', '0')
 
 application = get_asgi_application()
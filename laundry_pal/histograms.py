@@ -0,0 +1,37 @@
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, transaction
+from django.db.models import Count
+
+# Cached histograms are dropped on every save, so the timeout only bounds how
+# stale another process's copy can get
+HISTOGRAM_TIMEOUT = 300
+
+
+def status_histogram(model, user=None):
+    """Return ``{status: count}`` covering every status of ``model``.
+
+    Counts are scoped to ``user`` when given, otherwise they cover the whole
+    table (the staff view). A cache miss costs one ``GROUP BY status`` query.
+    """
+    key = _cache_key(model, user.pk if user is not None else None)
+    counts = cache.get(key)
+    if counts is None:
+        # From the primary: a lagging replica would cache counts the next
+        # invalidation has already dropped
+        queryset = model.objects.using(DEFAULT_DB_ALIAS)
+        if user is not None:
+            queryset = queryset.filter(user=user)
+        counts = dict.fromkeys(model.Status.values, 0)
+        counts.update(queryset.order_by().values_list('status').annotate(Count('id')))
+        cache.set(key, counts, HISTOGRAM_TIMEOUT)
+    return counts
+
+
+def invalidate_status_histogram(model, user_ids):
+    """Drop the global histogram and the ones for ``user_ids`` once the transaction commits"""
+    keys = [_cache_key(model, None)] + [_cache_key(model, user_id) for user_id in set(user_ids)]
+    transaction.on_commit(lambda: cache.delete_many(keys))
+
+
+def _cache_key(model, user_id):
+    return f"status_histogram:{model._meta.label_lower}:{user_id if user_id is not None else 'all'}"
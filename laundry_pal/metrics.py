@@ -0,0 +1,400 @@
+"""Per-view request metrics, exposed in the Prometheus text format.
+
+``RequestMetricsMiddleware`` records, for every request, the latency, the
+number of ORM queries and the time spent in them, the time spent rendering
+templates, and the response size, labelled with the resolved view. Queries
+are counted by a wrapper installed on each new database connection and
+templates are timed by ``TimedDjangoTemplates``; both report to the request
+in progress through a context variable, so they also see work done in
+``sync_to_async`` threads.
+
+Every process keeps its histograms in memory and a background thread writes
+them to ``settings.METRICS_DIR`` as ``metrics-<pid>.json`` every
+``WRITE_INTERVAL`` seconds and at exit. The metrics endpoint sums the files
+of all workers, so any gunicorn worker can answer a scrape. At its first
+write a process takes over the files of workers that have stopped, including
+one left at its own path by a worker whose pid it reused, and adds their
+counts to its own: counters never go backwards between deploys, and the
+directory holds about one file per running worker.
+"""
+import atexit
+import contextvars
+import json
+import os
+import threading
+import time
+from bisect import bisect_left
+from collections import defaultdict
+from pathlib import Path
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+from django.http import HttpResponse, HttpResponseForbidden
+from django.template.backends.django import DjangoTemplates, Template
+from django.views.decorators.http import require_GET
+
+from laundry_pal.processes import is_running
+
+# Seconds between writes of this process's metrics file
+WRITE_INTERVAL = 5.0
+
+SECONDS_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200, 500)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+
+HISTOGRAMS = {
+    'laundry_pal_request_duration_seconds': ('Time to build the response', SECONDS_BUCKETS),
+    'laundry_pal_request_queries': ('ORM queries run by the request', QUERY_BUCKETS),
+    'laundry_pal_request_db_seconds': ('Time spent in ORM queries', SECONDS_BUCKETS),
+    'laundry_pal_request_template_seconds': ('Time spent rendering templates', SECONDS_BUCKETS),
+    'laundry_pal_response_size_bytes': ('Size of the response body; streamed responses are not measured', SIZE_BUCKETS),
+}
+REQUESTS_TOTAL = 'laundry_pal_requests_total'
+
+_request = contextvars.ContextVar('request_metrics', default=None)
+
+
+class RequestTimings:
+    """What the request in progress has spent so far"""
+
+    def __init__(self):
+        self.queries = 0
+        self.db_time = 0.0
+        self.template_time = 0.0
+        self.template_depth = 0
+
+
+class Registry:
+    """This process's histograms and counters"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        # (name, labels) -> [bucket counts..., sum, count]
+        self.histograms = {}
+        # labels -> count
+        self.requests = defaultdict(int)
+        self.dirty = False
+        self.thread = None
+        # Keeps writes, and the takeover before the first, one at a time
+        self.write_lock = threading.Lock()
+        # (pid, directory) of the last takeover of stopped workers' files
+        self.claimed = None
+        # Names of taken-over files whose counts are in this registry, to be
+        # deleted once this process's file holds them
+        self.absorbed = []
+
+    def observe(self, name, labels, value):
+        buckets = HISTOGRAMS[name][1]
+        with self.lock:
+            series = self.histograms.get((name, labels))
+            if series is None:
+                series = self.histograms[name, labels] = [0] * (len(buckets) + 2)
+            index = bisect_left(buckets, value)
+            if index < len(buckets):
+                series[index] += 1
+            series[-2] += value
+            series[-1] += 1
+            self.dirty = True
+
+    def record(self, labels, status, timings, duration, size):
+        for name, value in (
+            ('laundry_pal_request_duration_seconds', duration),
+            ('laundry_pal_request_queries', timings.queries),
+            ('laundry_pal_request_db_seconds', timings.db_time),
+            ('laundry_pal_request_template_seconds', timings.template_time),
+        ):
+            self.observe(name, labels, value)
+        if size is not None:
+            self.observe('laundry_pal_response_size_bytes', labels, size)
+        with self.lock:
+            self.requests[labels + (str(status),)] += 1
+        if self.thread is None:
+            with self.lock:
+                if self.thread is None:
+                    self.thread = threading.Thread(target=self.run, name='metrics-writer', daemon=True)
+                    self.thread.start()
+
+    def merge(self, data):
+        """Add the histograms and counters of a metrics file to this registry"""
+        with self.lock:
+            for name, labels, series in data['histograms']:
+                if not _compatible(name, series):
+                    continue
+                total = self.histograms.setdefault((name, tuple(labels)), [0] * len(series))
+                for index, value in enumerate(series):
+                    total[index] += value
+            for labels, count in data['requests']:
+                self.requests[tuple(labels)] += count
+            self.dirty = True
+
+    def reset(self):
+        with self.lock:
+            self.histograms.clear()
+            self.requests.clear()
+            self.absorbed = []
+            self.dirty = False
+        # The next write takes over this process's file again
+        self.claimed = None
+
+    def snapshot(self):
+        with self.lock:
+            self.dirty = False
+            return {
+                'histograms': [[name, list(labels), list(series)] for (name, labels), series in self.histograms.items()],
+                'requests': [[list(labels), count] for labels, count in self.requests.items()],
+                'absorbed': list(self.absorbed),
+            }
+
+    def run(self):
+        while True:
+            time.sleep(WRITE_INTERVAL)
+            if self.dirty:
+                self.write()
+
+    def write(self):
+        """Replace this process's metrics file with the current values"""
+        directory = Path(settings.METRICS_DIR)
+        with self.write_lock:
+            directory.mkdir(parents=True, exist_ok=True)
+            if self.claimed != (os.getpid(), directory):
+                self.claim_stopped(directory)
+                self.claimed = (os.getpid(), directory)
+            path = directory / f'metrics-{os.getpid()}.json'
+            temporary = path.with_suffix('.tmp')
+            snapshot = self.snapshot()
+            temporary.write_text(json.dumps(snapshot), encoding='utf-8')
+            os.replace(temporary, path)
+            # The file just written names them, so collect() no longer counts them
+            for name in snapshot['absorbed']:
+                (directory / name).unlink(missing_ok=True)
+            with self.lock:
+                self.absorbed = [name for name in self.absorbed if name not in snapshot['absorbed']]
+
+    def claim_stopped(self, directory):
+        """Add the counts of the files of stopped workers to this process's.
+
+        Each file is first renamed to one under this process's pid, which
+        another process cannot also take; it is deleted by the next write.
+        A file this process's pid already owns was left by a stopped worker
+        with the same pid, as this process has not written one yet.
+        """
+        pid = os.getpid()
+        claimed = []
+        for path in directory.glob('metrics-*.json'):
+            try:
+                owner = int(path.stem.split('-')[1])
+            except (IndexError, ValueError):
+                continue
+            if owner != pid:
+                if is_running(owner):
+                    continue
+                target = directory / f'metrics-{pid}-{time.time_ns()}.json'
+                try:
+                    os.replace(path, target)
+                except FileNotFoundError:
+                    # Another process took it first
+                    continue
+            else:
+                target = path
+            try:
+                data = json.loads(target.read_text(encoding='utf-8'))
+            except (OSError, ValueError):
+                data = None
+            claimed.append((path.name, target, data))
+        # A worker that stopped between its write and its deletions left files
+        # whose counts its own file already holds
+        inside = {name for _, _, data in claimed if data for name in data.get('absorbed', [])}
+        for name, target, data in claimed:
+            if data and name not in inside:
+                self.merge(data)
+            if target.name != f'metrics-{pid}.json':
+                with self.lock:
+                    self.absorbed.append(target.name)
+
+
+registry = Registry()
+
+
+def _write_at_exit():
+    if registry.histograms:
+        registry.write()
+
+
+atexit.register(_write_at_exit)
+
+
+def view_label(request):
+    """Dotted path of the view that handled ``request``"""
+    match = getattr(request, 'resolver_match', None)
+    if match is None:
+        return 'unresolved'
+    view = getattr(match.func, 'view_class', match.func)
+    return f'{view.__module__}.{view.__qualname__}'
+
+
+class RequestMetricsMiddleware:
+    """Records the metrics of each request; goes first in MIDDLEWARE"""
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+        # Connections opened before this module was imported
+        for connection in connections.all(initialized_only=True):
+            install_query_timer(sender=None, connection=connection)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        timings = RequestTimings()
+        token = _request.set(timings)
+        started = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            _request.reset(token)
+        self.record(request, response, timings, time.perf_counter() - started)
+        return response
+
+    async def __acall__(self, request):
+        timings = RequestTimings()
+        token = _request.set(timings)
+        started = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            _request.reset(token)
+        self.record(request, response, timings, time.perf_counter() - started)
+        return response
+
+    def record(self, request, response, timings, duration):
+        size = None if response.streaming else len(response.content)
+        registry.record((view_label(request), request.method), response.status_code, timings, duration, size)
+
+
+@receiver(connection_created)
+def install_query_timer(sender, connection, **kwargs):
+    if _time_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_time_query)
+
+
+def _time_query(execute, sql, params, many, context):
+    timings = _request.get()
+    if timings is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        timings.queries += 1
+        timings.db_time += time.perf_counter() - started
+
+
+class TimedTemplate(Template):
+    def render(self, context=None, request=None):
+        timings = _request.get()
+        if timings is None:
+            return super().render(context, request)
+        # Only the outermost render is timed; render_to_string inside a
+        # template would otherwise be counted twice
+        timings.template_depth += 1
+        started = time.perf_counter()
+        try:
+            return super().render(context, request)
+        finally:
+            timings.template_depth -= 1
+            if not timings.template_depth:
+                timings.template_time += time.perf_counter() - started
+
+
+class TimedDjangoTemplates(DjangoTemplates):
+    """The Django template backend, with render time reported to the request metrics"""
+
+    def from_string(self, template_code):
+        return TimedTemplate(self.engine.from_string(template_code), self)
+
+    def get_template(self, template_name):
+        template = super().get_template(template_name)
+        return TimedTemplate(template.template, self)
+
+
+def collect():
+    """Sum the metrics files of every worker"""
+    registry.write()
+    files = {}
+    for path in Path(settings.METRICS_DIR).glob('metrics-*.json'):
+        try:
+            files[path.name] = json.loads(path.read_text(encoding='utf-8'))
+        except (OSError, ValueError):
+            # Removed or being replaced
+            continue
+    # Taken over by a worker whose file already holds their counts
+    absorbed = {name for data in files.values() for name in data.get('absorbed', [])}
+    histograms = {}
+    requests = defaultdict(int)
+    for file_name, data in files.items():
+        if file_name in absorbed:
+            continue
+        for name, labels, series in data['histograms']:
+            if not _compatible(name, series):
+                continue
+            total = histograms.setdefault((name, tuple(labels)), [0] * len(series))
+            for index, value in enumerate(series):
+                total[index] += value
+        for labels, count in data['requests']:
+            requests[tuple(labels)] += count
+    return histograms, requests
+
+
+def _compatible(name, series):
+    # False for a series written with other buckets before a deploy
+    return name in HISTOGRAMS and len(series) == len(HISTOGRAMS[name][1]) + 2
+
+
+def render_metrics(histograms, requests):
+    lines = [
+        f'# HELP {REQUESTS_TOTAL} Requests served, by view, method and status',
+        f'# TYPE {REQUESTS_TOTAL} counter',
+    ]
+    for (view, method, status), count in sorted(requests.items()):
+        lines.append(f'{REQUESTS_TOTAL}{{{_labels(view=view, method=method, status=status)}}} {count}')
+    for name, (description, buckets) in HISTOGRAMS.items():
+        lines.append(f'# HELP {name} {description}')
+        lines.append(f'# TYPE {name} histogram')
+        for labels, series in sorted((labels, series) for (metric, labels), series in histograms.items() if metric == name):
+            view, method = labels
+            cumulative = 0
+            for bound, count in zip(buckets + ('+Inf',), series[:-2] + [series[-1] - sum(series[:-2])]):
+                cumulative += count
+                lines.append(f'{name}_bucket{{{_labels(view=view, method=method, le=bound)}}} {cumulative}')
+            lines.append(f'{name}_sum{{{_labels(view=view, method=method)}}} {series[-2]}')
+            lines.append(f'{name}_count{{{_labels(view=view, method=method)}}} {series[-1]}')
+    return '\n'.join(lines) + '\n'
+
+
+def _labels(**labels):
+    return ','.join(
+        '{}="{}"'.format(key, str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n'))
+        for key, value in labels.items()
+    )
+
+
+@require_GET
+def metrics_view(request):
+    """Prometheus scrape endpoint: staff, or a bearer token matching METRICS_TOKEN"""
+    token = settings.METRICS_TOKEN
+    authorized = request.user.is_authenticated and request.user.is_staff
+    if token and request.headers.get('Authorization') == f'Bearer {token}':
+        authorized = True
+    if not authorized:
+        return HttpResponseForbidden()
+    return HttpResponse(
+        render_metrics(*collect()),
+        content_type='text/plain; version=0.0.4; charset=utf-8',
+    )
@@ -0,0 +1,108 @@
+"""Read replica routing with read-your-writes stickiness.
+
+``ReplicaRouter`` sends the reads of GET and HEAD requests to the database
+alias named by ``settings.REPLICA_DATABASE`` and everything else, including
+management commands and background jobs, to ``default``. A replica lags the
+primary, so once a request has written anything its remaining reads go to
+the primary, and once it has written or used an unsafe method,
+``ReplicaMiddleware`` sets a cookie that keeps that browser on the primary
+for ``REPLICA_PIN_SECONDS``; the user then reads their own writes on the
+pages that follow.
+
+When no replica is configured the router always answers ``default``, so the
+routing costs nothing in development.
+"""
+import contextvars
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+PIN_COOKIE = 'read_primary'
+
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+# Routing state of the request in progress: [reads may use the replica, wrote]
+_request = contextvars.ContextVar('replica_routing', default=None)
+
+
+def replica_alias():
+    """The configured replica alias, or None when there is none"""
+    alias = getattr(settings, 'REPLICA_DATABASE', None)
+    return alias if alias in settings.DATABASES else None
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        state = _request.get()
+        # Once the request has written, its own reads must see the write too
+        if state is None or not state[0] or state[1]:
+            return DEFAULT_DB_ALIAS
+        # Reads inside a transaction on the primary must see its writes
+        if connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return DEFAULT_DB_ALIAS
+        return replica_alias() or DEFAULT_DB_ALIAS
+
+    def db_for_write(self, model, **hints):
+        state = _request.get()
+        if state is not None:
+            state[1] = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # The replica holds the same rows as the primary
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # The replica is a copy of the primary and gets its schema that way
+        return db == DEFAULT_DB_ALIAS
+
+
+class ReplicaMiddleware:
+    """Chooses where the request reads from and pins writers to the primary"""
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        state = self.start(request)
+        token = _request.set(state)
+        try:
+            response = self.get_response(request)
+        finally:
+            _request.reset(token)
+        return self.finish(request, response, state)
+
+    async def __acall__(self, request):
+        state = self.start(request)
+        token = _request.set(state)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _request.reset(token)
+        return self.finish(request, response, state)
+
+    def start(self, request):
+        use_replica = request.method in SAFE_METHODS and PIN_COOKIE not in request.COOKIES
+        return [use_replica, False]
+
+    def finish(self, request, response, state):
+        if replica_alias() is None:
+            return response
+        if state[1] or request.method not in SAFE_METHODS:
+            response.set_cookie(
+                PIN_COOKIE,
+                '1',
+                max_age=settings.REPLICA_PIN_SECONDS,
+                secure=request.is_secure(),
+                httponly=True,
+                samesite='Lax',
+            )
+        return response
@@ -49,6 +49,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'laundry_pal.metrics.RequestMetricsMiddleware',
+    'laundry_pal.replicas.ReplicaMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'whitenoise.middleware.WhiteNoiseMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
@@ -64,7 +66,9 @@ ROOT_URLCONF = 'laundry_pal.urls'
 
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        # DjangoTemplates with render time reported to the request metrics
+        'BACKEND': 'laundry_pal.metrics.TimedDjangoTemplates',
+        'NAME': 'django',
         'DIRS': [BASE_DIR / 'templates'],
         'APP_DIRS': True,
         'OPTIONS': {
@@ -84,13 +88,110 @@ WSGI_APPLICATION = 'laundry_pal.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/5.0/ref/settings/#databases
 
+# WAL lets readers run alongside the writer. The mode is stored in the
+# database file, so migration orders 0008 switches it once rather than
+# every connection rewriting the file.
+SQLITE_JOURNAL_MODE = 'WAL'
+
+# Applied to every new SQLite connection. busy_timeout makes a writer wait
+# for the lock instead of failing with "database is locked";
+# synchronous=NORMAL is durable in WAL mode up to the last checkpoint and
+# skips an fsync per commit.
+SQLITE_PRAGMAS = {
+    'busy_timeout': 5000,
+    'synchronous': 'NORMAL',
+    'mmap_size': 256 * 1024 * 1024,
+    'cache_size': -32000,  # KiB
+}
+
+
+def sqlite_init_command(pragmas):
+    return ';'.join(f'PRAGMA {name} = {value}' for name, value in pragmas.items())
+
+
 DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        # Connections are kept between requests and checked before reuse;
+        # laundry_pal.asgi defaults this to 0, as ASGI cannot reuse them
+        'CONN_MAX_AGE': int(os.environ.get('DB_CONN_MAX_AGE', 60)),
+        'CONN_HEALTH_CHECKS': True,
+        'OPTIONS': {
+            'init_command': sqlite_init_command(SQLITE_PRAGMAS),
+            # Take the write lock at BEGIN: a deferred transaction that reads
+            # and then writes cannot wait for it and fails at once instead
+            'transaction_mode': 'IMMEDIATE',
+        },
     }
 }
 
+# Read replica for the reads of GET requests (laundry_pal.replicas). Locally,
+# set REPLICA_DB to a second SQLite file and keep it current with
+# "manage.py sync_replica --interval 5".
+if os.environ.get('REPLICA_DB'):
+    DATABASES['replica'] = {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': os.environ['REPLICA_DB'],
+        # sync_replica swaps the file; a kept connection would read the old one
+        'CONN_MAX_AGE': 0,
+        'OPTIONS': {
+            # The copy stays in rollback journal mode, so no journal_mode here
+            'init_command': sqlite_init_command({
+                'query_only': 'ON',
+                'busy_timeout': SQLITE_PRAGMAS['busy_timeout'],
+                'mmap_size': SQLITE_PRAGMAS['mmap_size'],
+                'cache_size': SQLITE_PRAGMAS['cache_size'],
+            }),
+        },
+        'TEST': {'MIRROR': 'default'},
+    }
+
+DATABASE_ROUTERS = ['laundry_pal.replicas.ReplicaRouter']
+REPLICA_DATABASE = 'replica'
+
+# Seconds a browser reads from the primary after it wrote something, longer
+# than the replica ever lags
+REPLICA_PIN_SECONDS = 15
+
+
+# Cache
+# https://docs.djangoproject.com/en/5.0/topics/cache/
+# Shared by every worker, so they all see the status histograms and order
+# list card fragments the others cache and invalidate. Cards live in their
+# own cache so evicting them never drops a histogram.
+# Set REDIS_URL in production. The on-disk fallback is for development: it
+# lists its whole directory on every set to cull.
+
+if os.environ.get('REDIS_URL'):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': os.environ['REDIS_URL'],
+            'KEY_PREFIX': 'laundry_pal',
+        },
+        'order_cards': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': os.environ['REDIS_URL'],
+            'KEY_PREFIX': 'laundry_pal_cards',
+        },
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+            'LOCATION': BASE_DIR / 'cache' / 'default',
+        },
+        'order_cards': {
+            'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+            'LOCATION': BASE_DIR / 'cache' / 'order_cards',
+            'OPTIONS': {
+                # Cards are keyed on their version, so old ones are left to expire
+                'MAX_ENTRIES': 20000,
+            },
+        },
+    }
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.0/ref/settings/#auth-password-validators
@@ -133,6 +234,20 @@ STATICFILES_STORAGE = "whitenoise.storage.CompressedManifestStaticFilesStorage"
 
 
 
+# Journal files of the buffered admin audit log (admin_panel.audit)
+AUDIT_LOG_DIR = BASE_DIR / 'audit_journal'
+
+# Per-worker files of the request metrics (laundry_pal.metrics), summed by
+# the /metrics endpoint. Prometheus authenticates with "Bearer <METRICS_TOKEN>".
+METRICS_DIR = BASE_DIR / 'metrics'
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN', '')
+
+# Largest request the bulk order intake (orders.views.OrderIntakeView)
+# accepts, in bytes. It reads its body as a stream, so Django's 2.5 MB
+# DATA_UPLOAD_MAX_MEMORY_SIZE does not apply; as JSON, 10,000 orders of three
+# item lines come to about 3 MB.
+ORDER_INTAKE_MAX_BYTES = int(os.environ.get('ORDER_INTAKE_MAX_BYTES', 50 * 1024 * 1024))
+
 LOGIN_REDIRECT_URL = '/'
 LOGOUT_REDIRECT_URL = '/'
 LOGIN_URL = '/accounts/login/'
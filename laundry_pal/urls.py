@@ -18,6 +18,7 @@ from django.contrib import admin
 from django.urls import path, include
 from django.views.generic import TemplateView
 from django.contrib.sitemaps.views import sitemap
+from .metrics import metrics_view
 from .sitemap import StaticViewSitemap
 
 sitemaps = {
@@ -37,4 +38,5 @@ urlpatterns = [
     path('admin-panel/', include('admin_panel.urls')),  # Custom admin panel
     path('', TemplateView.as_view(template_name='home.html'), name='home'),
     path('sitemap.xml', sitemap, {'sitemaps': sitemaps}),
+    path('metrics', metrics_view, name='metrics'),  # Prometheus scrape endpoint
 ]
@@ -0,0 +1,153 @@
+"""Notification payloads, their version tags, and the server-sent event stream.
+
+A user's version is ``(latest id, unread count, total)``. It changes when a
+notification is created, read or deleted, whichever process does it. It
+serves as the ETag of the JSON endpoint and tells the stream when to push.
+
+Each ASGI process runs one ``NotificationWatcher`` while any stream is open.
+It polls for rows newer than the last id it saw, a primary-key range read,
+and wakes only the streams of the users who received them. Changes that add
+no row (notifications marked read in another tab) reach a stream at its
+next heartbeat.
+"""
+import asyncio
+import contextvars
+import json
+from collections import defaultdict
+
+from asgiref.sync import sync_to_async
+from django.db import connection
+from django.db.models import Count, Max, Q
+from django.utils import timezone
+
+from .models import Notification
+
+LATEST_COUNT = 10
+
+# Seconds between the watcher's checks for new rows
+WATCH_INTERVAL = 2
+
+# Seconds a stream waits before re-checking its user's version anyway. Also
+# keeps proxies from closing an idle connection.
+HEARTBEAT_INTERVAL = 30
+
+
+def notification_version(user_id):
+    version = Notification.objects.filter(user_id=user_id).aggregate(
+        latest=Max('id'),
+        unread=Count('id', filter=Q(is_read=False)),
+        total=Count('id'),
+    )
+    return f"{version['latest'] or 0}-{version['unread']}-{version['total']}"
+
+
+def notification_payload(user_id):
+    """The latest notifications and the unread count, as the JSON endpoint returns them"""
+    user_notifications = Notification.objects.filter(user_id=user_id)
+    notifications = user_notifications.order_by('-created_at')[:LATEST_COUNT]
+    return {
+        'notifications': [
+            {
+                'id': notif.id,
+                'message': notif.message,
+                'is_read': notif.is_read,
+                'created_at': notif.created_at.strftime('%b %d, %Y %I:%M %p'),
+                'created_at_iso': notif.created_at.isoformat(),
+                'time_ago': get_time_ago(notif.created_at)
+            }
+            for notif in notifications
+        ],
+        'unread_count': user_notifications.filter(is_read=False).count()
+    }
+
+
+def get_time_ago(created_at):
+    """Helper function to get human-readable time difference"""
+    now = timezone.now()
+    diff = now - created_at
+
+    if diff.days > 0:
+        return f"{diff.days} day{'s' if diff.days > 1 else ''} ago"
+    elif diff.seconds > 3600:
+        hours = diff.seconds // 3600
+        return f"{hours} hour{'s' if hours > 1 else ''} ago"
+    elif diff.seconds > 60:
+        minutes = diff.seconds // 60
+        return f"{minutes} minute{'s' if minutes > 1 else ''} ago"
+    else:
+        return "Just now"
+
+
+class NotificationWatcher:
+    """Wakes the open streams of users who received new notifications"""
+
+    def __init__(self):
+        self.waiters = defaultdict(set)
+        self.last_id = None
+        self.task = None
+
+    def subscribe(self, user_id):
+        event = asyncio.Event()
+        self.waiters[user_id].add(event)
+        if self.task is None or self.task.done():
+            # Started from a fresh context so it does not run its queries on,
+            # and outlive, the executor of the request that happened to start it
+            self.task = contextvars.Context().run(asyncio.create_task, self.run())
+        return event
+
+    def unsubscribe(self, user_id, event):
+        self.waiters[user_id].discard(event)
+        if not self.waiters[user_id]:
+            del self.waiters[user_id]
+
+    async def run(self):
+        # The task stops with the last stream and starts again with the next
+        self.last_id = (await Notification.objects.aaggregate(latest=Max('id')))['latest'] or 0
+        while self.waiters:
+            await asyncio.sleep(WATCH_INTERVAL)
+            recipients = set()
+            async for notification_id, user_id in Notification.objects.filter(
+                id__gt=self.last_id,
+            ).order_by().values_list('id', 'user_id'):
+                self.last_id = max(self.last_id, notification_id)
+                recipients.add(user_id)
+            for user_id in recipients & self.waiters.keys():
+                for event in self.waiters[user_id]:
+                    event.set()
+
+
+watcher = NotificationWatcher()
+
+
+async def event_stream(user_id, last_version=None):
+    """Yield server-sent events for ``user_id``: one whenever the version changes.
+
+    ``last_version`` is the version the client already has (its Last-Event-ID
+    after a reconnect), so an unchanged state is not sent again.
+    """
+    event = watcher.subscribe(user_id)
+    try:
+        while True:
+            version, payload = await sync_to_async(_check)(user_id, last_version)
+            if payload is not None:
+                last_version = version
+                yield f'event: notifications\nid: {version}\ndata: {json.dumps(payload)}\n\n'
+            else:
+                yield ': keep-alive\n\n'
+            try:
+                await asyncio.wait_for(event.wait(), HEARTBEAT_INTERVAL)
+            except asyncio.TimeoutError:
+                pass
+            event.clear()
+    finally:
+        watcher.unsubscribe(user_id, event)
+
+
+def _check(user_id, last_version):
+    """Return the current version, and the payload when it differs from ``last_version``"""
+    try:
+        version = notification_version(user_id)
+        return version, notification_payload(user_id) if version != last_version else None
+    finally:
+        # An open stream is idle nearly all the time; do not hold a connection
+        connection.close()
@@ -8,6 +8,12 @@ class Notification(models.Model):
 	is_read = models.BooleanField(default=False)
 	created_at = models.DateTimeField(auto_now_add=True)
 
+	class Meta:
+		indexes = [
+			models.Index(fields=['user', 'created_at'], name='notification_user_created_idx'),
+			models.Index(fields=['user', 'is_read', 'created_at'], name='notification_unread_idx'),
+		]
+
 	def __str__(self) -> str:
 		return f"To {self.user}: {self.message[:30]}..."
 
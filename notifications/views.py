@@ -1,32 +1,39 @@
 from django.shortcuts import render
 from django.contrib.auth.decorators import login_required
-from django.http import JsonResponse
-from django.views.decorators.http import require_POST
+from django.core.handlers.asgi import ASGIRequest
+from django.http import HttpResponse, JsonResponse, StreamingHttpResponse
+from django.views.decorators.http import condition, require_POST
 from django.views.decorators.csrf import csrf_exempt
-from django.utils import timezone
+from .feed import event_stream, notification_payload, notification_version
 from .models import Notification
 
 
+def _notification_etag(request):
+    return notification_version(request.user.pk)
+
+
 @login_required
+@condition(etag_func=_notification_etag)
 def notification_list(request):
-    """Get user's notifications as JSON"""
-    notifications = Notification.objects.filter(user=request.user).order_by('-created_at')[:10]
-    
-    data = {
-        'notifications': [
-            {
-                'id': notif.id,
-                'message': notif.message,
-                'is_read': notif.is_read,
-                'created_at': notif.created_at.strftime('%b %d, %Y %I:%M %p'),
-                'time_ago': get_time_ago(notif.created_at)
-            }
-            for notif in notifications
-        ],
-        'unread_count': notifications.filter(is_read=False).count()
-    }
-    
-    return JsonResponse(data)
+    """Get user's notifications as JSON; unchanged since the client's ETag answers 304"""
+    return JsonResponse(notification_payload(request.user.pk))
+
+
+@login_required
+async def notification_stream(request):
+    """Push the user's notifications as server-sent events whenever they change"""
+    if not isinstance(request, ASGIRequest):
+        # A WSGI worker would be held for the whole stream. 204 tells
+        # EventSource not to reconnect, and the client polls instead.
+        return HttpResponse(status=204)
+    user = await request.auser()
+    response = StreamingHttpResponse(
+        event_stream(user.pk, request.headers.get('Last-Event-ID')),
+        content_type='text/event-stream',
+    )
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
 
 
 @login_required
@@ -48,20 +55,3 @@ def mark_all_read(request):
     """Mark all user notifications as read"""
     Notification.objects.filter(user=request.user, is_read=False).update(is_read=True)
     return JsonResponse({'success': True})
-
-
-def get_time_ago(created_at):
-    """Helper function to get human-readable time difference"""
-    now = timezone.now()
-    diff = now - created_at
-    
-    if diff.days > 0:
-        return f"{diff.days} day{'s' if diff.days > 1 else ''} ago"
-    elif diff.seconds > 3600:
-        hours = diff.seconds // 3600
-        return f"{hours} hour{'s' if hours > 1 else ''} ago"
-    elif diff.seconds > 60:
-        minutes = diff.seconds // 60
-        return f"{minutes} minute{'s' if minutes > 1 else ''} ago"
-    else:
-        return "Just now"
@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Order, OrderItem
+from .models import GeocodedAddress, Order, OrderItem
 
 
 class OrderItemInline(admin.TabularInline):
@@ -42,3 +42,10 @@ class OrderItemAdmin(admin.ModelAdmin):
     list_filter = ['item_type', 'service_level']
     search_fields = ['order__order_number', 'instructions', 'stain_notes']
     readonly_fields = ['total_price']
+
+
+@admin.register(GeocodedAddress)
+class GeocodedAddressAdmin(admin.ModelAdmin):
+    list_display = ['address', 'latitude', 'longitude', 'precision', 'updated_at']
+    list_filter = ['precision']
+    search_fields = ['address']
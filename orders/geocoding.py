@@ -0,0 +1,136 @@
+"""Offline geocoding of delivery addresses.
+
+Addresses are matched against a small gazetteer of Biliran: the barangays
+of Naval, where the shop is, and the town proper of every municipality on
+the island. No external service is called. The points are approximate
+placements, close enough to batch and order stops but not to navigate by;
+fix a wrong one by editing its GeocodedAddress row and setting the precision
+to "manual", which is never recomputed.
+
+Results are cached in GeocodedAddress, keyed on the normalized address, so
+planning routes costs one query however many stops there are.
+"""
+import re
+import unicodedata
+
+from django.utils import timezone
+
+from .models import GeocodedAddress
+
+# Town proper of each municipality of Biliran
+MUNICIPALITIES = {
+    'naval': (11.5614, 124.3963),
+    'almeria': (11.6220, 124.3810),
+    'kawayan': (11.6790, 124.3570),
+    'maripipi': (11.7780, 124.3480),
+    'culaba': (11.6560, 124.5420),
+    'caibiran': (11.5720, 124.5820),
+    'cabucgayan': (11.4730, 124.5750),
+    'biliran': (11.4660, 124.4750),
+}
+
+# Barangays of Naval
+BARANGAYS = {
+    'agpangi': (11.5900, 124.4100),
+    'anislagan': (11.5700, 124.4500),
+    'atipolo': (11.5800, 124.4000),
+    'borac': (11.5850, 124.4080),
+    'cabungaan': (11.5250, 124.4120),
+    'calumpang': (11.5750, 124.4050),
+    'capinahan': (11.5500, 124.4100),
+    'caraycaray': (11.5560, 124.4000),
+    'catmon': (11.5530, 124.4050),
+    'haguikhikan': (11.5400, 124.4200),
+    'imelda': (11.5350, 124.4300),
+    'larrazabal': (11.5680, 124.4010),
+    'libertad': (11.5700, 124.3980),
+    'libtong': (11.5200, 124.4250),
+    'lico': (11.5800, 124.4400),
+    'lucsoon': (11.5950, 124.4200),
+    'mabini': (11.5600, 124.4300),
+    'padre inocentes garcia': (11.5600, 124.3960),
+    'padre sergio eamiguel': (11.5750, 124.4250),
+    'sabang': (11.5300, 124.4000),
+    'san pablo': (11.5350, 124.4050),
+    'santissimo rosario': (11.5630, 124.3970),
+    'santo nino': (11.5650, 124.3990),
+    'talustusan': (11.5500, 124.4600),
+    'villa caneja': (11.5420, 124.4080),
+    'villa consuelo': (11.5450, 124.4020),
+}
+
+# Other spellings, as they are written in addresses
+ALIASES = {
+    'p i garcia': 'padre inocentes garcia',
+    'pi garcia': 'padre inocentes garcia',
+    'sto nino': 'santo nino',
+    'sto rosario': 'santissimo rosario',
+    'santo rosario': 'santissimo rosario',
+    'p s eamiguel': 'padre sergio eamiguel',
+}
+
+
+def normalize(address):
+    """Lowercase ASCII words separated by single spaces, as the cache keys them"""
+    text = unicodedata.normalize('NFKD', address).encode('ascii', 'ignore').decode()
+    return ' '.join(re.sub(r'[^a-z0-9]+', ' ', text.lower()).split())[:255]
+
+
+def _mentions(text, name):
+    return f' {name} ' in f' {text} '
+
+
+def resolve(key):
+    """Coordinates and precision for a normalized address, from the gazetteer alone"""
+    municipality = next((name for name in MUNICIPALITIES if name != 'biliran' and _mentions(key, name)), None)
+    if municipality is None and _mentions(key, 'biliran biliran'):
+        # "Biliran" alone names the province, as in "Naval, Biliran"
+        municipality = 'biliran'
+    if municipality in (None, 'naval'):
+        names = [name for name in BARANGAYS if _mentions(key, name)]
+        names += [ALIASES[alias] for alias in ALIASES if _mentions(key, alias)]
+        if names:
+            latitude, longitude = BARANGAYS[max(names, key=len)]
+            return {'latitude': latitude, 'longitude': longitude, 'precision': GeocodedAddress.Precision.BARANGAY}
+    if municipality is not None:
+        latitude, longitude = MUNICIPALITIES[municipality]
+        return {'latitude': latitude, 'longitude': longitude, 'precision': GeocodedAddress.Precision.MUNICIPALITY}
+    return {'latitude': None, 'longitude': None, 'precision': GeocodedAddress.Precision.UNRESOLVED}
+
+
+def locate(addresses):
+    """Map each address to ``(latitude, longitude)``, or None when it cannot be placed.
+
+    Addresses not cached yet are resolved and stored in the same call.
+    """
+    keys = {address: normalize(address) for address in addresses}
+    cached = {row.address: row for row in GeocodedAddress.objects.filter(address__in=set(keys.values()))}
+    missing = [GeocodedAddress(address=key, **resolve(key)) for key in set(keys.values()) - cached.keys() if key]
+    if missing:
+        # Another request may be caching the same addresses
+        GeocodedAddress.objects.bulk_create(missing, ignore_conflicts=True, batch_size=500)
+        cached.update((row.address, row) for row in missing)
+    located = {}
+    for address, key in keys.items():
+        row = cached.get(key)
+        located[address] = (row.latitude, row.longitude) if row is not None and row.latitude is not None else None
+    return located
+
+
+def refresh(include_resolved=False):
+    """Recompute cached rows from the gazetteer, except manual ones; returns how many changed"""
+    rows = GeocodedAddress.objects.exclude(precision=GeocodedAddress.Precision.MANUAL)
+    if not include_resolved:
+        rows = rows.filter(precision=GeocodedAddress.Precision.UNRESOLVED)
+    changed = []
+    now = timezone.now()
+    for row in rows.iterator(chunk_size=1000):
+        resolved = resolve(row.address)
+        if (row.latitude, row.longitude, row.precision) != (resolved['latitude'], resolved['longitude'], resolved['precision']):
+            for field, value in resolved.items():
+                setattr(row, field, value)
+            # bulk_update does not apply auto_now
+            row.updated_at = now
+            changed.append(row)
+    GeocodedAddress.objects.bulk_update(changed, ['latitude', 'longitude', 'precision', 'updated_at'], batch_size=500)
+    return len(changed)
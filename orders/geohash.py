@@ -0,0 +1,60 @@
+"""Geohash encoding, and the cells that cover a bounding box.
+
+A geohash names a cell of the latitude/longitude grid; every extra
+character splits the cell into 32, and all points in a cell share its
+prefix. Points sorted by geohash are therefore grouped by cell, and the
+points in a cell are one index range scan.
+"""
+import math
+
+ALPHABET = '0123456789bcdefghjkmnpqrstuvwxyz'
+
+# Sorts after every geohash character, closing a prefix range
+PREFIX_END = '{'
+
+
+def encode(latitude, longitude, precision):
+    latitude_range, longitude_range = [-90.0, 90.0], [-180.0, 180.0]
+    characters = []
+    bits = value = 0
+    even = True
+    while len(characters) < precision:
+        span, coordinate = (longitude_range, longitude) if even else (latitude_range, latitude)
+        middle = (span[0] + span[1]) / 2
+        value <<= 1
+        if coordinate >= middle:
+            value |= 1
+            span[0] = middle
+        else:
+            span[1] = middle
+        even = not even
+        bits += 1
+        if bits == 5:
+            characters.append(ALPHABET[value])
+            bits = value = 0
+    return ''.join(characters)
+
+
+def cell_size(precision):
+    """``(height, width)`` in degrees of a cell of ``precision`` characters"""
+    bits = 5 * precision
+    return 180.0 / 2 ** (bits // 2), 360.0 / 2 ** ((bits + 1) // 2)
+
+
+def cover(south, west, north, east, max_precision, max_cells=16):
+    """The geohash prefixes of the finest grid, up to ``max_precision``, that
+    covers the box in at most ``max_cells`` cells."""
+    south, north = max(south, -90.0), min(north, 90.0 - 1e-9)
+    west, east = max(west, -180.0), min(east, 180.0 - 1e-9)
+    best = ['']
+    for precision in range(1, max_precision + 1):
+        height, width = cell_size(precision)
+        rows = range(math.floor(south / height), math.floor(north / height) + 1)
+        columns = range(math.floor(west / width), math.floor(east / width) + 1)
+        if len(rows) * len(columns) > max_cells:
+            break
+        best = [
+            encode((row + 0.5) * height, (column + 0.5) * width, precision)
+            for row in rows for column in columns
+        ]
+    return best
@@ -0,0 +1,215 @@
+"""Bulk order intake for the drop-off counters.
+
+A batch of orders with their item lines, from JSON or CSV, is validated as a
+whole, priced from the compiled price table, and written with ``bulk_create``:
+a few INSERT statements per batch instead of one per order and per line.
+Line totals and each order's total_items/total_cost are computed in the same
+pass over the lines, so the orders are inserted with their final totals.
+Either every order in the batch is created or none is.
+"""
+import csv
+import io
+import json
+from collections import defaultdict
+from decimal import Decimal
+
+from django.contrib.auth.models import User
+from django.db import transaction
+
+from admin_panel.pricing import PriceNotFound, current_matrix, quote
+from reservations.models import Reservation
+from .models import Order, OrderItem
+
+# Orders per bulk_create round trip
+INTAKE_BATCH_SIZE = 1000
+
+CSV_REQUIRED_COLUMNS = {'username', 'item_type'}
+
+
+class IntakeError(ValueError):
+    """Raised with every problem found in a batch; nothing was created"""
+
+    def __init__(self, errors):
+        self.errors = errors
+        super().__init__(f'{len(errors)} problem(s) in the intake batch')
+
+
+def parse_json(body):
+    """Accept a list of orders or ``{"orders": [...]}``"""
+    data = json.loads(body)
+    if isinstance(data, dict):
+        data = data.get('orders')
+    if not isinstance(data, list) or not all(isinstance(entry, dict) for entry in data):
+        raise IntakeError([{'order': None, 'error': 'Expected a list of order objects'}])
+    return data
+
+
+def parse_csv(lines):
+    """One row per item line; rows sharing an ``order_ref`` form one order.
+
+    ``lines`` is the CSV text, or an iterable of its lines such as a decoded
+    stream. Columns: order_ref, username, priority, reservation_id,
+    special_instructions, item_type, service_level, quantity, instructions
+    and stain_notes. Only username and item_type are required; the order
+    columns are read from the first row of each order.
+    """
+    reader = csv.DictReader(io.StringIO(lines) if isinstance(lines, str) else lines)
+    missing = CSV_REQUIRED_COLUMNS - set(reader.fieldnames or ())
+    if missing:
+        raise IntakeError([{'order': None, 'error': f"Missing CSV columns: {', '.join(sorted(missing))}"}])
+    entries = {}
+    for row in reader:
+        ref = row.get('order_ref') or f'row-{len(entries)}'
+        if ref not in entries:
+            entries[ref] = {
+                'ref': ref,
+                'username': row.get('username', ''),
+                'priority': row.get('priority') or Reservation.Priority.STANDARD,
+                'reservation_id': row.get('reservation_id') or None,
+                'special_instructions': row.get('special_instructions', ''),
+                'items': [],
+            }
+        entries[ref]['items'].append({
+            'item_type': row.get('item_type', ''),
+            'service_level': row.get('service_level') or OrderItem.ServiceLevel.WASH_FOLD,
+            'quantity': row.get('quantity') or 1,
+            'instructions': row.get('instructions', ''),
+            'stain_notes': row.get('stain_notes', ''),
+        })
+    return list(entries.values())
+
+
+def intake_orders(entries, batch_size=INTAKE_BATCH_SIZE):
+    """Create the orders and items described by ``entries`` and return the orders.
+
+    Each entry has ``username`` or ``user_id``, an optional ``priority``
+    (default standard), ``reservation_id`` and ``special_instructions``, and
+    ``items``: mappings with ``item_type``, ``service_level``, ``quantity``,
+    ``instructions`` and ``stain_notes``. Raises IntakeError listing every
+    invalid entry before anything is written.
+    """
+    errors = []
+    users = _resolve_users(entries)
+    reservations = _resolve_reservations(entries)
+
+    orders = []
+    lines = []
+    by_priority = defaultdict(list)
+    for index, entry in enumerate(entries):
+        ref = entry.get('ref', index)
+        user = users.get(_as_int(entry.get('user_id'))) or users.get(entry.get('username'))
+        if user is None:
+            errors.append({'order': ref, 'error': 'Unknown customer'})
+            continue
+        reservation = reservations.get(_as_int(entry.get('reservation_id')))
+        if entry.get('reservation_id') and (reservation is None or reservation.user_id != user.pk):
+            errors.append({'order': ref, 'error': 'Unknown reservation for this customer'})
+            continue
+        priority = entry.get('priority') or (reservation.priority if reservation else Reservation.Priority.STANDARD)
+        if priority not in Reservation.Priority.values:
+            errors.append({'order': ref, 'error': f'Unknown priority: {priority}'})
+            continue
+
+        items, problem = _build_items(entry.get('items'))
+        if problem:
+            errors.append({'order': ref, 'error': problem})
+            continue
+        order = Order(
+            user=user,
+            reservation=reservation,
+            special_instructions=entry.get('special_instructions') or '',
+        )
+        orders.append(order)
+        for item in items:
+            lines.append((order, item))
+            by_priority[priority].append(item)
+
+    # Price every line of the batch, one pass per priority
+    matrix = current_matrix()
+    for priority, items in by_priority.items():
+        try:
+            priced = quote(items, priority, matrix)
+        except PriceNotFound as e:
+            errors.append({'order': None, 'error': f'No active price for {e}'})
+            continue
+        for item, (unit_price, total_price) in zip(items, priced.lines):
+            item.unit_price = unit_price
+            item.total_price = total_price
+    if errors:
+        raise IntakeError(errors)
+
+    # Order aggregates from the same lines, before the orders are inserted
+    for order in orders:
+        order.total_items = 0
+        order.total_cost = Decimal('0.00')
+    for order, item in lines:
+        order.total_items += item.quantity
+        order.total_cost += item.total_price
+
+    with transaction.atomic():
+        for start in range(0, len(orders), batch_size):
+            Order.objects.bulk_create(orders[start:start + batch_size])
+        for order, item in lines:
+            item.order = order
+        OrderItem.objects.bulk_create([item for order, item in lines], batch_size=batch_size * 4)
+    return orders
+
+
+def _build_items(raw_items):
+    """Return ``(items, problem)`` for one order's item lines"""
+    if not isinstance(raw_items, list) or not raw_items:
+        return [], 'An order needs at least one item'
+    items = []
+    for raw in raw_items:
+        if not isinstance(raw, dict):
+            return [], 'Items must be objects'
+        item_type = raw.get('item_type')
+        service_level = raw.get('service_level') or OrderItem.ServiceLevel.WASH_FOLD
+        quantity = _as_int(raw.get('quantity', 1))
+        if item_type not in OrderItem.ItemType.values:
+            return [], f'Unknown item type: {item_type}'
+        if service_level not in OrderItem.ServiceLevel.values:
+            return [], f'Unknown service level: {service_level}'
+        if quantity is None or quantity < 1:
+            return [], f'Invalid quantity: {raw.get("quantity")}'
+        if len(raw.get('instructions') or '') > 255:
+            return [], 'Item instructions are limited to 255 characters'
+        items.append(OrderItem(
+            item_type=item_type,
+            service_level=service_level,
+            quantity=quantity,
+            instructions=raw.get('instructions') or '',
+            stain_notes=raw.get('stain_notes') or '',
+        ))
+    return items, None
+
+
+def _resolve_users(entries):
+    """Customers of the batch keyed by both id and username, in at most two queries"""
+    user_ids = {_as_int(entry.get('user_id')) for entry in entries} - {None}
+    usernames = {entry.get('username') for entry in entries if entry.get('username')}
+    users = {}
+    if user_ids:
+        for user in User.objects.filter(pk__in=user_ids).only('id'):
+            users[user.pk] = user
+    if usernames:
+        for user in User.objects.filter(username__in=usernames).only('id', 'username'):
+            users[user.username] = user
+    return users
+
+
+def _resolve_reservations(entries):
+    reservation_ids = {_as_int(entry.get('reservation_id')) for entry in entries} - {None}
+    if not reservation_ids:
+        return {}
+    return {
+        reservation.pk: reservation
+        for reservation in Reservation.objects.filter(pk__in=reservation_ids).only('id', 'user_id', 'priority')
+    }
+
+
+def _as_int(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
@@ -0,0 +1,120 @@
+import time
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+
+from admin_panel.models import PricingRule
+from admin_panel.pricing import bump_pricing_version
+from orders.intake import intake_orders
+from orders.models import Order, OrderItem
+
+ITEM_TYPES = OrderItem.ItemType.values
+SERVICE_LEVELS = OrderItem.ServiceLevel.values
+PRIORITIES = ['standard', 'standard', 'express', 'rush']
+
+
+class Command(BaseCommand):
+    help = 'Measure bulk order intake throughput at several batch sizes on a throwaway database'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--sizes',
+            type=int,
+            nargs='+',
+            default=[1_000, 10_000],
+            help='Orders per intake batch',
+        )
+        parser.add_argument(
+            '--items',
+            type=int,
+            default=3,
+            help='Item lines per order',
+        )
+        parser.add_argument(
+            '--compare',
+            action='store_true',
+            help='Also time creating the same orders one save() at a time',
+        )
+        parser.add_argument(
+            '--db-file',
+            help='Run against this SQLite file instead of an in-memory test database',
+        )
+
+    def handle(self, *args, **options):
+        if options['db_file']:
+            connection.settings_dict['TEST']['NAME'] = options['db_file']
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+        try:
+            self.seed_pricing()
+            customers = [
+                User(username=f'intake-benchmark-{number}')
+                for number in range(200)
+            ]
+            User.objects.bulk_create(customers)
+            self.stdout.write(f"{'orders':>8}  {'lines':>7}  {'method':>8}  {'seconds':>8}  {'orders/s':>9}  {'lines/s':>9}")
+            for size in options['sizes']:
+                entries = self.build_entries(size, options['items'])
+                self.run('intake', entries, lambda: intake_orders(entries))
+                if options['compare']:
+                    self.run('save()', entries, lambda: self.save_one_by_one(entries))
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+
+    def run(self, method, entries, create):
+        lines = sum(len(entry['items']) for entry in entries)
+        with transaction.atomic():
+            started = time.perf_counter()
+            create()
+            elapsed = time.perf_counter() - started
+            self.stdout.write(
+                f'{len(entries):>8}  {lines:>7}  {method:>8}  {elapsed:>8.2f}  '
+                f'{len(entries) / elapsed:>9.0f}  {lines / elapsed:>9.0f}'
+            )
+            transaction.set_rollback(True)
+
+    def seed_pricing(self):
+        PricingRule.objects.bulk_create([
+            PricingRule(service_category=service, item_category=item, base_price=25 + index)
+            for index, (service, item) in enumerate(
+                (service, item) for service in SERVICE_LEVELS for item in ITEM_TYPES
+            )
+        ])
+        # bulk_create skips the signal that bumps the pricing version
+        bump_pricing_version()
+
+    def build_entries(self, size, items):
+        return [
+            {
+                'username': f'intake-benchmark-{number % 200}',
+                'priority': PRIORITIES[number % len(PRIORITIES)],
+                'items': [
+                    {
+                        'item_type': ITEM_TYPES[(number + line) % len(ITEM_TYPES)],
+                        'service_level': SERVICE_LEVELS[(number * line) % len(SERVICE_LEVELS)],
+                        'quantity': 1 + (number + line) % 5,
+                    }
+                    for line in range(items)
+                ],
+            }
+            for number in range(size)
+        ]
+
+    def save_one_by_one(self, entries):
+        """The per-row path intake replaces: prices looked up and rows written one at a time"""
+        users = {user.username: user for user in User.objects.filter(username__startswith='intake-benchmark-')}
+        for entry in entries:
+            order = Order.objects.create(user=users[entry['username']])
+            for line in entry['items']:
+                rule = PricingRule.objects.get(service_category=line['service_level'], item_category=line['item_type'])
+                multiplier = {'express': rule.express_multiplier, 'rush': rule.rush_multiplier}.get(entry['priority'], 1)
+                item = OrderItem.objects.create(
+                    order=order,
+                    item_type=line['item_type'],
+                    service_level=line['service_level'],
+                    quantity=line['quantity'],
+                    unit_price=rule.base_price * multiplier,
+                )
+                order.total_items += item.quantity
+                order.total_cost += item.total_price
+            order.save()
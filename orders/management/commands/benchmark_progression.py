@@ -0,0 +1,72 @@
+import time
+from datetime import timedelta
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.utils import timezone
+
+from orders.models import Order
+from orders.progression import PROGRESSIONS, advance_due_orders
+
+
+class Command(BaseCommand):
+    help = 'Measure the time per progress_orders tick at several order counts on a throwaway database'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--sizes',
+            type=int,
+            nargs='+',
+            default=[10_000, 100_000, 1_000_000],
+            help='Order counts to benchmark',
+        )
+        parser.add_argument(
+            '--db-file',
+            help='Run against this SQLite file instead of an in-memory test database',
+        )
+
+    def handle(self, *args, **options):
+        if options['db_file']:
+            connection.settings_dict['TEST']['NAME'] = options['db_file']
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+        try:
+            self.stdout.write(f"{'orders':>10}  {'seed (s)':>9}  {'idle tick (s)':>13}  {'full tick (s)':>13}  {'advanced':>9}")
+            for size in options['sizes']:
+                self.run_size(size)
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+
+    def run_size(self, size):
+        with transaction.atomic():
+            started = time.perf_counter()
+            self.seed(size)
+            seeded = time.perf_counter() - started
+
+            # Nothing is due yet: measures the cost of finding the due buckets
+            started = time.perf_counter()
+            advance_due_orders(notify=False)
+            idle = time.perf_counter() - started
+
+            # Every active order is due: one UPDATE per transition plus notifications
+            started = time.perf_counter()
+            advanced = advance_due_orders(now=timezone.now() + timedelta(hours=1))
+            full = time.perf_counter() - started
+
+            moved = sum(len(order_ids) for order_ids in advanced.values())
+            self.stdout.write(f'{size:>10}  {seeded:>9.2f}  {idle:>13.3f}  {full:>13.3f}  {moved:>9}')
+
+            transaction.set_rollback(True)
+
+    def seed(self, size):
+        user = User.objects.create(username='benchmark')
+        statuses = [current for current, following, minutes in PROGRESSIONS] + [Order.Status.DELIVERED]
+        # bulk_create materializes its input, so feed it bounded slices
+        for start in range(0, size, 50_000):
+            Order.objects.bulk_create(
+                [
+                    Order(user=user, status=statuses[i % len(statuses)])
+                    for i in range(start, min(start + 50_000, size))
+                ],
+                batch_size=5000,
+            )
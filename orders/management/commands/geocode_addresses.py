@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+
+from orders.geocoding import locate, refresh
+from reservations.models import Reservation
+
+
+class Command(BaseCommand):
+    help = 'Cache coordinates for every reservation address, and recompute cached ones from the gazetteer'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--all',
+            action='store_true',
+            help='Recompute every cached address except manual ones, not just unresolved ones',
+        )
+
+    def handle(self, *args, **options):
+        changed = refresh(include_resolved=options['all'])
+        addresses = set(Reservation.objects.exclude(address='').values_list('address', flat=True).distinct())
+        located = locate(addresses)
+        placed = sum(point is not None for point in located.values())
+        self.stdout.write(f'{len(addresses)} addresses, {placed} placed, {len(addresses) - placed} unresolved; {changed} cached rows updated')
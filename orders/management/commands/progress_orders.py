@@ -1,48 +1,102 @@
+import signal
+import time
+
 from django.core.management.base import BaseCommand
 from django.utils import timezone
-from orders.models import Order
-from datetime import timedelta
+from orders.progression import NEXT_STATUS, DeadlineScheduler, advance_due_orders, apply_transition
 
 class Command(BaseCommand):
     help = 'Automatically progress orders through statuses over time'
 
-    def handle(self, *args, **kwargs):
-        now = timezone.now()
-        
-        # Status progression with time intervals (in minutes)
-        progressions = [
-            ('pending', 'confirmed', 5),
-            ('confirmed', 'picked_up', 10),
-            ('picked_up', 'washing', 15),
-            ('washing', 'drying', 20),
-            ('drying', 'folding', 15),
-            ('folding', 'ready', 10),
-            ('ready', 'out_for_delivery', 5),
-            ('out_for_delivery', 'delivered', 10),
-        ]
-        
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--daemon',
+            action='store_true',
+            help='Stay resident and fire each transition when its deadline is due',
+        )
+        parser.add_argument(
+            '--poll-interval',
+            type=float,
+            default=5.0,
+            help='Seconds between change-cursor polls for new or updated orders (daemon mode)',
+        )
+
+    def handle(self, *args, **options):
+        self.verbosity = options['verbosity']
+        if options['daemon']:
+            self.run_daemon(options['poll_interval'])
+        else:
+            self.progress_once()
+
+    def progress_once(self):
         updated_count = 0
-        
-        for current_status, next_status, minutes in progressions:
-            time_threshold = now - timedelta(minutes=minutes)
-            orders = Order.objects.filter(
-                status=current_status,
-                updated_at__lte=time_threshold
-            )
-            
-            for order in orders:
-                order.status = next_status
-                order.save()
-                updated_count += 1
-                self.stdout.write(
-                    self.style.SUCCESS(
-                        f'Order #{order.order_number}: {current_status} → {next_status}'
-                    )
-                )
-        
+
+        for (current_status, next_status), order_ids in advance_due_orders().items():
+            self.report(current_status, next_status, order_ids)
+            updated_count += len(order_ids)
+
         if updated_count == 0:
             self.stdout.write(self.style.WARNING('No orders to progress'))
         else:
             self.stdout.write(
                 self.style.SUCCESS(f'Successfully progressed {updated_count} orders')
             )
+
+    def run_daemon(self, poll_interval):
+        self.running = True
+        signal.signal(signal.SIGTERM, self.stop)
+
+        scheduler = DeadlineScheduler()
+        tracked = scheduler.load()
+        self.stdout.write(f'Tracking {tracked} active orders, polling for changes every {poll_interval}s')
+
+        next_poll = time.monotonic() + poll_interval
+        try:
+            while self.running:
+                self.fire_due(scheduler)
+
+                if time.monotonic() >= next_poll:
+                    scheduler.poll()
+                    next_poll = time.monotonic() + poll_interval
+
+                # Sleep until the next deadline or the next poll, whichever is sooner
+                wait = next_poll - time.monotonic()
+                deadline = scheduler.next_deadline()
+                if deadline is not None:
+                    wait = min(wait, (deadline - timezone.now()).total_seconds())
+                if wait > 0:
+                    time.sleep(wait)
+        except KeyboardInterrupt:
+            pass
+
+        self.stdout.write(self.style.WARNING('Order progression daemon stopped'))
+
+    def fire_due(self, scheduler):
+        due = scheduler.pop_due(timezone.now())
+        if not due:
+            return
+
+        by_status = {}
+        for order_id, status in due:
+            by_status.setdefault(status, []).append(order_id)
+
+        for current_status, order_ids in by_status.items():
+            next_status = NEXT_STATUS[current_status][0]
+            # Chunk the id lists to stay under SQLite's bound-parameter limit.
+            # Orders whose status moved on since they were scheduled are skipped.
+            for start in range(0, len(order_ids), 500):
+                advanced = apply_transition(current_status, next_status, order_ids=order_ids[start:start + 500])
+                self.report(current_status, next_status, advanced)
+
+    def report(self, current_status, next_status, order_ids):
+        if not order_ids:
+            return
+        self.stdout.write(
+            self.style.SUCCESS(f'{len(order_ids)} orders: {current_status} → {next_status}')
+        )
+        if self.verbosity > 1:
+            for order_id in order_ids:
+                self.stdout.write(f'  Order id {order_id}')
+
+    def stop(self, signum, frame):
+        self.running = False
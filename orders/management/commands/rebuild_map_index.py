@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from orders import mapindex
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the map index of orders and reservations from scratch, geocoding their addresses'
+
+    def handle(self, *args, **options):
+        points = mapindex.rebuild_index()
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt the map index with {points} points'))
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from orders import search
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the orders full-text search index from scratch'
+
+    def handle(self, *args, **options):
+        if not search.is_supported():
+            self.stdout.write(self.style.WARNING('This database backend has no search index; searches use icontains'))
+            return
+        search.rebuild_index()
+        self.stdout.write(self.style.SUCCESS('Rebuilt the orders search index'))
@@ -0,0 +1,238 @@
+"""Spatial index behind the map data endpoint.
+
+Every located order and reservation has a MapPoint carrying its geohash,
+and MapCell counts the points in each ``CELL_PRECISION`` cell by kind and
+status. Both are kept up to date by the change signals. A viewport is
+answered from the cells when zoomed out, clustered by a geohash prefix
+sized to the zoom, and from the points, capped at ``MAX_POINTS``, when
+zoomed in. Either way the work depends on the size of the viewport, not on
+how many orders there are.
+
+A status change that leaves the address alone updates the point in place,
+and bulk progression moves a whole chunk of points with one UPDATE
+(restatus_orders) instead of placing them again.
+
+Points are placed with orders.geocoding; after correcting cached
+coordinates by hand, run rebuild_map_index to move the points.
+"""
+from django.db import IntegrityError, transaction
+from django.db.models import F, Q
+
+from reservations.models import Reservation
+from . import geohash
+from .geocoding import locate
+from .models import MapCell, MapPoint, Order
+
+POINT_PRECISION = 9
+CELL_PRECISION = 6
+
+# Below this zoom, or with more than MAX_POINTS points in view, the map gets clusters
+POINT_ZOOM = 15
+MAX_POINTS = 500
+
+# Smallest on-screen size, in pixels, of the cells clustered together
+CLUSTER_PIXELS = 64
+
+CHUNK_SIZE = 500
+
+
+def index_orders(order_ids):
+    """Add, move or remove the points of ``order_ids`` to match the orders table"""
+    order_ids = list(order_ids)
+    for start in range(0, len(order_ids), CHUNK_SIZE):
+        chunk = order_ids[start:start + CHUNK_SIZE]
+        rows = Order.objects.filter(pk__in=chunk).order_by().values_list('id', 'status', 'reservation__address')
+        _sync(MapPoint.Kind.ORDER, chunk, rows)
+
+
+def index_reservations(reservation_ids):
+    """Add, move or remove the points of ``reservation_ids`` to match the reservations table"""
+    reservation_ids = list(reservation_ids)
+    for start in range(0, len(reservation_ids), CHUNK_SIZE):
+        chunk = reservation_ids[start:start + CHUNK_SIZE]
+        rows = Reservation.objects.filter(pk__in=chunk).order_by().values_list('id', 'status', 'address')
+        _sync(MapPoint.Kind.RESERVATION, chunk, rows)
+
+
+def restatus_orders(order_ids, current_status, next_status):
+    """Move the points of ``order_ids`` from ``current_status`` to ``next_status`` in place.
+
+    For bulk status changes, which leave every address alone. Points not at
+    ``current_status`` (unlocated orders, or ones a save has synced since)
+    are left as they are.
+    """
+    order_ids = list(order_ids)
+    for start in range(0, len(order_ids), CHUNK_SIZE):
+        chunk = order_ids[start:start + CHUNK_SIZE]
+        with transaction.atomic():
+            points = list(
+                MapPoint.objects.select_for_update()
+                .filter(kind=MapPoint.Kind.ORDER, object_id__in=chunk, status=current_status)
+                .values_list('pk', 'latitude', 'longitude')
+            )
+            if not points:
+                continue
+            MapPoint.objects.filter(pk__in=[pk for pk, _, _ in points]).update(status=next_status)
+            deltas = {}
+            for _, latitude, longitude in points:
+                _add_delta(deltas, MapPoint.Kind.ORDER, current_status, latitude, longitude, -1)
+                _add_delta(deltas, MapPoint.Kind.ORDER, next_status, latitude, longitude, 1)
+            for (cell, kind, status), (count, latitude_sum, longitude_sum) in deltas.items():
+                _apply_delta(cell, kind, status, count, latitude_sum, longitude_sum)
+
+
+def rebuild_index():
+    """Recompute every point and cell; returns the number of points"""
+    with transaction.atomic():
+        MapPoint.objects.all().delete()
+        MapCell.objects.all().delete()
+        index_orders(Order.objects.values_list('id', flat=True).iterator(chunk_size=2000))
+        index_reservations(Reservation.objects.values_list('id', flat=True).iterator(chunk_size=2000))
+    return MapPoint.objects.count()
+
+
+def _sync(kind, object_ids, rows):
+    rows = list(rows)
+    located = locate({address for _, _, address in rows if address})
+    wanted = {}
+    for object_id, status, address in rows:
+        point = located.get(address)
+        if point is not None:
+            wanted[object_id] = (status, *point)
+    try:
+        with transaction.atomic():
+            _write_points(kind, object_ids, wanted)
+    except IntegrityError:
+        # A concurrent sync added one of these points first; diff against what it stored
+        with transaction.atomic():
+            _write_points(kind, object_ids, wanted)
+
+
+def _write_points(kind, object_ids, wanted):
+    """Make the points of ``object_ids`` match ``wanted``, moving the cell counts with them"""
+    existing = {
+        point.object_id: point
+        for point in MapPoint.objects.select_for_update().filter(kind=kind, object_id__in=object_ids)
+    }
+    deltas = {}
+    stale = set()
+    restatus = {}
+    for object_id, point in existing.items():
+        target = wanted.get(object_id)
+        if target == (point.status, point.latitude, point.longitude):
+            continue
+        _add_delta(deltas, kind, point.status, point.latitude, point.longitude, -1)
+        if target is not None and target[1:] == (point.latitude, point.longitude):
+            # Same place, new status: keep the point
+            restatus.setdefault(target[0], []).append(point.pk)
+            _add_delta(deltas, kind, target[0], point.latitude, point.longitude, 1)
+        else:
+            stale.add(point.pk)
+    fresh = []
+    for object_id, (status, latitude, longitude) in wanted.items():
+        point = existing.get(object_id)
+        if point is None or point.pk in stale:
+            _add_delta(deltas, kind, status, latitude, longitude, 1)
+            fresh.append(MapPoint(
+                kind=kind, object_id=object_id, status=status, latitude=latitude, longitude=longitude,
+                geohash=geohash.encode(latitude, longitude, POINT_PRECISION),
+            ))
+    if not stale and not fresh and not restatus:
+        return
+    MapPoint.objects.filter(pk__in=stale).delete()
+    for status, point_ids in restatus.items():
+        MapPoint.objects.filter(pk__in=point_ids).update(status=status)
+    MapPoint.objects.bulk_create(fresh, batch_size=CHUNK_SIZE)
+    for (cell, kind, status), (count, latitude_sum, longitude_sum) in deltas.items():
+        _apply_delta(cell, kind, status, count, latitude_sum, longitude_sum)
+
+
+def _add_delta(deltas, kind, status, latitude, longitude, sign):
+    key = (geohash.encode(latitude, longitude, CELL_PRECISION), kind, status)
+    count, latitude_sum, longitude_sum = deltas.get(key, (0, 0.0, 0.0))
+    deltas[key] = (count + sign, latitude_sum + sign * latitude, longitude_sum + sign * longitude)
+
+
+def _apply_delta(cell, kind, status, count, latitude_sum, longitude_sum):
+    if not count and not latitude_sum and not longitude_sum:
+        return
+    cells = MapCell.objects.filter(geohash=cell, kind=kind, status=status)
+    changes = {
+        'count': F('count') + count,
+        'latitude_sum': F('latitude_sum') + latitude_sum,
+        'longitude_sum': F('longitude_sum') + longitude_sum,
+    }
+    if cells.update(**changes) or count <= 0:
+        return
+    try:
+        with transaction.atomic():
+            MapCell.objects.create(
+                geohash=cell, kind=kind, status=status, count=count,
+                latitude_sum=latitude_sum, longitude_sum=longitude_sum,
+            )
+    except IntegrityError:
+        # Another change created the cell first
+        cells.update(**changes)
+
+
+def cluster_precision(zoom):
+    """Longest geohash prefix whose cells are still CLUSTER_PIXELS wide at ``zoom``"""
+    for precision in range(CELL_PRECISION, 0, -1):
+        height, width = geohash.cell_size(precision)
+        if min(height, width) / 360 * 256 * 2 ** zoom >= CLUSTER_PIXELS:
+            return precision
+    return 1
+
+
+def features(south, west, north, east, zoom, kinds=None, statuses=None):
+    """GeoJSON features inside the box: points when zoomed in, clusters otherwise"""
+    def filtered(queryset, max_precision):
+        ranges = Q()
+        for prefix in geohash.cover(south, west, north, east, max_precision):
+            ranges |= Q(geohash__gte=prefix, geohash__lt=prefix + geohash.PREFIX_END)
+        queryset = queryset.filter(ranges)
+        if kinds:
+            queryset = queryset.filter(kind__in=kinds)
+        if statuses:
+            queryset = queryset.filter(status__in=statuses)
+        return queryset
+
+    if zoom >= POINT_ZOOM:
+        points = list(
+            filtered(MapPoint.objects, POINT_PRECISION)
+            .filter(latitude__range=(south, north), longitude__range=(west, east))
+            .values_list('kind', 'object_id', 'status', 'latitude', 'longitude')[:MAX_POINTS + 1]
+        )
+        if len(points) <= MAX_POINTS:
+            return [
+                _feature(latitude, longitude, {'kind': kind, 'id': object_id, 'status': status})
+                for kind, object_id, status, latitude, longitude in points
+            ]
+
+    precision = cluster_precision(zoom)
+    clusters = {}
+    cells = filtered(MapCell.objects, CELL_PRECISION).filter(count__gt=0).values_list(
+        'geohash', 'status', 'count', 'latitude_sum', 'longitude_sum',
+    )
+    for cell, status, count, latitude_sum, longitude_sum in cells:
+        cluster = clusters.setdefault(cell[:precision], {'count': 0, 'latitude_sum': 0.0, 'longitude_sum': 0.0, 'statuses': {}})
+        cluster['count'] += count
+        cluster['latitude_sum'] += latitude_sum
+        cluster['longitude_sum'] += longitude_sum
+        cluster['statuses'][status] = cluster['statuses'].get(status, 0) + count
+    result = []
+    for prefix, cluster in clusters.items():
+        latitude, longitude = cluster['latitude_sum'] / cluster['count'], cluster['longitude_sum'] / cluster['count']
+        if south <= latitude <= north and west <= longitude <= east:
+            result.append(_feature(latitude, longitude, {
+                'cluster': True, 'geohash': prefix, 'count': cluster['count'], 'statuses': cluster['statuses'],
+            }))
+    return result
+
+
+def _feature(latitude, longitude, properties):
+    return {
+        'type': 'Feature',
+        'geometry': {'type': 'Point', 'coordinates': [round(longitude, 6), round(latitude, 6)]},
+        'properties': properties,
+    }
@@ -0,0 +1,31 @@
+# Generated by Django 5.2.8 on 2026-10-18 06:51
+
+from django.db import migrations, models
+from django.db.models import Max
+
+
+def seed_order_number_sequence(apps, schema_editor):
+    # Existing order numbers were built from the pk, so start above it
+    Order = apps.get_model('orders', 'Order')
+    OrderNumberSequence = apps.get_model('orders', 'OrderNumberSequence')
+    highest = Order.objects.aggregate(Max('id'))['id__max'] or 0
+    OrderNumberSequence.objects.create(name='order_number', next_value=highest + 1)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0002_alter_order_options_order_estimated_completion_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OrderNumberSequence',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=50, unique=True)),
+                ('next_value', models.BigIntegerField(default=1)),
+            ],
+        ),
+        migrations.RunPython(seed_order_number_sequence, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,24 @@
+from django.db import migrations
+
+from orders import search
+
+
+def create_search_index(apps, schema_editor):
+    search.create_index(schema_editor)
+    search.populate_index(schema_editor)
+
+
+def drop_search_index(apps, schema_editor):
+    search.drop_index(schema_editor)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth', '0012_alter_user_first_name_max_length'),
+        ('orders', '0003_ordernumbersequence'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 5.2.8 on 2026-10-18 07:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0005_order_order_user_created_idx_order_order_created_idx_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='GeocodedAddress',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('address', models.CharField(max_length=255, unique=True)),
+                ('latitude', models.FloatField(blank=True, null=True)),
+                ('longitude', models.FloatField(blank=True, null=True)),
+                ('precision', models.CharField(choices=[('manual', 'Set by hand'), ('barangay', 'Barangay'), ('municipality', 'Municipality'), ('unresolved', 'Unresolved')], max_length=20)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name_plural': 'geocoded addresses',
+            },
+        ),
+    ]
@@ -0,0 +1,44 @@
+# Generated by Django 5.2.8 on 2026-10-18 07:44
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0006_geocodedaddress'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MapCell',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('geohash', models.CharField(max_length=6)),
+                ('kind', models.CharField(choices=[('order', 'Order'), ('reservation', 'Reservation')], max_length=20)),
+                ('status', models.CharField(max_length=20)),
+                ('count', models.IntegerField(default=0)),
+                ('latitude_sum', models.FloatField(default=0)),
+                ('longitude_sum', models.FloatField(default=0)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('geohash', 'kind', 'status'), name='map_cell_unique')],
+            },
+        ),
+        migrations.CreateModel(
+            name='MapPoint',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('order', 'Order'), ('reservation', 'Reservation')], max_length=20)),
+                ('object_id', models.PositiveBigIntegerField()),
+                ('status', models.CharField(max_length=20)),
+                ('latitude', models.FloatField()),
+                ('longitude', models.FloatField()),
+                ('geohash', models.CharField(max_length=9)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['geohash'], name='map_point_geohash_idx')],
+                'constraints': [models.UniqueConstraint(fields=('kind', 'object_id'), name='map_point_object_unique')],
+            },
+        ),
+    ]
@@ -0,0 +1,26 @@
+from django.conf import settings
+from django.db import migrations
+
+
+def set_journal_mode(mode):
+    def apply(apps, schema_editor):
+        if schema_editor.connection.vendor == 'sqlite':
+            schema_editor.execute(f'PRAGMA journal_mode = {mode}')
+    return apply
+
+
+class Migration(migrations.Migration):
+
+    # SQLite cannot enter or leave WAL mode inside a transaction
+    atomic = False
+
+    dependencies = [
+        ('orders', '0007_map_index'),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            set_journal_mode(settings.SQLITE_JOURNAL_MODE),
+            set_journal_mode('DELETE'),
+        ),
+    ]
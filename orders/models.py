@@ -1,8 +1,25 @@
 from django.conf import settings
-from django.db import models
+from django.db import models, transaction
 from decimal import Decimal
 
 
+class OrderQuerySet(models.QuerySet):
+	def bulk_create(self, objs, *args, **kwargs):
+		from .numbering import format_order_number, reserve_numbers
+		from .signals import orders_created
+		objs = list(objs)
+		# Number every order up front so the whole batch is one INSERT statement
+		unnumbered = [obj for obj in objs if not obj.order_number]
+		if unnumbered:
+			first = reserve_numbers(len(unnumbered))
+			for offset, obj in enumerate(unnumbered):
+				obj.order_number = format_order_number(first + offset)
+		created = super().bulk_create(objs, *args, **kwargs)
+		# bulk_create bypasses post_save; tell change listeners about the batch
+		orders_created.send(sender=self.model, orders=created)
+		return created
+
+
 class Order(models.Model):
 	class Status(models.TextChoices):
 		PENDING = 'pending', 'Pending'
@@ -26,23 +43,38 @@ class Order(models.Model):
 	created_at = models.DateTimeField(auto_now_add=True)
 	updated_at = models.DateTimeField(auto_now=True)
 
+	objects = OrderQuerySet.as_manager()
+
 	class Meta:
 		ordering = ['-created_at']
+		indexes = [
+			models.Index(fields=['user', 'created_at'], name='order_user_created_idx'),
+			models.Index(fields=['created_at', 'id'], name='order_created_idx'),
+			models.Index(fields=['status', 'created_at', 'id'], name='order_status_created_idx'),
+			# Due transitions, and the progression daemon's change cursor
+			models.Index(fields=['status', 'updated_at'], name='order_status_updated_idx'),
+			models.Index(fields=['updated_at'], name='order_updated_idx'),
+		]
 
 	def __str__(self) -> str:
 		return f"Order #{self.order_number or self.pk} ({self.get_status_display()})"
 	
 	def save(self, *args, **kwargs):
 		if not self.order_number:
-			# First save to get the pk
+			# Allocated before the INSERT so a new order costs a single write
+			from .numbering import next_order_number
+			self.order_number = next_order_number()
+		with transaction.atomic():
+			self._remember_stored_values()
 			super().save(*args, **kwargs)
-			# Then generate order number with pk
-			from django.utils import timezone
-			now = timezone.now()
-			self.order_number = f"LP{self.pk:04d}{now.strftime('%m%d')}"
-			super().save(update_fields=['order_number'])
+	
+	def _remember_stored_values(self):
+		# The instance may be stale (e.g. advanced in bulk since it was loaded), so
+		# change listeners compute deltas from the stored row, locked until the save commits
+		if self.pk is None:
+			self._stored_values = {}
 		else:
-			super().save(*args, **kwargs)
+			self._stored_values = Order.objects.select_for_update().filter(pk=self.pk).values().first() or {}
 	
 	def get_status_color(self):
 		colors = {
@@ -86,6 +118,94 @@ class Order(models.Model):
 		}
 		return status_icons.get(self.status, 'clock')
 
+	def card_version(self):
+		"""Changes whenever something shown on the order list card does.
+
+		Item edits and reservation changes leave ``updated_at`` alone, so they
+		are folded in too; prefetch ``items`` and select ``reservation`` to
+		keep this free of queries.
+		"""
+		reservation = self.reservation
+		return '{}|{}|{}'.format(
+			self.updated_at.timestamp(),
+			reservation.updated_at.timestamp() if reservation else '',
+			','.join(f'{item.pk}:{item.item_type}:{item.service_level}:{item.quantity}' for item in self.items.all()),
+		)
+
+
+class GeocodedAddress(models.Model):
+	"""Coordinates of a normalized delivery address, resolved offline and cached"""
+	class Precision(models.TextChoices):
+		MANUAL = 'manual', 'Set by hand'
+		BARANGAY = 'barangay', 'Barangay'
+		MUNICIPALITY = 'municipality', 'Municipality'
+		UNRESOLVED = 'unresolved', 'Unresolved'
+
+	address = models.CharField(max_length=255, unique=True)
+	latitude = models.FloatField(null=True, blank=True)
+	longitude = models.FloatField(null=True, blank=True)
+	precision = models.CharField(max_length=20, choices=Precision.choices)
+	updated_at = models.DateTimeField(auto_now=True)
+
+	class Meta:
+		verbose_name_plural = 'geocoded addresses'
+
+	def __str__(self) -> str:
+		return f"{self.address} ({self.get_precision_display()})"
+
+
+class MapPoint(models.Model):
+	"""Where an order or reservation is, indexed by geohash for viewport queries"""
+	class Kind(models.TextChoices):
+		ORDER = 'order', 'Order'
+		RESERVATION = 'reservation', 'Reservation'
+
+	kind = models.CharField(max_length=20, choices=Kind.choices)
+	object_id = models.PositiveBigIntegerField()
+	status = models.CharField(max_length=20)
+	latitude = models.FloatField()
+	longitude = models.FloatField()
+	geohash = models.CharField(max_length=9)
+
+	class Meta:
+		constraints = [
+			models.UniqueConstraint(fields=['kind', 'object_id'], name='map_point_object_unique'),
+		]
+		indexes = [
+			models.Index(fields=['geohash'], name='map_point_geohash_idx'),
+		]
+
+	def __str__(self) -> str:
+		return f"{self.kind} {self.object_id} at {self.geohash}"
+
+
+class MapCell(models.Model):
+	"""Map points per geohash cell, kind and status, kept up to date by deltas"""
+	geohash = models.CharField(max_length=6)
+	kind = models.CharField(max_length=20, choices=MapPoint.Kind.choices)
+	status = models.CharField(max_length=20)
+	count = models.IntegerField(default=0)
+	# Sums rather than means so deltas can be added without reading the row
+	latitude_sum = models.FloatField(default=0)
+	longitude_sum = models.FloatField(default=0)
+
+	class Meta:
+		constraints = [
+			models.UniqueConstraint(fields=['geohash', 'kind', 'status'], name='map_cell_unique'),
+		]
+
+	def __str__(self) -> str:
+		return f"{self.geohash} {self.kind} {self.status}: {self.count}"
+
+
+class OrderNumberSequence(models.Model):
+	"""Shared counter behind order numbers, handed out in reserved blocks"""
+	name = models.CharField(max_length=50, unique=True)
+	next_value = models.BigIntegerField(default=1)
+
+	def __str__(self) -> str:
+		return f"{self.name}: {self.next_value}"
+
 
 class OrderItem(models.Model):
 	class ItemType(models.TextChoices):
@@ -0,0 +1,56 @@
+import threading
+
+from django.db import IntegrityError, connection, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import OrderNumberSequence
+
+SEQUENCE_NAME = 'order_number'
+
+# Numbers each process reserves at a time for single saves. Numbers left in a
+# block when a worker exits are skipped, never reused.
+BLOCK_SIZE = 20
+
+_block_lock = threading.Lock()
+_block = {'next': 0, 'end': 0}
+
+
+def format_order_number(value, now=None):
+    now = now or timezone.now()
+    return f"LP{value:04d}{now.strftime('%m%d')}"
+
+
+def reserve_numbers(count):
+    """Reserve ``count`` consecutive sequence values and return the first.
+
+    The increment and read-back run in one transaction. The UPDATE takes the
+    write lock (SQLite) or the row lock (PostgreSQL), so concurrent workers
+    always get disjoint ranges.
+    """
+    sequence = OrderNumberSequence.objects.filter(name=SEQUENCE_NAME)
+    with transaction.atomic():
+        if not sequence.update(next_value=F('next_value') + count):
+            try:
+                with transaction.atomic():
+                    OrderNumberSequence.objects.create(name=SEQUENCE_NAME, next_value=1 + count)
+            except IntegrityError:
+                # Another process created the row first
+                sequence.update(next_value=F('next_value') + count)
+        end = sequence.values_list('next_value', flat=True).get()
+    return end - count
+
+
+def next_order_number():
+    """Return a fresh order number, from this process's reserved block when possible"""
+    with _block_lock:
+        if _block['next'] >= _block['end']:
+            if connection.in_atomic_block:
+                # A reservation made inside the caller's transaction is undone
+                # if it rolls back, so only take what this order needs
+                return format_order_number(reserve_numbers(1))
+            _block['next'] = reserve_numbers(BLOCK_SIZE)
+            _block['end'] = _block['next'] + BLOCK_SIZE
+        value = _block['next']
+        _block['next'] += 1
+    return format_order_number(value)
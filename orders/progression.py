@@ -0,0 +1,154 @@
+import heapq
+from datetime import timedelta
+
+from django.db import transaction
+from django.utils import timezone
+
+from notifications.models import Notification
+from .models import Order
+from .signals import orders_advanced
+
+
+# Status progression with time intervals (in minutes)
+PROGRESSIONS = [
+    ('pending', 'confirmed', 5),
+    ('confirmed', 'picked_up', 10),
+    ('picked_up', 'washing', 15),
+    ('washing', 'drying', 20),
+    ('drying', 'folding', 15),
+    ('folding', 'ready', 10),
+    ('ready', 'out_for_delivery', 5),
+    ('out_for_delivery', 'delivered', 10),
+]
+
+# current status -> (next status, delay before the transition is due)
+NEXT_STATUS = {
+    current: (following, timedelta(minutes=minutes))
+    for current, following, minutes in PROGRESSIONS
+}
+
+
+def apply_transition(current_status, next_status, now=None, due_before=None, order_ids=None, notify=True):
+    """Advance a whole status bucket with one UPDATE and return the affected order ids.
+
+    Either ``due_before`` (orders last updated at or before it) or ``order_ids``
+    selects the bucket. Moved rows are stamped with ``now``, which is how they
+    are told apart from the rest of ``next_status`` when reading back their ids.
+    """
+    now = now or timezone.now()
+    orders = Order.objects.filter(status=current_status)
+    moved = Order.objects.filter(status=next_status, updated_at=now)
+    if due_before is not None:
+        orders = orders.filter(updated_at__lte=due_before)
+    if order_ids is not None:
+        orders = orders.filter(id__in=order_ids)
+        moved = moved.filter(id__in=order_ids)
+
+    with transaction.atomic():
+        if not orders.update(status=next_status, updated_at=now):
+            return []
+        rows = list(moved.values_list('id', 'user_id', 'order_number', 'total_cost'))
+
+        if notify:
+            label = Order.Status(next_status).label
+            Notification.objects.bulk_create(
+                [
+                    Notification(user_id=user_id, message=f'Your order #{order_number} is now {label}.')
+                    for order_id, user_id, order_number, total_cost in rows
+                ],
+                batch_size=500,
+            )
+
+        orders_advanced.send(sender=Order, current_status=current_status, next_status=next_status, rows=rows)
+
+    return [row[0] for row in rows]
+
+
+def advance_due_orders(now=None, notify=True):
+    """Run one progression tick and return ``{(current, next): [order ids]}``"""
+    now = now or timezone.now()
+    advanced = {}
+    for current_status, next_status, minutes in PROGRESSIONS:
+        advanced[(current_status, next_status)] = apply_transition(
+            current_status,
+            next_status,
+            now=now,
+            due_before=now - timedelta(minutes=minutes),
+            notify=notify,
+        )
+    return advanced
+
+
+class DeadlineScheduler:
+    """Min-heap of the next transition deadline for every active order.
+
+    Orders enter the heap through a change cursor on ``(updated_at, id)``, so
+    each poll only reads rows touched since the previous one. Heap entries are
+    never removed eagerly: an entry is stale once the order's tracked
+    ``(status, updated_at)`` no longer matches, and it is dropped when popped.
+    """
+
+    def __init__(self, lag=timedelta(seconds=5)):
+        # Re-read a short window behind the cursor so rows committed late with
+        # an earlier updated_at are not missed
+        self.lag = lag
+        self.heap = []
+        self.tracked = {}
+        self.cursor = None
+
+    def __len__(self):
+        return len(self.tracked)
+
+    def load(self):
+        """Seed the heap with every order that still has a transition ahead"""
+        rows = Order.objects.exclude(status=Order.Status.DELIVERED).values_list('id', 'status', 'updated_at')
+        for order_id, status, updated_at in rows.iterator(chunk_size=2000):
+            self._track(order_id, status, updated_at)
+        latest = Order.objects.order_by('-updated_at').values_list('updated_at', flat=True).first()
+        self.cursor = latest or timezone.now()
+        return len(self.tracked)
+
+    def poll(self):
+        """Pick up orders created or changed since the last poll"""
+        rows = (
+            Order.objects.filter(updated_at__gte=self.cursor - self.lag)
+            .order_by('updated_at', 'id')
+            .values_list('id', 'status', 'updated_at')
+        )
+        changed = 0
+        for order_id, status, updated_at in rows.iterator(chunk_size=2000):
+            if self.tracked.get(order_id) == (status, updated_at):
+                continue
+            self._track(order_id, status, updated_at)
+            changed += 1
+            if updated_at > self.cursor:
+                self.cursor = updated_at
+        return changed
+
+    def next_deadline(self):
+        """Deadline of the earliest live entry, or None when nothing is scheduled"""
+        while self.heap:
+            deadline, order_id, status, updated_at = self.heap[0]
+            if self.tracked.get(order_id) == (status, updated_at):
+                return deadline
+            heapq.heappop(self.heap)
+        return None
+
+    def pop_due(self, now):
+        """Remove and return ``(order_id, status)`` for every entry due by ``now``"""
+        due = []
+        while self.heap and self.heap[0][0] <= now:
+            deadline, order_id, status, updated_at = heapq.heappop(self.heap)
+            if self.tracked.get(order_id) != (status, updated_at):
+                continue
+            del self.tracked[order_id]
+            due.append((order_id, status))
+        return due
+
+    def _track(self, order_id, status, updated_at):
+        if status not in NEXT_STATUS:
+            self.tracked.pop(order_id, None)
+            return
+        self.tracked[order_id] = (status, updated_at)
+        deadline = updated_at + NEXT_STATUS[status][1]
+        heapq.heappush(self.heap, (deadline, order_id, status, updated_at))
@@ -0,0 +1,92 @@
+"""Delivery route batching.
+
+Stops are split into driver batches by sweeping around the shop: sorted by
+bearing from it, starting after the widest empty arc, and cut into runs of
+at most ``max_stops``, so each driver covers one wedge of the island. Each
+batch is then ordered as a round trip from the shop, nearest neighbour
+first and improved with 2-opt. Distances are straight lines on a local flat
+projection, which at this scale is within a fraction of a percent of the
+great-circle distance.
+"""
+import math
+
+# The shop, in Naval
+DEPOT = (11.5614, 124.3963)
+
+MAX_STOPS = 25
+MAX_STOPS_LIMIT = 100
+
+KM_PER_DEGREE = 111.195
+
+# Passes 2-opt may make over one batch before it settles for what it has
+TWO_OPT_PASSES = 50
+
+
+def plan_routes(stops, max_stops=MAX_STOPS, drivers=None, depot=DEPOT):
+    """Batch and order ``stops``, a list of ``(key, latitude, longitude)``.
+
+    ``drivers`` asks for at least that many batches. Returns a list of
+    ``{'stops': [key, ...], 'distance_km': float}``, each a round trip from
+    ``depot`` in delivery order.
+    """
+    if not stops:
+        return []
+    max_stops = max(1, min(max_stops, MAX_STOPS_LIMIT))
+    scale = math.cos(math.radians(depot[0])) * KM_PER_DEGREE
+    points = [((longitude - depot[1]) * scale, (latitude - depot[0]) * KM_PER_DEGREE) for _, latitude, longitude in stops]
+    count = max(drivers or 1, math.ceil(len(stops) / max_stops))
+    count = min(count, len(stops))
+    routes = []
+    for batch in sweep(points, count):
+        order, distance = tour([points[index] for index in batch])
+        routes.append({'stops': [stops[batch[position]][0] for position in order], 'distance_km': round(distance, 2)})
+    return routes
+
+
+def sweep(points, count):
+    """Split point indexes into ``count`` runs of consecutive bearing from the origin"""
+    by_bearing = sorted(range(len(points)), key=lambda index: math.atan2(points[index][1], points[index][0]))
+    bearings = [math.atan2(points[index][1], points[index][0]) for index in by_bearing]
+    # Start after the widest gap so no batch straddles it
+    gaps = [(bearings[(position + 1) % len(bearings)] - bearing) % (2 * math.pi) for position, bearing in enumerate(bearings)]
+    start = (max(range(len(gaps)), key=gaps.__getitem__) + 1) % len(bearings)
+    by_bearing = by_bearing[start:] + by_bearing[:start]
+    size, extra = divmod(len(by_bearing), count)
+    batches = []
+    position = 0
+    for number in range(count):
+        end = position + size + (number < extra)
+        batches.append(by_bearing[position:end])
+        position = end
+    return batches
+
+
+def tour(points):
+    """Order ``points`` as a round trip from the origin; returns ``(positions, length)``"""
+    nodes = [(0.0, 0.0)] + points
+    distance = [[math.hypot(ax - bx, ay - by) for bx, by in nodes] for ax, ay in nodes]
+    route = [0]
+    remaining = set(range(1, len(nodes)))
+    while remaining:
+        row = distance[route[-1]]
+        closest = min(remaining, key=row.__getitem__)
+        remaining.remove(closest)
+        route.append(closest)
+    route.append(0)
+    two_opt(route, distance)
+    length = sum(distance[a][b] for a, b in zip(route, route[1:]))
+    return [node - 1 for node in route[1:-1]], length
+
+
+def two_opt(route, distance):
+    """Reverse segments of ``route`` in place while that shortens it"""
+    for _ in range(TWO_OPT_PASSES):
+        improved = False
+        for i in range(1, len(route) - 2):
+            for j in range(i + 1, len(route) - 1):
+                a, b, c, d = route[i - 1], route[i], route[j], route[j + 1]
+                if distance[a][c] + distance[b][d] < distance[a][b] + distance[c][d] - 1e-9:
+                    route[i:j + 1] = route[j:i - 1:-1]
+                    improved = True
+        if not improved:
+            break
@@ -0,0 +1,162 @@
+"""Full-text search index over orders for the admin orders search box.
+
+On SQLite the index is an FTS5 table with the trigram tokenizer, so any
+substring of three or more characters matches, as with ``icontains``, and
+results are ranked with bm25. On PostgreSQL it is a plain table with one
+search document per order and a pg_trgm GIN index. Other backends, and
+queries too short for trigrams, fall back to ``icontains`` lookups.
+"""
+from django.contrib.auth.models import User
+from django.db import connection
+from django.db.models import Q, Value
+from django.db.models.expressions import RawSQL
+
+from .models import Order
+
+SEARCH_TABLE = 'orders_order_search'
+
+# bm25 weights for order_number, customer_name, username, email, special_instructions
+COLUMN_WEIGHTS = '10.0, 5.0, 5.0, 3.0, 1.0'
+
+# Fields that change what an order is found by
+INDEXED_ORDER_FIELDS = ('order_number', 'special_instructions', 'user_id')
+INDEXED_USER_FIELDS = ('username', 'first_name', 'last_name', 'email')
+
+
+def is_supported():
+    return connection.vendor in ('sqlite', 'postgresql')
+
+
+def create_index(schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'sqlite':
+        schema_editor.execute(
+            f"CREATE VIRTUAL TABLE {SEARCH_TABLE} USING fts5("
+            "order_number, customer_name, username, email, special_instructions, "
+            "tokenize='trigram')"
+        )
+    elif vendor == 'postgresql':
+        schema_editor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+        schema_editor.execute(f'CREATE TABLE {SEARCH_TABLE} (order_id bigint PRIMARY KEY, document text NOT NULL)')
+        schema_editor.execute(
+            f'CREATE INDEX {SEARCH_TABLE}_trgm ON {SEARCH_TABLE} USING gin (document gin_trgm_ops)'
+        )
+
+
+def drop_index(schema_editor):
+    if schema_editor.connection.vendor in ('sqlite', 'postgresql'):
+        schema_editor.execute(f'DROP TABLE IF EXISTS {SEARCH_TABLE}')
+
+
+def index_orders(orders):
+    """Add or refresh the index entries for ``orders``"""
+    if not is_supported() or not orders:
+        return
+    users = {
+        user.pk: user
+        for user in User.objects.filter(pk__in={order.user_id for order in orders}).only(*INDEXED_USER_FIELDS)
+    }
+    rows = [_index_row(order, users.get(order.user_id)) for order in orders]
+    with connection.cursor() as cursor:
+        if connection.vendor == 'sqlite':
+            cursor.executemany(f'DELETE FROM {SEARCH_TABLE} WHERE rowid = %s', [(row[0],) for row in rows])
+            cursor.executemany(
+                f'INSERT INTO {SEARCH_TABLE} (rowid, order_number, customer_name, username, email, special_instructions) '
+                'VALUES (%s, %s, %s, %s, %s, %s)',
+                rows,
+            )
+        else:
+            cursor.executemany(
+                f'INSERT INTO {SEARCH_TABLE} (order_id, document) VALUES (%s, %s) '
+                'ON CONFLICT (order_id) DO UPDATE SET document = EXCLUDED.document',
+                [(row[0], ' '.join(row[1:])) for row in rows],
+            )
+
+
+def unindex_order(order_id):
+    if not is_supported():
+        return
+    key = 'rowid' if connection.vendor == 'sqlite' else 'order_id'
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {SEARCH_TABLE} WHERE {key} = %s', [order_id])
+
+
+def reindex_user(user):
+    """Refresh the customer columns of every order placed by ``user``"""
+    if not is_supported():
+        return
+    index_orders(list(Order.objects.filter(user=user).only(*INDEXED_ORDER_FIELDS)))
+
+
+def populate_index(schema_editor):
+    """Index every existing order with one INSERT ... SELECT"""
+    vendor = schema_editor.connection.vendor
+    if vendor == 'sqlite':
+        schema_editor.execute(
+            f"INSERT INTO {SEARCH_TABLE} (rowid, order_number, customer_name, username, email, special_instructions) "
+            "SELECT o.id, o.order_number, trim(u.first_name || ' ' || u.last_name), u.username, u.email, o.special_instructions "
+            "FROM orders_order o JOIN auth_user u ON u.id = o.user_id"
+        )
+    elif vendor == 'postgresql':
+        schema_editor.execute(
+            f"INSERT INTO {SEARCH_TABLE} (order_id, document) "
+            "SELECT o.id, concat_ws(' ', o.order_number, trim(u.first_name || ' ' || u.last_name), "
+            "u.username, u.email, o.special_instructions) "
+            "FROM orders_order o JOIN auth_user u ON u.id = o.user_id"
+        )
+
+
+def rebuild_index():
+    """Drop and repopulate the whole index from the orders table"""
+    with connection.schema_editor() as schema_editor:
+        schema_editor.execute(f'DELETE FROM {SEARCH_TABLE}')
+        populate_index(schema_editor)
+
+
+def search_orders(queryset, query):
+    """Filter ``queryset`` to orders matching ``query``, annotated with ``search_rank``.
+
+    A lower ``search_rank`` is a better match. The result composes with any
+    other filters on ``queryset``.
+    """
+    query = query.strip()
+    if not is_supported() or len(query) < 3:
+        return queryset.filter(
+            Q(order_number__icontains=query) |
+            Q(user__username__icontains=query) |
+            Q(user__email__icontains=query) |
+            Q(user__first_name__icontains=query) |
+            Q(user__last_name__icontains=query) |
+            Q(special_instructions__icontains=query)
+        ).annotate(search_rank=Value(0.0))
+
+    if connection.vendor == 'sqlite':
+        # Quote the input as one FTS5 phrase so operators in it are taken literally
+        match = '"' + query.replace('"', '""') + '"'
+        # Joined rather than ranked in a correlated subquery: FTS5 would run
+        # the whole MATCH again for every matching order
+        return queryset.extra(
+            tables=[SEARCH_TABLE],
+            where=[f'{SEARCH_TABLE}.rowid = orders_order.id', f'{SEARCH_TABLE} MATCH %s'],
+            params=[match],
+        ).annotate(search_rank=RawSQL(f'bm25({SEARCH_TABLE}, {COLUMN_WEIGHTS})', ()))
+
+    pattern = '%' + query.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_') + '%'
+    matching_ids = RawSQL(f'SELECT order_id FROM {SEARCH_TABLE} WHERE document ILIKE %s', (pattern,))
+    rank = RawSQL(
+        f'SELECT -word_similarity(%s, document) FROM {SEARCH_TABLE} WHERE order_id = orders_order.id',
+        (query,),
+    )
+    return queryset.filter(id__in=matching_ids).annotate(search_rank=rank)
+
+
+def _index_row(order, user):
+    customer_name = f'{user.first_name} {user.last_name}'.strip() if user else ''
+    return (
+        order.pk,
+        order.order_number,
+        customer_name,
+        user.username if user else '',
+        user.email if user else '',
+        order.special_instructions,
+    )
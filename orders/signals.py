@@ -0,0 +1,89 @@
+from django.contrib.auth.models import User
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import Signal, receiver
+
+from laundry_pal.histograms import invalidate_status_histogram
+from . import mapindex, search
+from .models import Order
+
+# Sent by orders.progression after a bulk UPDATE moves orders to a new status.
+# QuerySet.update() bypasses post_save, so listeners that track order changes
+# must handle this too. Arguments: current_status, next_status, and rows, a
+# list of (order id, user id, order number, total cost) tuples for the moved
+# orders.
+orders_advanced = Signal()
+
+# Sent by Order.objects.bulk_create, which bypasses post_save as well.
+# Argument: orders, the list of created Order instances.
+orders_created = Signal()
+
+
+@receiver(post_save, sender=Order)
+@receiver(post_delete, sender=Order)
+def order_changed(sender, instance, **kwargs):
+    invalidate_status_histogram(Order, [instance.user_id])
+
+
+@receiver(orders_advanced)
+def orders_advanced_in_bulk(sender, rows, **kwargs):
+    invalidate_status_histogram(Order, [row[1] for row in rows])
+
+
+@receiver(orders_created)
+def orders_created_in_bulk(sender, orders, **kwargs):
+    invalidate_status_histogram(Order, [order.user_id for order in orders])
+
+
+@receiver(post_save, sender=Order)
+def update_search_index(sender, instance, created, update_fields=None, **kwargs):
+    # Compared with the row the save replaced: a stale instance writes its own
+    # text back over another save's. Status changes, the common case, leave
+    # the index untouched
+    stored = getattr(instance, '_stored_values', {})
+    if not created and all(stored.get(field) == getattr(instance, field) for field in search.INDEXED_ORDER_FIELDS):
+        return
+    if update_fields is None:
+        search.index_orders([instance])
+    else:
+        # The fields left out were not written, so index what the row holds
+        search.index_orders(list(Order.objects.filter(pk=instance.pk).only(*search.INDEXED_ORDER_FIELDS)))
+
+
+@receiver(post_delete, sender=Order)
+def remove_from_search_index(sender, instance, **kwargs):
+    search.unindex_order(instance.pk)
+
+
+@receiver(orders_created)
+def index_created_orders(sender, orders, **kwargs):
+    search.index_orders(orders)
+
+
+@receiver(post_save, sender=User)
+def reindex_customer_orders(sender, instance, created, update_fields=None, **kwargs):
+    # Logins save last_login only; new users have no orders yet
+    if created or (update_fields and not set(search.INDEXED_USER_FIELDS) & set(update_fields)):
+        return
+    search.reindex_user(instance)
+
+
+@receiver(post_save, sender=Order)
+def update_map_index(sender, instance, created, **kwargs):
+    stored = getattr(instance, '_stored_values', {})
+    if created or any(stored.get(field) != getattr(instance, field) for field in ('status', 'reservation_id')):
+        mapindex.index_orders([instance.pk])
+
+
+@receiver(post_delete, sender=Order)
+def remove_from_map_index(sender, instance, **kwargs):
+    mapindex.index_orders([instance.pk])
+
+
+@receiver(orders_advanced)
+def move_advanced_orders_on_map(sender, current_status, next_status, rows, **kwargs):
+    mapindex.restatus_orders([row[0] for row in rows], current_status, next_status)
+
+
+@receiver(orders_created)
+def add_created_orders_to_map(sender, orders, **kwargs):
+    mapindex.index_orders([order.pk for order in orders])
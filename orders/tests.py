@@ -1,3 +1,466 @@
-from django.test import TestCase
+import json
+from datetime import timedelta
+from decimal import Decimal
+from importlib import import_module
+from unittest import mock
 
-# Create your tests here.
+from django.apps import apps
+from django.contrib.auth.models import User
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import transaction
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from admin_panel import pricing
+from admin_panel.models import PricingRule
+from notifications.models import Notification
+from reservations.models import Reservation
+from . import mapindex, numbering
+from .models import MapCell, MapPoint, Order, OrderItem, OrderNumberSequence
+from .progression import DeadlineScheduler, advance_due_orders, apply_transition
+from .signals import orders_advanced
+from .search import search_orders
+
+
+class SearchIndexTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.customer = User.objects.create_user('search-customer', password='password')
+
+    def found(self, query):
+        return list(search_orders(Order.objects.all(), query).values_list('id', flat=True))
+
+    def test_edits_to_indexed_fields_are_found(self):
+        order = Order.objects.create(user=self.customer, total_cost=Decimal('10.00'), special_instructions='starch collars')
+
+        order.special_instructions = 'fold towels'
+        order.save()
+
+        self.assertEqual(self.found('towels'), [order.pk])
+        self.assertEqual(self.found('collars'), [])
+
+    def test_stale_instance_indexes_the_text_it_writes(self):
+        order = Order.objects.create(user=self.customer, total_cost=Decimal('10.00'), special_instructions='starch collars')
+        edited = Order.objects.get(pk=order.pk)
+        edited.special_instructions = 'fold towels'
+        edited.save()
+
+        # Writes back the instructions it was loaded with
+        order.status = Order.Status.CONFIRMED
+        order.save()
+
+        self.assertEqual(Order.objects.get(pk=order.pk).special_instructions, 'starch collars')
+        self.assertEqual(self.found('collars'), [order.pk])
+        self.assertEqual(self.found('towels'), [])
+
+
+class OrderNumberingTests(TestCase):
+    def next_value(self):
+        return OrderNumberSequence.objects.get(name=numbering.SEQUENCE_NAME).next_value
+
+    def test_reservations_are_disjoint(self):
+        first = numbering.reserve_numbers(5)
+        second = numbering.reserve_numbers(3)
+
+        self.assertEqual(second, first + 5)
+        self.assertEqual(self.next_value(), second + 3)
+
+    def test_missing_sequence_row_is_created(self):
+        OrderNumberSequence.objects.all().delete()
+
+        self.assertEqual(numbering.reserve_numbers(4), 1)
+        self.assertEqual(self.next_value(), 5)
+
+    def test_inside_a_transaction_one_number_is_taken(self):
+        before = self.next_value()
+
+        with mock.patch.dict(numbering._block, {'next': 0, 'end': 0}):
+            first = numbering.next_order_number()
+            second = numbering.next_order_number()
+
+        self.assertNotEqual(first, second)
+        self.assertEqual(self.next_value(), before + 2)
+
+    def test_seed_starts_above_existing_orders(self):
+        customer = User.objects.create_user('numbering-customer', password='password')
+        orders = [Order.objects.create(user=customer, total_cost=Decimal('10.00')) for _ in range(3)]
+        OrderNumberSequence.objects.all().delete()
+
+        migration = import_module('orders.migrations.0003_ordernumbersequence')
+        migration.seed_order_number_sequence(apps, None)
+
+        self.assertEqual(self.next_value(), orders[-1].pk + 1)
+
+
+class OrderNumberBlockTests(TransactionTestCase):
+    # Keeps the sequence row the migrations seeded
+    serialized_rollback = True
+
+    def setUp(self):
+        patcher = mock.patch.dict(numbering._block, {'next': 0, 'end': 0})
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def next_value(self):
+        return OrderNumberSequence.objects.get(name=numbering.SEQUENCE_NAME).next_value
+
+    def test_block_is_reserved_outside_transactions(self):
+        before = self.next_value()
+
+        first = numbering.next_order_number()
+        with self.assertNumQueries(0):
+            second = numbering.next_order_number()
+
+        self.assertNotEqual(first, second)
+        self.assertEqual(self.next_value(), before + numbering.BLOCK_SIZE)
+
+    def test_rolled_back_transaction_reserves_nothing(self):
+        before = self.next_value()
+
+        with self.assertRaises(RuntimeError):
+            with transaction.atomic():
+                numbering.next_order_number()
+                raise RuntimeError
+
+        self.assertEqual(self.next_value(), before)
+        self.assertEqual(numbering._block, {'next': 0, 'end': 0})
+        numbering.next_order_number()
+        self.assertEqual(self.next_value(), before + numbering.BLOCK_SIZE)
+
+
+class MapIndexTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.customer = User.objects.create_user('map-customer', password='password')
+
+    def reservation(self, address='Borac, Naval'):
+        now = timezone.now()
+        return Reservation.objects.create(
+            user=self.customer,
+            pickup_datetime=now + timedelta(days=1),
+            delivery_datetime=now + timedelta(days=2),
+            address=address,
+        )
+
+    def order(self, reservation, status=Order.Status.PENDING):
+        return Order.objects.create(user=self.customer, reservation=reservation, total_cost=Decimal('10.00'), status=status)
+
+    def index(self):
+        cells = {
+            (cell.geohash, cell.kind, cell.status): (cell.count, round(cell.latitude_sum, 6), round(cell.longitude_sum, 6))
+            for cell in MapCell.objects.all()
+            if cell.count
+        }
+        points = set(MapPoint.objects.values_list('kind', 'object_id', 'status', 'latitude', 'longitude'))
+        return cells, points
+
+    def assertMatchesRebuild(self):
+        maintained = self.index()
+        mapindex.rebuild_index()
+        self.assertEqual(maintained, self.index())
+
+    def point(self, kind, object_id):
+        return MapPoint.objects.filter(kind=kind, object_id=object_id).values_list('status', 'latitude', 'longitude').first()
+
+    def test_created_orders_are_placed(self):
+        reservation = self.reservation()
+        order = self.order(reservation)
+
+        self.assertEqual(self.point(MapPoint.Kind.ORDER, order.pk)[0], Order.Status.PENDING)
+        self.assertIsNotNone(self.point(MapPoint.Kind.RESERVATION, reservation.pk))
+        self.assertMatchesRebuild()
+
+    def test_status_change_moves_the_count(self):
+        order = self.order(self.reservation())
+        placed = self.point(MapPoint.Kind.ORDER, order.pk)
+
+        order.status = Order.Status.CONFIRMED
+        order.save()
+
+        self.assertEqual(self.point(MapPoint.Kind.ORDER, order.pk), (Order.Status.CONFIRMED, *placed[1:]))
+        self.assertMatchesRebuild()
+
+    def test_reservation_address_change_moves_its_orders(self):
+        reservation = self.reservation('Borac, Naval')
+        order = self.order(reservation)
+        before = self.point(MapPoint.Kind.ORDER, order.pk)
+
+        reservation.address = 'Caibiran, Biliran'
+        reservation.save()
+
+        after = self.point(MapPoint.Kind.ORDER, order.pk)
+        self.assertNotEqual(after[1:], before[1:])
+        self.assertEqual(self.point(MapPoint.Kind.RESERVATION, reservation.pk)[1:], after[1:])
+        self.assertMatchesRebuild()
+
+    def test_deleting_a_reservation_unplaces_its_orders(self):
+        reservation = self.reservation()
+        order = self.order(reservation)
+
+        reservation.delete()
+
+        self.assertIsNone(self.point(MapPoint.Kind.ORDER, order.pk))
+        self.assertIsNone(self.point(MapPoint.Kind.RESERVATION, reservation.pk))
+        self.assertMatchesRebuild()
+
+    def test_bulk_progression_moves_points_in_place(self):
+        reservation = self.reservation()
+        orders = [self.order(reservation) for _ in range(3)]
+        unplaced = self.order(None)
+
+        apply_transition(Order.Status.PENDING, Order.Status.CONFIRMED, order_ids=[order.pk for order in orders + [unplaced]])
+
+        self.assertEqual(
+            set(MapPoint.objects.filter(kind=MapPoint.Kind.ORDER).values_list('object_id', 'status')),
+            {(order.pk, Order.Status.CONFIRMED) for order in orders},
+        )
+        self.assertMatchesRebuild()
+
+    def test_sync_that_loses_an_insert_race_retries(self):
+        order = self.order(self.reservation())
+        Order.objects.filter(pk=order.pk).update(status=Order.Status.CONFIRMED)
+        write_points = mapindex._write_points
+        attempts = []
+
+        def racing(kind, object_ids, wanted):
+            attempts.append(object_ids)
+            if len(attempts) == 1:
+                # Looks before another sync stores the point, then inserts it too
+                return write_points(kind, [], wanted)
+            return write_points(kind, object_ids, wanted)
+
+        with mock.patch.object(mapindex, '_write_points', side_effect=racing):
+            mapindex.index_orders([order.pk])
+
+        self.assertEqual(len(attempts), 2)
+        self.assertEqual(self.point(MapPoint.Kind.ORDER, order.pk)[0], Order.Status.CONFIRMED)
+        self.assertMatchesRebuild()
+
+
+class ProgressionTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.customer = User.objects.create_user('progression-customer', password='password')
+
+    def setUp(self):
+        self.now = timezone.now()
+
+    def order(self, status, minutes_ago):
+        order = Order.objects.create(user=self.customer, total_cost=Decimal('10.00'), status=status)
+        Order.objects.filter(pk=order.pk).update(updated_at=self.now - timedelta(minutes=minutes_ago))
+        return order
+
+    def statuses(self):
+        return dict(Order.objects.values_list('id', 'status'))
+
+    def test_tick_moves_exactly_the_due_orders(self):
+        due = self.order(Order.Status.PENDING, 6)
+        early = self.order(Order.Status.PENDING, 4)
+        waiting = self.order(Order.Status.CONFIRMED, 9)
+        delivered = self.order(Order.Status.DELIVERED, 60)
+
+        advanced = advance_due_orders(now=self.now)
+
+        self.assertEqual(advanced[(Order.Status.PENDING, Order.Status.CONFIRMED)], [due.pk])
+        self.assertEqual(sum(len(order_ids) for order_ids in advanced.values()), 1)
+        # Stamped with the tick's time, so not advanced again by the next transition
+        self.assertEqual(self.statuses(), {
+            due.pk: Order.Status.CONFIRMED,
+            early.pk: Order.Status.PENDING,
+            waiting.pk: Order.Status.CONFIRMED,
+            delivered.pk: Order.Status.DELIVERED,
+        })
+        self.assertEqual(Order.objects.get(pk=due.pk).updated_at, self.now)
+
+    def test_transition_notifies_and_signals_the_moved_rows(self):
+        orders = [self.order(Order.Status.WASHING, 30) for _ in range(3)]
+        sent = []
+
+        def receiver(sender, **kwargs):
+            sent.append(kwargs)
+
+        orders_advanced.connect(receiver)
+        self.addCleanup(orders_advanced.disconnect, receiver)
+
+        moved = apply_transition(Order.Status.WASHING, Order.Status.DRYING, now=self.now, order_ids=[order.pk for order in orders[:2]])
+
+        self.assertEqual(sorted(moved), sorted(order.pk for order in orders[:2]))
+        self.assertEqual(len(sent), 1)
+        self.assertEqual(sent[0]['current_status'], Order.Status.WASHING)
+        self.assertEqual(sent[0]['next_status'], Order.Status.DRYING)
+        self.assertEqual(
+            sorted(sent[0]['rows']),
+            sorted((order.pk, order.user_id, order.order_number, order.total_cost) for order in orders[:2]),
+        )
+        self.assertEqual(
+            sorted(Notification.objects.values_list('message', flat=True)),
+            sorted(f'Your order #{order.order_number} is now Drying.' for order in orders[:2]),
+        )
+        self.assertEqual(Order.objects.get(pk=orders[2].pk).status, Order.Status.WASHING)
+
+    def test_transition_with_nothing_due_does_nothing(self):
+        self.order(Order.Status.PENDING, 1)
+
+        with self.assertNumQueries(3):
+            moved = apply_transition(Order.Status.PENDING, Order.Status.CONFIRMED, now=self.now, due_before=self.now - timedelta(minutes=5))
+
+        self.assertEqual(moved, [])
+        self.assertFalse(Notification.objects.exists())
+
+
+class DeadlineSchedulerTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.customer = User.objects.create_user('scheduler-customer', password='password')
+
+    def order(self, status, updated_at):
+        order = Order.objects.create(user=self.customer, total_cost=Decimal('10.00'), status=status)
+        Order.objects.filter(pk=order.pk).update(updated_at=updated_at)
+        return order
+
+    def test_pops_orders_in_deadline_order(self):
+        now = timezone.now()
+        pending = self.order(Order.Status.PENDING, now - timedelta(minutes=3))
+        picked_up = self.order(Order.Status.PICKED_UP, now - timedelta(minutes=20))
+        self.order(Order.Status.DELIVERED, now - timedelta(hours=1))
+        scheduler = DeadlineScheduler()
+
+        self.assertEqual(scheduler.load(), 2)
+        self.assertEqual(scheduler.next_deadline(), now - timedelta(minutes=5))
+        self.assertEqual(scheduler.pop_due(now), [(picked_up.pk, Order.Status.PICKED_UP)])
+        self.assertEqual(scheduler.next_deadline(), now + timedelta(minutes=2))
+        self.assertEqual(scheduler.pop_due(now + timedelta(minutes=2)), [(pending.pk, Order.Status.PENDING)])
+        self.assertIsNone(scheduler.next_deadline())
+
+    def test_poll_replaces_the_entry_of_a_changed_order(self):
+        now = timezone.now()
+        order = self.order(Order.Status.PENDING, now - timedelta(minutes=1))
+        scheduler = DeadlineScheduler()
+        scheduler.load()
+
+        order.refresh_from_db()
+        order.status = Order.Status.OUT_FOR_DELIVERY
+        order.save()
+        created = self.order(Order.Status.PENDING, timezone.now())
+
+        self.assertEqual(scheduler.poll(), 2)
+        self.assertEqual(scheduler.poll(), 0)
+        later = timezone.now() + timedelta(minutes=30)
+        self.assertEqual(
+            sorted(scheduler.pop_due(later)),
+            sorted([(order.pk, Order.Status.OUT_FOR_DELIVERY), (created.pk, Order.Status.PENDING)]),
+        )
+
+    def test_poll_stops_tracking_delivered_orders(self):
+        now = timezone.now()
+        order = self.order(Order.Status.OUT_FOR_DELIVERY, now - timedelta(minutes=1))
+        scheduler = DeadlineScheduler()
+        scheduler.load()
+
+        order.refresh_from_db()
+        order.status = Order.Status.DELIVERED
+        order.save()
+        scheduler.poll()
+
+        self.assertEqual(len(scheduler), 0)
+        self.assertEqual(scheduler.pop_due(now + timedelta(hours=1)), [])
+
+
+class OrderIntakeTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.staff = User.objects.create_user('intake-staff', password='password', is_staff=True)
+        cls.customer = User.objects.create_user('intake-customer', password='password')
+        PricingRule.objects.bulk_create([
+            PricingRule(service_category=service, item_category=item, base_price=Decimal('20.00'))
+            for service in OrderItem.ServiceLevel.values
+            for item in OrderItem.ItemType.values
+        ])
+        pricing.bump_pricing_version()
+
+    def setUp(self):
+        # Compiled tables of other tests may carry the same version number
+        patcher = mock.patch.object(pricing, '_matrix', None)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.client.force_login(self.staff)
+
+    def post_json(self, entries):
+        return self.client.post(reverse('orders:intake'), json.dumps(entries), content_type='application/json')
+
+    def entry(self, quantity=2, **fields):
+        return dict({'username': self.customer.username, 'items': [{'item_type': 'shirt', 'quantity': quantity}]}, **fields)
+
+    def test_json_batch_creates_orders_with_totals(self):
+        response = self.post_json({'orders': [
+            self.entry(2),
+            self.entry(1, priority='rush', items=[{'item_type': 'shirt'}, {'item_type': 'pants', 'quantity': 3}]),
+        ]})
+
+        self.assertEqual(response.status_code, 201)
+        created = response.json()['orders']
+        self.assertEqual([(order['total_items'], order['total_cost']) for order in created], [(2, '40.00'), (4, '160.00')])
+        self.assertEqual(Order.objects.filter(user=self.customer).count(), 2)
+        self.assertEqual(OrderItem.objects.filter(order__user=self.customer).count(), 3)
+
+    def test_csv_body_groups_rows_by_order_ref(self):
+        body = (
+            '\ufefforder_ref,username,item_type,quantity\r\n'
+            'a,intake-customer,shirt,2\r\n'
+            'a,intake-customer,pants,1\r\n'
+            'b,intake-customer,towel,4\r\n'
+        )
+        response = self.client.post(reverse('orders:intake'), body.encode('utf-8'), content_type='text/csv')
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual([order['total_items'] for order in response.json()['orders']], [3, 4])
+
+    def test_csv_upload(self):
+        upload = SimpleUploadedFile('batch.csv', b'username,item_type,quantity\nintake-customer,shirt,5\n', content_type='text/csv')
+
+        response = self.client.post(reverse('orders:intake'), {'file': upload})
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.json()['orders'][0]['total_items'], 5)
+
+    def test_invalid_batch_creates_nothing(self):
+        response = self.post_json([
+            self.entry(),
+            self.entry(username='nobody'),
+            self.entry(items=[{'item_type': 'hat'}]),
+            self.entry(quantity=0),
+            self.entry(priority='whenever'),
+        ])
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual([error['order'] for error in response.json()['errors']], [1, 2, 3, 4])
+        self.assertFalse(Order.objects.exists())
+
+    def test_malformed_body_is_rejected(self):
+        response = self.client.post(reverse('orders:intake'), '{"orders": [', content_type='application/json')
+
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(response.json()['success'])
+
+    @override_settings(DATA_UPLOAD_MAX_MEMORY_SIZE=1024)
+    def test_batch_above_the_django_upload_cap_is_accepted(self):
+        entries = [self.entry() for _ in range(50)]
+        self.assertGreater(len(json.dumps(entries)), 1024)
+
+        response = self.post_json(entries)
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.json()['created'], 50)
+
+    @override_settings(ORDER_INTAKE_MAX_BYTES=1024)
+    def test_batch_above_the_intake_cap_is_refused(self):
+        response = self.post_json([self.entry() for _ in range(50)])
+
+        self.assertEqual(response.status_code, 413)
+        self.assertFalse(Order.objects.exists())
+
+    def test_customers_cannot_post_batches(self):
+        self.client.force_login(self.customer)
+
+        self.assertEqual(self.post_json([self.entry()]).status_code, 403)
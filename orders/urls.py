@@ -6,6 +6,7 @@ app_name = 'orders'
 urlpatterns = [
     path('', views.OrderListView.as_view(), name='list'),
     path('create/', views.OrderCreateView.as_view(), name='create'),
+    path('intake/', views.OrderIntakeView.as_view(), name='intake'),
     path('<int:pk>/', views.OrderDetailView.as_view(), name='detail'),
     path('<int:pk>/update/', views.OrderUpdateView.as_view(), name='update'),
     path('<int:pk>/delete/', views.OrderDeleteView.as_view(), name='delete'),
@@ -1,6 +1,12 @@
-from django.contrib.auth.mixins import LoginRequiredMixin
+import codecs
+
+from django.conf import settings
+from django.contrib.auth.mixins import LoginRequiredMixin, UserPassesTestMixin
+from django.http import JsonResponse
 from django.urls import reverse_lazy
-from django.views.generic import ListView, DetailView, CreateView, UpdateView, DeleteView, TemplateView
+from django.views.generic import ListView, DetailView, CreateView, UpdateView, DeleteView, TemplateView, View
+from laundry_pal.histograms import status_histogram
+from .intake import IntakeError, intake_orders, parse_csv, parse_json
 from .models import Order, OrderItem
 
 
@@ -19,14 +25,18 @@ class OrderListView(LoginRequiredMixin, ListView):
 	
 	def get_context_data(self, **kwargs):
 		context = super().get_context_data(**kwargs)
-		user_orders = self.get_queryset()
+		# Staff see counts across all orders, regular users only their own
+		if self.request.user.is_staff or self.request.user.is_superuser:
+			counts = status_histogram(Order)
+		else:
+			counts = status_histogram(Order, self.request.user)
 		
-		context['pending_count'] = user_orders.filter(status='pending').count()
-		context['picked_up_count'] = user_orders.filter(status='picked_up').count()
-		context['washing_count'] = user_orders.filter(status='washing').count()
-		context['drying_count'] = user_orders.filter(status='drying').count()
-		context['out_for_delivery_count'] = user_orders.filter(status='out_for_delivery').count()
-		context['delivered_count'] = user_orders.filter(status='delivered').count()
+		context['pending_count'] = counts['pending']
+		context['picked_up_count'] = counts['picked_up']
+		context['washing_count'] = counts['washing']
+		context['drying_count'] = counts['drying']
+		context['out_for_delivery_count'] = counts['out_for_delivery']
+		context['delivered_count'] = counts['delivered']
 		
 		return context
 
@@ -54,6 +64,54 @@ class OrderCreateView(LoginRequiredMixin, CreateView):
 		return super().form_valid(form)
 
 
+class OrderIntakeView(LoginRequiredMixin, UserPassesTestMixin, View):
+	"""Create a batch of orders with their items from JSON, or CSV as the body or an uploaded file.
+
+	The body is read as a stream rather than through ``request.body``, which
+	Django caps at DATA_UPLOAD_MAX_MEMORY_SIZE (2.5 MB). Requests are limited
+	to ``settings.ORDER_INTAKE_MAX_BYTES`` instead and answered 413 above it.
+	"""
+	raise_exception = True
+
+	def test_func(self):
+		return self.request.user.is_staff or self.request.user.is_superuser
+
+	def post(self, request, *args, **kwargs):
+		limit = settings.ORDER_INTAKE_MAX_BYTES
+		if int(request.META.get('CONTENT_LENGTH') or 0) > limit:
+			return JsonResponse({
+				'success': False,
+				'errors': [{'order': None, 'error': f'Intake requests are limited to {limit} bytes; split the batch'}],
+			}, status=413)
+		try:
+			upload = request.FILES.get('file')
+			if upload is not None:
+				entries = parse_csv(codecs.iterdecode(upload, 'utf-8-sig'))
+			elif request.content_type == 'text/csv':
+				entries = parse_csv(codecs.iterdecode(request, 'utf-8-sig'))
+			else:
+				entries = parse_json(request.read())
+			orders = intake_orders(entries)
+		except IntakeError as e:
+			return JsonResponse({'success': False, 'errors': e.errors}, status=400)
+		except ValueError as e:
+			return JsonResponse({'success': False, 'errors': [{'order': None, 'error': str(e)}]}, status=400)
+
+		return JsonResponse({
+			'success': True,
+			'created': len(orders),
+			'orders': [
+				{
+					'id': order.pk,
+					'order_number': order.order_number,
+					'total_items': order.total_items,
+					'total_cost': str(order.total_cost),
+				}
+				for order in orders
+			],
+		}, status=201)
+
+
 class OrderUpdateView(LoginRequiredMixin, UpdateView):
 	model = Order
 	fields = ['status', 'total_items', 'total_cost', 'special_instructions', 'estimated_completion']
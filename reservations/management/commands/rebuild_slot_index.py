@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from reservations.slots import rebuild_slots
+
+
+class Command(BaseCommand):
+    help = 'Recount the pickup slot capacity index from the reservations table'
+
+    def handle(self, *args, **options):
+        count = rebuild_slots()
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt {count} pickup slots'))
@@ -0,0 +1,46 @@
+# Generated by Django 5.2.8 on 2026-10-18 07:38
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.utils import timezone
+
+
+def seed_slots(apps, schema_editor):
+    Reservation = apps.get_model('reservations', 'Reservation')
+    ReservationSlot = apps.get_model('reservations', 'ReservationSlot')
+
+    counts = {}
+    rows = Reservation.objects.exclude(status='cancelled').exclude(service_type=None).values_list('pickup_datetime', 'service_type_id', 'priority')
+    for pickup_datetime, service_type_id, priority in rows.iterator():
+        local = timezone.localtime(pickup_datetime)
+        start = local.replace(minute=local.minute - local.minute % 30, second=0, microsecond=0)
+        counts[start, service_type_id, priority] = counts.get((start, service_type_id, priority), 0) + 1
+    ReservationSlot.objects.bulk_create([
+        ReservationSlot(start=start, service_type_id=service_type_id, priority=priority, booked=booked)
+        for (start, service_type_id, priority), booked in counts.items()
+    ], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('reservations', '0003_reservation_reservation_user_created_idx'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ReservationSlot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('priority', models.CharField(choices=[('standard', 'Standard'), ('express', 'Express (24h)'), ('rush', 'Rush (Same Day)')], max_length=20)),
+                ('start', models.DateTimeField()),
+                ('booked', models.PositiveIntegerField(default=0)),
+                ('service_type', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='slots', to='reservations.servicetype')),
+            ],
+            options={
+                'ordering': ['start'],
+                'constraints': [models.UniqueConstraint(fields=('service_type', 'priority', 'start'), name='reservation_slot_unique')],
+            },
+        ),
+        migrations.RunPython(seed_slots, migrations.RunPython.noop),
+    ]
@@ -1,5 +1,5 @@
 from django.conf import settings
-from django.db import models
+from django.db import models, transaction
 from decimal import Decimal
 
 
@@ -43,10 +43,31 @@ class Reservation(models.Model):
 
 	class Meta:
 		ordering = ['-created_at']
+		indexes = [
+			models.Index(fields=['user', 'created_at'], name='reservation_user_created_idx'),
+			# Change scans by the order rollups
+			models.Index(fields=['updated_at'], name='reservation_updated_idx'),
+		]
 
 	def __str__(self) -> str:
 		return f"Reservation #{self.pk} for {self.user}"
 	
+	def save(self, *args, **kwargs):
+		from .slots import move_booking
+		# A full pickup slot rolls the whole save back
+		with transaction.atomic():
+			self._remember_stored_values()
+			move_booking(self)
+			super().save(*args, **kwargs)
+	
+	def _remember_stored_values(self):
+		# The instance may be stale (e.g. advanced in bulk since it was loaded), so
+		# change listeners compute deltas from the stored row, locked until the save commits
+		if self.pk is None:
+			self._stored_values = {}
+		else:
+			self._stored_values = Reservation.objects.select_for_update().filter(pk=self.pk).values().first() or {}
+	
 	def get_status_color(self):
 		colors = {
 			'pending': 'warning',
@@ -65,6 +86,24 @@ class Reservation(models.Model):
 		}
 		return colors.get(self.priority, 'secondary')
 
+
+class ReservationSlot(models.Model):
+	"""Reservations holding one pickup slot for a service type and priority, kept by deltas"""
+	service_type = models.ForeignKey(ServiceType, on_delete=models.CASCADE, related_name='slots')
+	priority = models.CharField(max_length=20, choices=Reservation.Priority.choices)
+	start = models.DateTimeField()
+	booked = models.PositiveIntegerField(default=0)
+
+	class Meta:
+		ordering = ['start']
+		constraints = [
+			# Also the index availability lookups scan
+			models.UniqueConstraint(fields=['service_type', 'priority', 'start'], name='reservation_slot_unique'),
+		]
+
+	def __str__(self) -> str:
+		return f"{self.start:%Y-%m-%d %H:%M} {self.service_type_id}/{self.priority}: {self.booked}"
+
 from django.db import models
 
 # Create your models here.
@@ -0,0 +1,44 @@
+from django.db.models.signals import post_delete, post_save, pre_delete
+from django.dispatch import receiver
+
+from laundry_pal.histograms import invalidate_status_histogram
+from orders import mapindex
+from orders.models import Order
+from . import slots
+from .models import Reservation
+
+
+@receiver(post_save, sender=Reservation)
+@receiver(post_delete, sender=Reservation)
+def reservation_changed(sender, instance, **kwargs):
+    invalidate_status_histogram(Reservation, [instance.user_id])
+
+
+@receiver(post_delete, sender=Reservation)
+def release_slot(sender, instance, **kwargs):
+    # The slot of the row deleted, which a stale instance may no longer hold
+    key = slots.stored_slot_key(getattr(instance, '_stored_values', {}))
+    if key is not None:
+        slots.release(key)
+
+
+@receiver(post_save, sender=Reservation)
+def update_map_index(sender, instance, created, **kwargs):
+    stored = getattr(instance, '_stored_values', {})
+    if created or stored.get('status') != instance.status or stored.get('address') != instance.address:
+        mapindex.index_reservations([instance.pk])
+    if not created and stored.get('address') != instance.address:
+        # Its orders are delivered to the new address
+        mapindex.index_orders(Order.objects.filter(reservation=instance).values_list('id', flat=True))
+
+
+@receiver(pre_delete, sender=Reservation)
+def remember_orders_for_map(sender, instance, **kwargs):
+    # The orders lose their reservation in a bulk UPDATE that sends no signals
+    instance._map_order_ids = list(Order.objects.filter(reservation=instance).values_list('id', flat=True))
+
+
+@receiver(post_delete, sender=Reservation)
+def remove_from_map_index(sender, instance, **kwargs):
+    mapindex.index_reservations([instance.pk])
+    mapindex.index_orders(getattr(instance, '_map_order_ids', []))
@@ -0,0 +1,151 @@
+"""Pickup slot capacity.
+
+Pickups are booked into ``SLOT_MINUTES`` slots. ``ReservationSlot`` keeps, for
+each slot, service type and priority, how many reservations hold it, and is
+updated by deltas as reservations are created, moved, cancelled or deleted;
+checking a booking never scans the reservations table. A slot is claimed with
+a conditional UPDATE that only succeeds below capacity, in the same
+transaction as the reservation, so two customers cannot both take the last
+place.
+
+Cancelled reservations and reservations without a service type hold no slot.
+"""
+from datetime import datetime, time, timedelta
+
+from django.core.exceptions import ValidationError
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import Reservation, ReservationSlot
+
+SLOT_MINUTES = 30
+
+# Reservations one slot takes for each service type, by priority
+SLOT_CAPACITY = {
+    Reservation.Priority.STANDARD: 6,
+    Reservation.Priority.EXPRESS: 3,
+    Reservation.Priority.RUSH: 2,
+}
+
+# Pickups are offered from OPENING_HOUR until CLOSING_HOUR, local time
+OPENING_HOUR = 8
+CLOSING_HOUR = 18
+
+# Longest date range the availability endpoint answers for
+MAX_RANGE_DAYS = 14
+
+
+class SlotUnavailable(ValidationError):
+    pass
+
+
+def slot_start(moment):
+    """Start of the slot ``moment`` falls in, with slots aligned to local time"""
+    moment = timezone.localtime(moment)
+    return moment.replace(minute=moment.minute - moment.minute % SLOT_MINUTES, second=0, microsecond=0)
+
+
+def slot_key(pickup_datetime, service_type_id, priority, status):
+    """``(start, service type id, priority)`` of the slot a reservation holds, or None"""
+    if status == Reservation.Status.CANCELLED or service_type_id is None or pickup_datetime is None:
+        return None
+    return (slot_start(pickup_datetime), service_type_id, priority)
+
+
+def stored_slot_key(stored):
+    """slot_key of a stored row, as read into ``_stored_values``; None for no row"""
+    if not stored:
+        return None
+    return slot_key(stored['pickup_datetime'], stored['service_type_id'], stored['priority'], stored['status'])
+
+
+def move_booking(reservation):
+    """Claim the slot ``reservation`` is about to hold and release the one it held.
+
+    Runs before the reservation is saved, inside the same transaction; raises
+    SlotUnavailable when the new slot is full. The slot released is the one
+    of the stored row, which may differ from the one the instance was loaded with.
+    """
+    old = stored_slot_key(getattr(reservation, '_stored_values', {}))
+    new = slot_key(reservation.pickup_datetime, reservation.service_type_id, reservation.priority, reservation.status)
+    if old == new:
+        return
+    if new is not None:
+        claim(new)
+    if old is not None:
+        release(old)
+
+
+def claim(key):
+    start, service_type_id, priority = key
+    capacity = SLOT_CAPACITY.get(priority, 0)
+    slots = ReservationSlot.objects.filter(start=start, service_type_id=service_type_id, priority=priority)
+    if slots.filter(booked__lt=capacity).update(booked=F('booked') + 1):
+        return
+    if capacity and not slots.exists():
+        try:
+            with transaction.atomic():
+                ReservationSlot.objects.create(start=start, service_type_id=service_type_id, priority=priority, booked=1)
+            return
+        except IntegrityError:
+            # Another booking created the row first
+            if slots.filter(booked__lt=capacity).update(booked=F('booked') + 1):
+                return
+    local = timezone.localtime(start)
+    raise SlotUnavailable(f'The {local:%b %d, %I:%M %p} pickup slot is fully booked; please pick another time.', code='slot_full')
+
+
+def release(key):
+    start, service_type_id, priority = key
+    ReservationSlot.objects.filter(
+        start=start, service_type_id=service_type_id, priority=priority, booked__gt=0,
+    ).update(booked=F('booked') - 1)
+
+
+def open_slots(first_day, last_day, service_type_id, priority):
+    """Bookable future slots from ``first_day`` to ``last_day`` as ``[(start, places left)]``"""
+    capacity = SLOT_CAPACITY.get(priority, 0)
+    first = timezone.make_aware(datetime.combine(first_day, time(OPENING_HOUR)))
+    last = timezone.make_aware(datetime.combine(last_day, time(CLOSING_HOUR)))
+    booked = dict(
+        ReservationSlot.objects.filter(
+            service_type_id=service_type_id, priority=priority, start__gte=first, start__lt=last,
+        ).values_list('start', 'booked')
+    )
+    now = timezone.now()
+    slots = []
+    day = first_day
+    while day <= last_day:
+        start = timezone.make_aware(datetime.combine(day, time(OPENING_HOUR)))
+        closing = timezone.make_aware(datetime.combine(day, time(CLOSING_HOUR)))
+        while start < closing:
+            left = capacity - booked.get(start, 0)
+            if start > now and left > 0:
+                slots.append((start, left))
+            start += timedelta(minutes=SLOT_MINUTES)
+        day += timedelta(days=1)
+    return slots
+
+
+def rebuild_slots():
+    """Recount every slot from the reservations table; returns the number of slots"""
+    counts = {}
+    rows = (
+        Reservation.objects.exclude(status=Reservation.Status.CANCELLED)
+        .exclude(service_type=None)
+        .values_list('pickup_datetime', 'service_type_id', 'priority')
+    )
+    for pickup_datetime, service_type_id, priority in rows.iterator(chunk_size=2000):
+        key = (slot_start(pickup_datetime), service_type_id, priority)
+        counts[key] = counts.get(key, 0) + 1
+    with transaction.atomic():
+        ReservationSlot.objects.all().delete()
+        ReservationSlot.objects.bulk_create(
+            [
+                ReservationSlot(start=start, service_type_id=service_type_id, priority=priority, booked=booked)
+                for (start, service_type_id, priority), booked in counts.items()
+            ],
+            batch_size=1000,
+        )
+    return len(counts)
@@ -1,3 +1,111 @@
+from datetime import datetime, time, timedelta
+
+from django.contrib.auth.models import User
 from django.test import TestCase
+from django.utils import timezone
+
+from .models import Reservation, ReservationSlot, ServiceType
+from .slots import SLOT_CAPACITY, SlotUnavailable, slot_start
+
+
+class SlotBookingTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('slot-customer', password='password')
+        cls.service_type = ServiceType.objects.create(name='Wash & Fold', description='', base_price=10)
+        tomorrow = timezone.localdate() + timedelta(days=1)
+        cls.pickup = timezone.make_aware(datetime.combine(tomorrow, time(10)))
+        cls.capacity = SLOT_CAPACITY[Reservation.Priority.RUSH]
+
+    def book(self, pickup=None):
+        pickup = pickup or self.pickup
+        return Reservation.objects.create(
+            user=self.user,
+            service_type=self.service_type,
+            pickup_datetime=pickup,
+            delivery_datetime=pickup + timedelta(days=1),
+            address='Naval, Biliran',
+            priority=Reservation.Priority.RUSH,
+        )
+
+    def booked(self, pickup=None):
+        slot = ReservationSlot.objects.filter(
+            start=slot_start(pickup or self.pickup),
+            service_type=self.service_type,
+            priority=Reservation.Priority.RUSH,
+        ).first()
+        return slot.booked if slot else 0
+
+    def test_last_place_is_taken_once(self):
+        for _ in range(self.capacity):
+            self.book()
+        self.assertEqual(self.booked(), self.capacity)
+
+        with self.assertRaises(SlotUnavailable):
+            self.book()
+        self.assertEqual(self.booked(), self.capacity)
+        self.assertEqual(Reservation.objects.count(), self.capacity)
+
+    def test_moving_a_booking_releases_the_old_slot(self):
+        reservation = self.book()
+        later = self.pickup + timedelta(hours=1)
+
+        reservation.pickup_datetime = later
+        reservation.save()
+
+        self.assertEqual(self.booked(), 0)
+        self.assertEqual(self.booked(later), 1)
+
+    def test_moving_into_a_full_slot_keeps_the_old_one(self):
+        later = self.pickup + timedelta(hours=1)
+        for _ in range(self.capacity):
+            self.book(later)
+        reservation = self.book()
+
+        reservation.pickup_datetime = later
+        with self.assertRaises(SlotUnavailable):
+            reservation.save()
+
+        self.assertEqual(self.booked(), 1)
+        self.assertEqual(self.booked(later), self.capacity)
+
+    def test_cancelling_releases_the_slot(self):
+        reservation = self.book()
+
+        reservation.status = Reservation.Status.CANCELLED
+        reservation.save()
+
+        self.assertEqual(self.booked(), 0)
+
+    def test_deleting_releases_the_slot(self):
+        reservation = self.book()
+
+        reservation.delete()
+
+        self.assertEqual(self.booked(), 0)
+
+    def test_stale_instance_releases_the_stored_slot(self):
+        reservation = self.book()
+        later = self.pickup + timedelta(hours=1)
+        moved = Reservation.objects.get(pk=reservation.pk)
+        moved.pickup_datetime = later
+        moved.save()
+
+        # Still holds the pickup it was loaded with
+        reservation.status = Reservation.Status.CANCELLED
+        reservation.save()
+
+        self.assertEqual(self.booked(), 0)
+        self.assertEqual(self.booked(later), 0)
+
+    def test_deleting_a_stale_instance_releases_the_stored_slot(self):
+        reservation = self.book()
+        later = self.pickup + timedelta(hours=1)
+        moved = Reservation.objects.get(pk=reservation.pk)
+        moved.pickup_datetime = later
+        moved.save()
+
+        reservation.delete()
 
-# Create your tests here.
+        self.assertEqual(self.booked(), 0)
+        self.assertEqual(self.booked(later), 0)
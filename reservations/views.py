@@ -1,7 +1,16 @@
+from datetime import timedelta
+
+from django.contrib.auth.decorators import login_required
 from django.contrib.auth.mixins import LoginRequiredMixin
+from django.http import JsonResponse
 from django.urls import reverse_lazy
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+from django.views.decorators.http import require_GET
 from django.views.generic import ListView, DetailView, CreateView, UpdateView, DeleteView
-from .models import Reservation
+from laundry_pal.histograms import status_histogram
+from . import slots
+from .models import Reservation, ServiceType
 
 
 class ReservationListView(LoginRequiredMixin, ListView):
@@ -19,12 +28,16 @@ class ReservationListView(LoginRequiredMixin, ListView):
 	
 	def get_context_data(self, **kwargs):
 		context = super().get_context_data(**kwargs)
-		user_reservations = self.get_queryset()
+		# Staff see counts across all reservations, regular users only their own
+		if self.request.user.is_staff or self.request.user.is_superuser:
+			counts = status_histogram(Reservation)
+		else:
+			counts = status_histogram(Reservation, self.request.user)
 		
-		context['pending_count'] = user_reservations.filter(status='pending').count()
-		context['confirmed_count'] = user_reservations.filter(status='confirmed').count()
-		context['in_progress_count'] = user_reservations.filter(status='in_progress').count()
-		context['completed_count'] = user_reservations.filter(status='completed').count()
+		context['pending_count'] = counts['pending']
+		context['confirmed_count'] = counts['confirmed']
+		context['in_progress_count'] = counts['in_progress']
+		context['completed_count'] = counts['completed']
 		
 		return context
 
@@ -40,18 +53,35 @@ class ReservationDetailView(LoginRequiredMixin, DetailView):
 			return Reservation.objects.filter(user=self.request.user)
 
 
-class ReservationCreateView(LoginRequiredMixin, CreateView):
+class SlotBookingMixin:
+	"""Shows a full pickup slot as a form error; the save was rolled back"""
+
+	def form_valid(self, form):
+		try:
+			return super().form_valid(form)
+		except slots.SlotUnavailable as e:
+			form.add_error('pickup_datetime', e)
+			return self.form_invalid(form)
+
+
+class ReservationCreateView(LoginRequiredMixin, SlotBookingMixin, CreateView):
 	model = Reservation
 	template_name = 'reservations/reservation_form.html'
 	fields = ['service_type', 'pickup_datetime', 'delivery_datetime', 'address', 'phone_number', 'notes', 'priority']
 	success_url = reverse_lazy('reservations:reservation_list')
 
+	def get_form(self, form_class=None):
+		form = super().get_form(form_class)
+		# Slots are counted per service type
+		form.fields['service_type'].required = True
+		return form
+
 	def form_valid(self, form):
 		form.instance.user = self.request.user
 		return super().form_valid(form)
 
 
-class ReservationUpdateView(LoginRequiredMixin, UpdateView):
+class ReservationUpdateView(LoginRequiredMixin, SlotBookingMixin, UpdateView):
 	model = Reservation
 	fields = ['pickup_datetime', 'delivery_datetime', 'address', 'notes', 'status']
 	success_url = reverse_lazy('reservations:reservation_list')
@@ -64,6 +94,37 @@ class ReservationUpdateView(LoginRequiredMixin, UpdateView):
 			return Reservation.objects.filter(user=self.request.user)
 
 
+@login_required
+@require_GET
+def availability(request):
+	"""Open pickup slots for a service type and priority between two dates"""
+	try:
+		service_type = ServiceType.objects.get(pk=int(request.GET.get('service_type', '')), is_active=True)
+	except (ValueError, ServiceType.DoesNotExist):
+		return JsonResponse({'error': 'Unknown service type'}, status=400)
+	priority = request.GET.get('priority', Reservation.Priority.STANDARD)
+	if priority not in Reservation.Priority.values:
+		return JsonResponse({'error': 'Unknown priority'}, status=400)
+	try:
+		first_day = parse_date(request.GET.get('start', '')) or timezone.localdate()
+		last_day = parse_date(request.GET.get('end', '')) or first_day
+	except ValueError:
+		return JsonResponse({'error': 'Dates must be YYYY-MM-DD'}, status=400)
+	if last_day < first_day or last_day - first_day >= timedelta(days=slots.MAX_RANGE_DAYS):
+		return JsonResponse({'error': f'The range must cover 1 to {slots.MAX_RANGE_DAYS} days'}, status=400)
+
+	return JsonResponse({
+		'service_type': service_type.pk,
+		'priority': priority,
+		'slot_minutes': slots.SLOT_MINUTES,
+		'capacity': slots.SLOT_CAPACITY[priority],
+		'slots': [
+			{'start': timezone.localtime(start).isoformat(), 'remaining': remaining}
+			for start, remaining in slots.open_slots(first_day, last_day, service_type.pk, priority)
+		],
+	})
+
+
 class ReservationDeleteView(LoginRequiredMixin, DeleteView):
 	model = Reservation
 	success_url = reverse_lazy('reservations:reservation_list')
@@ -6,6 +6,11 @@ class NotificationManager {
         this.markAllReadBtn = document.getElementById('markAllRead');
         this.dropdownButton = document.getElementById('notificationsDropdown');
         
+        // Last payload and its ETag, so an unchanged poll costs a 304
+        this.notifications = [];
+        this.etag = null;
+        this.pollTimer = null;
+        
         this.init();
     }
     
@@ -18,8 +23,44 @@ class NotificationManager {
         // Set up event listeners
         this.setupEventListeners();
         
-        // Auto-refresh notifications every 30 seconds
-        setInterval(() => this.loadNotifications(), 30000);
+        // Receive changes as they happen, or poll when the server cannot push
+        this.connectStream();
+        
+        // Keep the relative times current between updates
+        setInterval(() => this.renderNotifications(this.notifications), 60000);
+    }
+    
+    connectStream() {
+        if (!window.EventSource) {
+            this.startPolling();
+            return;
+        }
+        
+        const stream = new EventSource('/notifications/api/notifications/stream/');
+        stream.addEventListener('notifications', (event) => {
+            this.stopPolling();
+            const data = JSON.parse(event.data);
+            this.etag = `"${event.lastEventId}"`;
+            this.renderNotifications(data.notifications);
+            this.updateBadge(data.unread_count);
+        });
+        stream.addEventListener('error', () => {
+            // EventSource reconnects by itself unless the server refused the stream
+            if (stream.readyState === EventSource.CLOSED) {
+                this.startPolling();
+            }
+        });
+    }
+    
+    startPolling() {
+        if (!this.pollTimer) {
+            this.pollTimer = setInterval(() => this.loadNotifications(), 30000);
+        }
+    }
+    
+    stopPolling() {
+        clearInterval(this.pollTimer);
+        this.pollTimer = null;
     }
     
     setupEventListeners() {
@@ -38,10 +79,13 @@ class NotificationManager {
     
     async loadNotifications() {
         try {
-            const response = await fetch('/notifications/api/notifications/');
+            const headers = this.etag ? { 'If-None-Match': this.etag } : {};
+            const response = await fetch('/notifications/api/notifications/', { headers, cache: 'no-store' });
+            if (response.status === 304) return;
             if (!response.ok) throw new Error('Failed to load notifications');
             
             const data = await response.json();
+            this.etag = response.headers.get('ETag');
             this.renderNotifications(data.notifications);
             this.updateBadge(data.unread_count);
             
@@ -52,6 +96,7 @@ class NotificationManager {
     }
     
     renderNotifications(notifications) {
+        this.notifications = notifications || [];
         if (!notifications || notifications.length === 0) {
             this.notificationsList.innerHTML = `
                 <div class="text-center py-4 text-muted">
@@ -71,7 +116,7 @@ class NotificationManager {
                     </div>
                     <div class="flex-grow-1">
                         <p class="mb-1 notification-message">${notification.message}</p>
-                        <small class="text-muted notification-time">${notification.time_ago}</small>
+                        <small class="text-muted notification-time">${this.timeAgo(notification)}</small>
                     </div>
                     ${!notification.is_read ? `
                         <button class="btn btn-sm btn-outline-primary mark-read-btn" 
@@ -96,6 +141,20 @@ class NotificationManager {
         });
     }
     
+    timeAgo(notification) {
+        if (!notification.created_at_iso) return notification.time_ago;
+        
+        const seconds = Math.floor((Date.now() - new Date(notification.created_at_iso)) / 1000);
+        const days = Math.floor(seconds / 86400);
+        const hours = Math.floor(seconds / 3600);
+        const minutes = Math.floor(seconds / 60);
+        
+        if (days > 0) return `${days} day${days > 1 ? 's' : ''} ago`;
+        if (seconds > 3600) return `${hours} hour${hours > 1 ? 's' : ''} ago`;
+        if (seconds > 60) return `${minutes} minute${minutes > 1 ? 's' : ''} ago`;
+        return 'Just now';
+    }
+    
     updateBadge(unreadCount) {
         // Update both the old dropdown badge and new nav badge
         const badges = [this.notificationBadge, document.getElementById('navNotificationBadge')];